@@ -0,0 +1,91 @@
+"""Benchmark for the Gemini call guards against a stub with a stalling tail.
+
+Runs concurrent single categorizations through AIService backed by
+StubModel. A fraction of the stub's calls stall, like a hung upstream.
+The categorization latency is reported for several guard configurations:
+none, a per-call deadline, a deadline plus the circuit breaker, and all of
+those plus a hedge. The share answered by the model shows what each guard
+gives up to the rule-based fallback.
+
+    cd backend && python -m benchmarks.bench_ai_guards --calls 400 --stall-rate 0.05
+"""
+import argparse
+import threading
+import time
+
+from server import AIService, CircuitBreaker
+
+from .harness import percentile
+from .stubs import StubModel
+
+
+def run(service, calls, concurrency):
+    latencies = []
+    fallbacks = []
+    lock = threading.Lock()
+    counter = iter(range(calls))
+    fallback = service._fallback_categorization
+
+    def counted_fallback(expense_name, amount):
+        fallbacks.append(expense_name)
+        return fallback(expense_name, amount)
+
+    service._fallback_categorization = counted_fallback
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            service.categorize_expense(f"Swiggy order {i}", 100 + i)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, len(fallbacks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--max-concurrent', type=int, default=32, help="limit on calls in flight, stalled ones included")
+    parser.add_argument('--latency', type=float, default=0.05, help="stub latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.1, help="extra uniform stub delay in seconds")
+    parser.add_argument('--stall-rate', type=float, default=0.05, help="fraction of stub calls that stall")
+    parser.add_argument('--stall', type=float, default=5.0, help="seconds a stalled call takes")
+    parser.add_argument('--timeout', type=float, default=0.5)
+    parser.add_argument('--hedge', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    never = CircuitBreaker(10 ** 9, 0, float('inf'))
+    configs = [
+        ("unguarded", dict(timeout=args.stall * 2, breaker=never)),
+        ("deadline", dict(timeout=args.timeout, breaker=never)),
+        ("deadline + breaker", dict(timeout=args.timeout, breaker=CircuitBreaker(5, 1.0, args.timeout))),
+        ("all + hedge", dict(timeout=args.timeout, breaker=CircuitBreaker(5, 1.0, args.timeout),
+                             hedge_after=args.hedge)),
+    ]
+    print(f"{'guards':<20} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'model %':>8} {'opened':>7}")
+    for label, options in configs:
+        model = StubModel(latency=args.latency, jitter=args.jitter, stall_rate=args.stall_rate,
+                          stall=args.stall, seed=args.seed)
+        service = AIService(model=model, max_concurrent=args.max_concurrent, **options)
+        latencies, fallbacks = run(service, args.calls, args.concurrency)
+        stats = service.get_guard_stats()
+        answered = args.calls - fallbacks
+        print(f"{label:<20} {percentile(latencies, 0.5) * 1000:>9.1f} {percentile(latencies, 0.95) * 1000:>9.1f} "
+              f"{percentile(latencies, 0.99) * 1000:>9.1f} {max(latencies) * 1000:>9.1f} "
+              f"{answered / args.calls * 100:>7.1f}% {stats['breaker']['opened']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark for the NumPy columnar expense store.
+
+Times the analytics work that scales with history size (rebuilding the
+spending rollup, the dashboard's recent expenses and filtered listing
+pages) with the row-based code and with ExpenseColumns. Checks that both
+give identical results.
+
+    cd backend && python -m benchmarks.bench_columns --size 100000 500000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from server import ExpenseColumns, JsonStorage, SpendingRollup, np
+
+from .synthetic import generate_expenses
+
+QUERIES = [
+    ("newest page", {}, 'date', True),
+    ("category + amount", {"categories": {"Groceries", "Shopping"}, "min_amount": 500}, 'date', True),
+    ("date range by amount", {"date_from": "2025-01-01", "date_to": "2025-06-30"}, 'amount', True),
+]
+
+
+def best_of(fn, repeat: int):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def report(label: str, row_time: float, column_time: float):
+    print(f"  {label:<26} {row_time * 1000:>10.1f} {column_time * 1000:>10.1f} {row_time / column_time:>8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if np is None:
+        raise SystemExit("NumPy is not installed")
+
+    # Row-based queries come from the ExpenseStorage base class
+    storage = JsonStorage(Path(tempfile.mkdtemp(prefix='bench-columns-')))
+    for size in args.size:
+        expenses = list(generate_expenses(size, seed=args.seed))
+        print(f"{size} expenses{'':<16} {'rows ms':>10} {'columns ms':>10} {'speedup':>9}")
+
+        row_time, rollup = best_of(lambda: SpendingRollup(expenses), 1)
+        column_time, columnar = best_of(
+            lambda: SpendingRollup.from_columns(ExpenseColumns.build(expenses)), args.repeat
+        )
+        if (rollup.months, rollup.categories, rollup.month_categories) != \
+                (columnar.months, columnar.categories, columnar.month_categories):
+            raise SystemExit("columnar rollup differs from the row-based rollup")
+        report("rollup build", row_time, column_time)
+
+        columns = ExpenseColumns.build(expenses)
+        row_time, rows = best_of(lambda: storage.recent_expenses(10, expenses), args.repeat)
+        column_time, recent = best_of(lambda: columns.recent(10, expenses), args.repeat)
+        if rows != recent:
+            raise SystemExit("columnar recent expenses differ")
+        report("recent expenses", row_time, column_time)
+
+        for label, filters, sort, descending in QUERIES:
+            row_time, rows = best_of(
+                lambda: storage.query_expenses(filters, sort, descending, None, 50, expenses), args.repeat
+            )
+            column_time, page = best_of(
+                lambda: columns.query(filters, sort, descending, None, 50, expenses), args.repeat
+            )
+            if rows != page:
+                raise SystemExit(f"columnar query '{label}' differs")
+            report(label, row_time, column_time)
+
+
+if __name__ == '__main__':
+    main()
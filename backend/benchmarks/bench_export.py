@@ -0,0 +1,88 @@
+"""Benchmark for the streamed history export.
+
+Downloads the full history through GET /api/expenses/export as CSV and
+NDJSON, plain and gzipped. The old way to get the history was the JSON
+full list, now GET /api/expenses?all=true, which is built as one body, so
+it is timed too. Each download runs in its own process, so peak RSS shows that
+download alone; tracemalloc gives the peak Python allocation while the
+response is consumed.
+
+    cd backend && python -m benchmarks.bench_export --size 100000 500000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from .synthetic import write_dataset
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+DOWNLOADS = [
+    ("full list (json)", '/api/expenses?all=true', False),
+    ("export csv", '/api/expenses/export?format=csv', False),
+    ("export ndjson", '/api/expenses/export?format=ndjson', False),
+    ("export csv gzip", '/api/expenses/export?format=csv&compress=gzip', True),
+    ("export ndjson gzip", '/api/expenses/export?format=ndjson&compress=gzip', True),
+]
+
+CHILD = """
+import json, resource, sys, time, tracemalloc
+import server
+path, gzip, trace = sys.argv[1], sys.argv[2] == '1', sys.argv[3] == '1'
+client = server.app.test_client()
+tracker = server.trackers.acquire(server.DEFAULT_USER_ID)
+tracker.expenses
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if trace:
+    tracemalloc.start()
+started = time.perf_counter()
+response = client.get(path, headers={'Accept-Encoding': 'gzip'} if gzip else {}, buffered=False)
+size = sum(len(chunk) for chunk in response.response)
+response.close()
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "seconds": elapsed,
+    "bytes": size,
+    "traced": tracemalloc.get_traced_memory()[1] if trace else None,
+    "rss_growth": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline,
+}))
+"""
+
+
+def download(path, gzip, trace, env):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, path, '1' if gzip else '0', '1' if trace else '0'],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, nargs='+', default=[100000])
+    parser.add_argument('--storage', default='json', choices=['json', 'journal', 'sqlite'])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for size in args.size:
+        with tempfile.TemporaryDirectory(prefix='expense-export-') as tmp:
+            data_dir = Path(tmp) / 'data'
+            write_dataset(data_dir, size)
+            env = {**os.environ, 'DATA_DIR': str(data_dir), 'STORAGE_BACKEND': args.storage, 'GOOGLE_API_KEY': ''}
+            print(f"\n{size} expenses ({args.storage}) {'seconds':>8} {'rows/s':>10} {'MB':>8} "
+                  f"{'peak alloc MB':>14} {'RSS growth MB':>14}")
+            for label, path, gzip in DOWNLOADS:
+                timed = min((download(path, gzip, False, env) for _ in range(args.repeat)),
+                            key=lambda result: result['seconds'])
+                traced = download(path, gzip, True, env)
+                print(f"  {label:<24} {timed['seconds']:>8.2f} {size / timed['seconds']:>10.0f} "
+                      f"{timed['bytes'] / 1e6:>8.1f} {traced['traced'] / 1e6:>14.1f} "
+                      f"{timed['rss_growth'] / 1024:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
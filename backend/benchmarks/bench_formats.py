@@ -0,0 +1,60 @@
+"""Benchmark for the on-disk formats of the JSON-backed storage.
+
+Saves and loads a synthetic expense history through JsonStorage with every
+available DATA_FORMAT codec. The original stdlib, indented json.dump layout
+is included as the reference. The script reports the bytes on disk and
+checks that every format loads back the same records.
+
+    cd backend && python -m benchmarks.bench_formats --size 10000 100000
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from server import DATA_CODECS, DataCodec, JsonStorage, msgpack, orjson
+
+from .synthetic import generate_expenses
+
+STDLIB_JSON = DataCodec(
+    'stdlib json', '.json',
+    lambda data: json.dumps(data, indent=2, default=str).encode(),
+    json.loads
+)
+
+
+def best_of(fn, repeat: int):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"orjson {'installed' if orjson else 'not installed'}, msgpack {'installed' if msgpack else 'not installed'}")
+    codecs = [STDLIB_JSON, *DATA_CODECS.values()]
+    for size in args.size:
+        expenses = json.loads(json.dumps(list(generate_expenses(size, seed=args.seed)), default=str))
+        print(f"\n{size} expenses {'':<2} {'save ms':>10} {'load ms':>10} {'MB':>8}")
+        for codec in codecs:
+            with tempfile.TemporaryDirectory(prefix='expense-formats-') as tmp:
+                storage = JsonStorage(Path(tmp), codec=codec)
+                save_time, _ = best_of(lambda: storage.save_expenses(expenses), args.repeat)
+                load_time, loaded = best_of(storage.load_expenses, args.repeat)
+                if loaded != expenses:
+                    raise SystemExit(f"{codec.name} does not round-trip the expenses")
+                size_mb = storage.expenses_file.stat().st_size / 1e6
+            print(f"  {codec.name:<14} {save_time * 1000:>10.1f} {load_time * 1000:>10.1f} {size_mb:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Micro-benchmark for the rule-based categorizer.
+
+Compares the compiled CategoryRuleEngine against a sequential keyword scan
+(the approach the engine replaced) as the rule table grows.
+
+    cd backend && python -m benchmarks.bench_rules --rules 50 500 5000
+"""
+import argparse
+import random
+import string
+import time
+
+from server import CategoryRuleEngine, EXPENSE_CATEGORIES
+
+
+def make_word(rng: random.Random) -> str:
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+
+
+def make_rules(rng: random.Random, count: int, keywords_per_rule: int = 5):
+    return [
+        {
+            "category": rng.choice(EXPENSE_CATEGORIES),
+            "priority": i,
+            "keywords": [make_word(rng) for _ in range(keywords_per_rule)],
+        }
+        for i in range(count)
+    ]
+
+
+def make_names(rng: random.Random, rules, count: int):
+    keywords = [keyword for rule in rules for keyword in rule['keywords']]
+    names = []
+    for _ in range(count):
+        words = [make_word(rng) for _ in range(rng.randint(1, 3))]
+        if rng.random() < 0.7:
+            words.insert(rng.randint(0, len(words)), rng.choice(keywords))
+        names.append(' '.join(words).title())
+    return names
+
+
+def sequential_scan(rules, name: str, amount: float) -> str:
+    name_lower = name.lower()
+    for rule in rules:
+        if any(keyword in name_lower for keyword in rule['keywords']):
+            return rule['category']
+    return "Other"
+
+
+def measure(fn, names, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for name in names:
+            fn(name, 250.0)
+        best = min(best, time.perf_counter() - start)
+    return len(names) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--names', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'rules':>8} {'keywords':>9} {'compile ms':>11} {'engine/s':>12} {'scan/s':>12} {'speedup':>8}")
+    for rule_count in args.rules:
+        rng = random.Random(args.seed)
+        rules = make_rules(rng, rule_count)
+        names = make_names(rng, rules, args.names)
+
+        start = time.perf_counter()
+        engine = CategoryRuleEngine(rules)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        mismatches = sum(
+            engine.categorize(name, 250.0) != sequential_scan(rules, name, 250.0) for name in names
+        )
+        if mismatches:
+            raise SystemExit(f"engine disagrees with sequential scan on {mismatches} names")
+
+        engine_rate = measure(engine.categorize, names, args.repeat)
+        scan_rate = measure(lambda name, amount: sequential_scan(rules, name, amount), names, args.repeat)
+        print(f"{rule_count:>8} {rule_count * 5:>9} {compile_ms:>11.1f} {engine_rate:>12,.0f} "
+              f"{scan_rate:>12,.0f} {engine_rate / scan_rate:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
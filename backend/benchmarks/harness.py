@@ -0,0 +1,322 @@
+"""Route benchmarks and load test for the expense API.
+
+Seeds a temporary data directory with a synthetic history, points the server
+at it, swaps the Gemini model for benchmarks.stubs.StubModel, and times
+every route through Flask's test client.
+
+    cd backend
+    python -m benchmarks.harness --size 10000                  # per-route timings
+    python -m benchmarks.harness --size 10000 --cold           # bypass response caches
+    python -m benchmarks.harness --size 100000 --load --concurrency 8 --duration 10
+    python -m benchmarks.harness --size 10000 --save-baseline  # record baselines.json
+    python -m benchmarks.harness --size 10000 --check          # fail on regressions
+
+Baselines are machine-specific; record them on the machine that runs --check,
+and re-record whenever a scenario is added: --check fails on scenarios that
+have no baseline. The synthetic history ends on a fixed date, so the data is
+the same on every run.
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from .stubs import StubModel
+from .synthetic import DEFAULT_END, write_dataset
+
+BASELINES_FILE = Path(__file__).parent / 'baselines.json'
+
+
+class Scenario:
+    def __init__(self, name, method, rule, path=None, body=None, mutates=False, data=None, content_type=None):
+        self.name = name
+        self.method = method
+        self.rule = rule          # url_map rule this scenario covers
+        self.path = path or rule  # str, or callable(iteration) -> str
+        self.body = body          # callable(iteration) -> JSON body
+        self.mutates = mutates
+        self.data = data          # callable(iteration) -> raw request body
+        self.content_type = content_type
+
+    def request(self, client, iteration):
+        path = self.path(iteration) if callable(self.path) else self.path
+        kwargs = {"json": self.body(iteration)} if self.body else {}
+        if self.data:
+            kwargs = {"data": self.data(iteration), "content_type": self.content_type}
+        return client.open(path, method=self.method, **kwargs)
+
+
+# Dates below are relative to the end of the synthetic history, so every
+# run touches the same rows whatever day it is
+def new_expense(i):
+    return {"name": f"Swiggy order {i}", "amount": 200 + i % 500, "date": DEFAULT_END.isoformat()}
+
+
+BULK_DELETE_SIZE = 50
+
+
+def statement_csv(i, rows=500):
+    # Half of each statement repeats the previous one, so dedup is exercised
+    lines = ['date,name,amount,category']
+    for j in range(rows):
+        n = i * rows // 2 + j
+        lines.append(f"{DEFAULT_END.isoformat()},Statement payee {n},{100 + n % 900},Shopping")
+    return '\n'.join(lines) + '\n'
+
+
+def build_scenarios(ids, tracker):
+    # Single deletes take ids from the front, bulk deletes from the middle and
+    # edits from the back, so no scenario touches another's expenses
+    bulk = ids[len(ids) // 2:]
+    month_start = DEFAULT_END.replace(day=1).isoformat()
+    year_ago = DEFAULT_END.replace(year=DEFAULT_END.year - 1, day=1).isoformat()
+    return [
+        Scenario("root", 'GET', '/api/'),
+        Scenario("expenses full list", 'GET', '/api/expenses', '/api/expenses?all=true'),
+        Scenario("expenses page", 'GET', '/api/expenses', '/api/expenses?limit=50'),
+        Scenario("expenses filtered page", 'GET', '/api/expenses',
+                 f'/api/expenses?limit=50&category=Groceries&from={month_start}&min_amount=100'),
+        Scenario("expenses ndjson 1000", 'GET', '/api/expenses', '/api/expenses?format=ndjson&limit=1000'),
+        Scenario("export month csv", 'GET', '/api/expenses/export',
+                 f'/api/expenses/export?format=csv&from={month_start}'),
+        Scenario("add expense", 'POST', '/api/expenses', body=new_expense, mutates=True),
+        Scenario("add batch of 50", 'POST', '/api/expenses/batch', mutates=True,
+                 body=lambda i: {"expenses": [new_expense(i * 50 + j) for j in range(50)]}),
+        Scenario("delete expense", 'DELETE', '/api/expenses/<expense_id>', mutates=True,
+                 path=lambda i: f"/api/expenses/{ids[i % len(ids)]}"),
+        Scenario("bulk delete 50", 'POST', '/api/expenses/bulk-delete', mutates=True,
+                 body=lambda i: {"ids": bulk[i * BULK_DELETE_SIZE % len(bulk):][:BULK_DELETE_SIZE]}),
+        Scenario("edit expense", 'PATCH', '/api/expenses/<expense_id>', mutates=True,
+                 path=lambda i: f"/api/expenses/{ids[-1 - i % len(ids)]}",
+                 body=lambda i: {"amount": 100 + i, "category": "Shopping"}),
+        Scenario("search autocomplete", 'GET', '/api/expenses/search', '/api/expenses/search?q=swi'),
+        Scenario("category updates", 'GET', '/api/expenses/category-updates'),
+        Scenario("budgets", 'GET', '/api/budgets'),
+        Scenario("set budget", 'POST', '/api/budgets', body=lambda i: {"monthly": 50000 + i}, mutates=True),
+        Scenario("salary", 'GET', '/api/salary'),
+        Scenario("set salary", 'POST', '/api/salary', body=lambda i: {"monthly": 120000 + i}, mutates=True),
+        Scenario("categorize", 'POST', '/api/expenses/categorize',
+                 body=lambda i: {"name": f"Uber trip {i}", "amount": 250}),
+        Scenario("category cache stats", 'GET', '/api/expenses/categorize/cache'),
+        Scenario("classifier stats", 'GET', '/api/ai/classifier'),
+        Scenario("ai breaker status", 'GET', '/api/ai/breaker'),
+        Scenario("analyze", 'POST', '/api/expenses/analyze'),
+        Scenario("predict month", 'POST', '/api/expenses/predict-month', mutates=True),
+        Scenario("savings allocation", 'POST', '/api/savings/allocate'),
+        Scenario("financial health", 'GET', '/api/financial-health'),
+        Scenario("dashboard", 'GET', '/api/dashboard'),
+        Scenario("bootstrap", 'GET', '/api/bootstrap'),
+        Scenario("metrics", 'GET', '/api/metrics'),
+        Scenario("weekly trends by category", 'GET', '/api/analytics/trends',
+                 f'/api/analytics/trends?interval=week&group_by=category&from={year_ago}'),
+        # Last, since every import grows the history the other scenarios read
+        Scenario("import 500 csv rows", 'POST', '/api/expenses/import', mutates=True,
+                 data=statement_csv, content_type='text/csv'),
+        Scenario("import status", 'GET', '/api/expenses/import/<import_id>',
+                 path=lambda i: f"/api/expenses/import/{next(reversed(tracker.imports))}"),
+    ]
+
+
+LOAD_MIX = [
+    ("dashboard", 3),
+    ("bootstrap", 2),
+    ("expenses page", 3),
+    ("financial health", 1),
+    ("add expense", 1),
+]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(latencies):
+    return {
+        "count": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def load_server(data_dir, storage, model_latency):
+    os.environ['DATA_DIR'] = str(data_dir)
+    os.environ['STORAGE_BACKEND'] = storage
+    os.environ['GOOGLE_API_KEY'] = ''
+    os.environ.setdefault('CATEGORY_CACHE_ENABLED', 'true')
+    server = importlib.import_module('server')
+    server.get_ai_service().model = StubModel(latency=model_latency)
+    return server
+
+
+def bypass_caches(server):
+    tracker = server.trackers.acquire(server.DEFAULT_USER_ID)
+    try:
+        tracker.mark_changed()
+    finally:
+        server.trackers.release(tracker)
+
+
+def run_routes(server, scenarios, iterations, warmup, cold, only):
+    client = server.app.test_client()
+    results = {}
+    for scenario in scenarios:
+        if only and not any(term in scenario.name for term in only):
+            continue
+        latencies = []
+        for i in range(warmup + iterations):
+            if cold:
+                bypass_caches(server)
+            start = time.perf_counter()
+            response = scenario.request(client, i)
+            response.get_data()
+            elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                raise SystemExit(f"{scenario.name}: HTTP {response.status_code} {response.get_data()[:200]!r}")
+            if i >= warmup:
+                latencies.append(elapsed)
+        results[scenario.name] = summarize(latencies)
+        row = results[scenario.name]
+        print(f"{scenario.name:<26} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} {row['p99_ms']:>9.3f} {row['mean_ms']:>9.3f}")
+    return results
+
+
+def run_load(server, scenarios, concurrency, duration, seed):
+    by_name = {scenario.name: scenario for scenario in scenarios}
+    names = [name for name, _ in LOAD_MIX]
+    weights = [weight for _, weight in LOAD_MIX]
+    samples = {name: [] for name in names}
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        client = server.app.test_client()
+        local = {name: [] for name in names}
+        local_errors = 0
+        i = worker_id * 1_000_000
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights=weights)[0]
+            start = time.perf_counter()
+            response = by_name[name].request(client, i)
+            response.get_data()
+            local[name].append(time.perf_counter() - start)
+            local_errors += response.status_code >= 400
+            i += 1
+        with lock:
+            for name, latencies in local.items():
+                samples[name].extend(latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    everything = [latency for latencies in samples.values() for latency in latencies]
+    overall = summarize(everything)
+    print(f"\nLoad: {concurrency} clients for {elapsed:.1f}s, {overall['count']} requests, "
+          f"{overall['count'] / elapsed:,.0f} req/s, {errors[0]} errors")
+    print(f"{'overall':<26} {overall['p50_ms']:>9.3f} {overall['p95_ms']:>9.3f} {overall['p99_ms']:>9.3f} {overall['mean_ms']:>9.3f}")
+    for name in names:
+        row = summarize(samples[name])
+        print(f"{name:<26} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} {row['p99_ms']:>9.3f} {row['mean_ms']:>9.3f}")
+    return {"throughput_rps": round(overall['count'] / elapsed, 1), "errors": errors[0], **overall}
+
+
+def check_baselines(results, baseline, threshold, slack_ms):
+    regressions = []
+    for name, row in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            # A scenario added without re-recording would otherwise go unguarded
+            regressions.append(f"{name}: no baseline; re-record with --save-baseline")
+            continue
+        limit = reference['p50_ms'] * (1 + threshold) + slack_ms
+        if row['p50_ms'] > limit:
+            regressions.append(f"{name}: p50 {row['p50_ms']:.3f}ms > {limit:.3f}ms (baseline {reference['p50_ms']:.3f}ms)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=10000, help="number of synthetic expenses")
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--storage', default='json', choices=['json', 'journal', 'sqlite'])
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--cold', action='store_true', help="invalidate response caches before every request")
+    parser.add_argument('--only', nargs='*', help="run scenarios whose name contains any of these")
+    parser.add_argument('--model-latency', type=float, default=0.0, help="stub model delay in seconds")
+    parser.add_argument('--load', action='store_true', help="run the concurrent load mix")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help="exit 1 if p50 regresses past the threshold")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed relative p50 regression")
+    parser.add_argument('--slack-ms', type=float, default=0.5, help="absolute slack added to every limit")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='expense-bench-') as tmp:
+        data_dir = Path(tmp) / 'data'
+        start = time.perf_counter()
+        write_dataset(data_dir, args.size, args.months, args.seed)
+        print(f"Generated {args.size} expenses in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        server = load_server(data_dir, args.storage, args.model_latency)
+        tracker = server.trackers.acquire(server.DEFAULT_USER_ID)
+        server.trackers.release(tracker)
+        print(f"Loaded server ({args.storage}) in {time.perf_counter() - start:.2f}s")
+
+        scenarios = build_scenarios([expense['id'] for expense in tracker.expenses], tracker)
+        covered = {scenario.rule for scenario in scenarios}
+        for rule in server.app.url_map.iter_rules():
+            if rule.endpoint != 'static' and rule.rule not in covered:
+                print(f"warning: no scenario covers {rule.rule}", file=sys.stderr)
+
+        if args.load:
+            result = run_load(server, scenarios, args.concurrency, args.duration, args.seed)
+            key = f"load-{args.storage}-{args.size}-c{args.concurrency}"
+            results = {"load": result}
+        else:
+            print(f"{'scenario':<26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+            results = run_routes(server, scenarios, args.iterations, args.warmup, args.cold, args.only)
+            key = f"{args.storage}-{args.size}{'-cold' if args.cold else ''}"
+
+    baselines = json.loads(BASELINES_FILE.read_text()) if BASELINES_FILE.exists() else {}
+    if args.save_baseline:
+        # A partial (--only) run updates its scenarios; a full run replaces the entry
+        baselines[key] = {**baselines.get(key, {}), **results} if args.only else results
+        BASELINES_FILE.write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+        print(f"Saved baseline '{key}' to {BASELINES_FILE.name}")
+    if args.check:
+        if key not in baselines:
+            raise SystemExit(f"No baseline '{key}' in {BASELINES_FILE.name}; run with --save-baseline first")
+        regressions = check_baselines(results, baselines[key], args.threshold, args.slack_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions against baseline '{key}'")
+
+
+if __name__ == '__main__':
+    main()
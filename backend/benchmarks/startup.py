@@ -0,0 +1,112 @@
+"""Cold-start timings for serverless deployments.
+
+Every sample runs in a fresh interpreter: it times importing server.py, the
+first request to one route (which loads the tracker and whatever data files
+the route needs) and a second request to the same route. In both eager and
+lazy (LAZY_INIT) mode it also times the first access to the Gemini model.
+That cost lands on the first categorization in lazy mode and on import in
+eager mode. A placeholder API key is set so the SDK is really imported. None
+of the timed routes call the model.
+
+    cd backend
+    python -m benchmarks.startup --size 10000
+    python -m benchmarks.startup --size 10000 --save-baseline
+    python -m benchmarks.startup --size 10000 --check
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from .harness import BASELINES_FILE, check_baselines, summarize
+from .synthetic import write_dataset
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+ROUTES = ['/api/', '/api/salary', '/api/dashboard', '/api/expenses?limit=50']
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+client = server.app.test_client()
+client.get(sys.argv[1])
+first = time.perf_counter()
+client.get(sys.argv[1])
+second = time.perf_counter()
+server.get_ai_service().model
+model = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "first request": first - imported,
+    "second request": second - first,
+    "model": model - second,
+}))
+"""
+
+
+def sample(route, env):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, route], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=10000, help="number of synthetic expenses")
+    parser.add_argument('--storage', default='json', choices=['json', 'journal', 'sqlite'])
+    parser.add_argument('--repeat', type=int, default=5, help="fresh processes per route and mode")
+    parser.add_argument('--routes', nargs='*', default=ROUTES)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help="exit 1 if p50 regresses past the threshold")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed relative p50 regression")
+    parser.add_argument('--slack-ms', type=float, default=5.0, help="absolute slack added to every limit")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='expense-startup-') as tmp:
+        data_dir = Path(tmp) / 'data'
+        write_dataset(data_dir, args.size)
+        print(f"{'mode':<6} {'route':<24} {'import ms':>10} {'first ms':>10} {'second ms':>10} {'model ms':>10}")
+        for mode in ('eager', 'lazy'):
+            env = {
+                **os.environ,
+                'DATA_DIR': str(data_dir),
+                'STORAGE_BACKEND': args.storage,
+                'GOOGLE_API_KEY': 'startup-benchmark-placeholder',
+                'LAZY_INIT': 'true' if mode == 'lazy' else 'false',
+            }
+            for route in args.routes:
+                samples = [sample(route, env) for _ in range(args.repeat)]
+                row = {}
+                for phase in ('import', 'first request', 'second request', 'model'):
+                    row[phase] = summarize([s[phase] for s in samples])
+                    results[f"{mode} {route} {phase}"] = row[phase]
+                print(f"{mode:<6} {route:<24} {row['import']['p50_ms']:>10.1f} {row['first request']['p50_ms']:>10.1f} "
+                      f"{row['second request']['p50_ms']:>10.1f} {row['model']['p50_ms']:>10.1f}")
+
+    key = f"startup-{args.storage}-{args.size}"
+    baselines = json.loads(BASELINES_FILE.read_text()) if BASELINES_FILE.exists() else {}
+    if args.save_baseline:
+        baselines[key] = results
+        BASELINES_FILE.write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+        print(f"Saved baseline '{key}' to {BASELINES_FILE.name}")
+    if args.check:
+        if key not in baselines:
+            raise SystemExit(f"No baseline '{key}' in {BASELINES_FILE.name}; run with --save-baseline first")
+        regressions = check_baselines(results, baselines[key], args.threshold, args.slack_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions against baseline '{key}'")
+
+
+if __name__ == '__main__':
+    main()
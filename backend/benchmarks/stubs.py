@@ -0,0 +1,67 @@
+"""Offline stand-in for genai.GenerativeModel used by benchmarks."""
+import json
+import random
+import re
+import threading
+import time
+
+from .synthetic import CATEGORY_PROFILES
+
+_BATCH_LINE = re.compile(r'^\s*\d+\. "(.*)" - ', re.MULTILINE)
+_SINGLE_LINE = re.compile(r'Expense: "(.*)"')
+
+
+class StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubModel:
+    """Answers categorization prompts locally.
+
+    Categories come from the synthetic merchant table, so answers are stable.
+    `latency` (seconds) and `jitter` add an artificial delay, and
+    `failure_rate` makes that fraction of calls raise. `stall_rate` makes
+    that fraction of calls take `stall` seconds instead, like a hung upstream.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0, seed: int = 0,
+                 stall_rate: float = 0.0, stall: float = 30.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.merchants = {
+            merchant.lower(): category
+            for category, merchants, _ in CATEGORY_PROFILES
+            for merchant in merchants
+        }
+
+    def _categorize(self, name: str) -> str:
+        name = name.lower()
+        for merchant, category in self.merchants.items():
+            if merchant in name:
+                return category
+        return "Other"
+
+    def generate_content(self, prompt: str) -> StubResponse:
+        with self.lock:
+            self.calls += 1
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            fail = self.rng.random() < self.failure_rate
+            if self.rng.random() < self.stall_rate:
+                delay = self.stall
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise RuntimeError("stub model failure")
+
+        names = _BATCH_LINE.findall(prompt)
+        if names:
+            return StubResponse(json.dumps([self._categorize(name) for name in names]))
+        match = _SINGLE_LINE.search(prompt)
+        return StubResponse(self._categorize(match.group(1) if match else ""))
@@ -0,0 +1,94 @@
+"""Deterministic synthetic expense histories for benchmarks.
+
+The same (count, months, seed, end) always produces the same expenses, so
+timings from different runs and machines compare like for like.
+
+    cd backend && python -m benchmarks.synthetic --count 100000 --out /tmp/bench-data
+"""
+import argparse
+import json
+import random
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+# (category, merchants, typical amount in rupees)
+CATEGORY_PROFILES = [
+    ("Food & Dining", ["Swiggy", "Zomato", "Cafe Coffee Day", "Dominos Pizza", "Restaurant dinner", "Office lunch"], 350),
+    ("Transportation", ["Uber", "Ola cabs", "Metro card recharge", "Petrol pump", "Rapido", "Parking"], 250),
+    ("Bills & Utilities", ["BESCOM electricity", "Airtel postpaid", "Jio recharge", "ACT internet", "Water bill", "Gas cylinder"], 900),
+    ("Groceries", ["BigBasket", "DMart", "Blinkit", "Zepto", "Milk and bread", "Vegetables market"], 600),
+    ("Entertainment", ["Netflix", "Spotify", "PVR cinema", "BookMyShow", "Steam game", "Hotstar"], 400),
+    ("Shopping", ["Amazon", "Flipkart", "Myntra", "Ajio", "Decathlon", "Croma"], 1500),
+    ("Healthcare", ["Apollo pharmacy", "Practo consult", "Lab tests", "Dentist", "1mg order"], 800),
+    ("Education", ["Udemy course", "Coursera", "Books", "School fees"], 2000),
+    ("Travel", ["IndiGo flight", "IRCTC train", "MakeMyTrip hotel", "Goibibo"], 5000),
+    ("Personal Care", ["Salon", "Nykaa", "Gym membership"], 700),
+    ("Investment", ["Zerodha SIP", "Mutual fund", "PPF deposit"], 15000),
+    ("Insurance", ["LIC premium", "Health insurance", "Car insurance"], 8000),
+    ("Rent", ["House rent"], 25000),
+]
+# Relative frequency of each profile above
+CATEGORY_WEIGHTS = [30, 20, 8, 15, 6, 8, 3, 1, 2, 3, 1, 1, 1]
+# Last day of every history unless another end is given; fixed so a seed
+# describes the same expenses whichever day the benchmarks run
+DEFAULT_END = date(2025, 12, 31)
+
+
+def generate_expenses(count: int, months: int = 24, seed: int = 0, end: date = None):
+    """Yield `count` expenses spread over the `months` months ending at `end`."""
+    rng = random.Random(seed)
+    end = end or DEFAULT_END
+    start = end - timedelta(days=months * 30)
+    span = (end - start).days + 1
+    created_base = datetime.combine(start, datetime.min.time())
+
+    for index in range(count):
+        category, merchants, typical = rng.choices(CATEGORY_PROFILES, weights=CATEGORY_WEIGHTS)[0]
+        day = start + timedelta(days=int(span * index / count))
+        amount = round(max(1.0, rng.lognormvariate(0, 0.6) * typical), 2)
+        merchant = rng.choice(merchants)
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "name": f"{merchant} #{rng.randint(1, 9999)}" if rng.random() < 0.5 else merchant,
+            "amount": amount,
+            "category": category,
+            "date": day.isoformat(),
+            "description": "",
+            "created_at": (created_base + timedelta(seconds=index * (span * 86400 // max(count, 1)))).isoformat(),
+        }
+
+
+def write_dataset(data_dir: Path, count: int, months: int = 24, seed: int = 0, salary: float = 120000,
+                  end: date = None):
+    """Write expenses.json, budgets.json and salary.json in the server's file layout."""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    now = datetime.now().isoformat()
+    # Streamed so a million-row history never needs to exist as a list here
+    with open(data_dir / 'expenses.json', 'w') as f:
+        f.write('[')
+        for index, expense in enumerate(generate_expenses(count, months, seed, end)):
+            if index:
+                f.write(',')
+            f.write(json.dumps(expense))
+        f.write(']')
+    with open(data_dir / 'budgets.json', 'w') as f:
+        json.dump({"monthly": salary * 0.6, "categories": {}, "created_at": now}, f)
+    with open(data_dir / 'salary.json', 'w') as f:
+        json.dump({"monthly": salary, "currency": "₹", "created_at": now}, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--end', type=date.fromisoformat, default=DEFAULT_END, help="last day, YYYY-MM-DD")
+    parser.add_argument('--out', type=Path, required=True)
+    args = parser.parse_args()
+    write_dataset(args.out, args.count, args.months, args.seed, end=args.end)
+    print(f"Wrote {args.count} expenses to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
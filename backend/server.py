@@ -1,18 +1,46 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
 import json
 import logging
 from datetime import datetime, timedelta
+from fractions import Fraction
 from pathlib import Path
+from collections import OrderedDict, Counter, deque
+import abc
+import hmac
 import uuid
+import base64
+import csv
+import io
+import heapq
+import bisect
+import itertools
 from typing import Dict, List, Any, Optional
-import google.generativeai as genai
-from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
 import threading
+import queue
 import re
+import math
+import zlib
+import gzip
+import time
 import fcntl  # Added for file locking
+import sqlite3
+try:
+    import numpy as np
+except ImportError:  # Optional; enables the columnar analytics store
+    np = None
+try:
+    import orjson
+except ImportError:  # Optional; faster JSON encoding and parsing
+    orjson = None
+try:
+    import msgpack
+except ImportError:  # Optional; enables DATA_FORMAT=msgpack
+    msgpack = None
 
 # Load environment variables
 load_dotenv()
@@ -32,224 +60,3144 @@ CORS(app, origins=[os.getenv('FRONTEND_URL', 'http://localhost:3000')])  # Restr
 executor = ThreadPoolExecutor(max_workers=4)
 
 # Data storage paths
-DATA_DIR = Path(__file__).parent / 'data'
-DATA_DIR.mkdir(exist_ok=True)
+DATA_DIR = Path(os.getenv('DATA_DIR', str(Path(__file__).parent / 'data')))
+DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 EXPENSES_FILE = DATA_DIR / 'expenses.json'
 BUDGETS_FILE = DATA_DIR / 'budgets.json'
 SALARY_FILE = DATA_DIR / 'salary.json'
 PREDICTIONS_FILE = DATA_DIR / 'predictions.json'
+IMPORTS_FILE = DATA_DIR / 'imports.json'
+EXPENSES_JOURNAL_FILE = DATA_DIR / 'expenses.journal'
+SQLITE_FILE = DATA_DIR / 'expenses.db'
+DATA_LOCK_FILE = DATA_DIR / '.lock'
+DATA_VERSIONS_FILE = DATA_DIR / '.versions.json'
+
+DOCUMENT_FILES = {
+    'budgets': BUDGETS_FILE.name,
+    'salary': SALARY_FILE.name,
+    'predictions': PREDICTIONS_FILE.name,
+    'imports': IMPORTS_FILE.name,
+}
+
+# Storage backend: 'json' rewrites expenses.json on every change,
+# 'journal' appends each change to expenses.journal and compacts it into
+# expenses.json in the background once it grows past JOURNAL_COMPACT_BYTES,
+# 'sqlite' keeps everything in expenses.db (existing JSON data is migrated
+# on first start)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json').lower()
+JOURNAL_COMPACT_BYTES = int(os.getenv('JOURNAL_COMPACT_BYTES', str(1024 * 1024)))
+
+# On-disk format of expenses.json and the documents: 'json' (indented, the
+# original layout), 'compact' (minified JSON), 'gzip' (minified JSON in
+# .json.gz files) or 'msgpack' (.msgpack files, needs the msgpack package
+# from requirements-optional.txt). Files found in another format are
+# converted on startup; an unknown or uninstalled format stops startup
+DATA_FORMAT = os.getenv('DATA_FORMAT', 'json').lower()
+
+# Enable when several worker processes (e.g. gunicorn -w N) share DATA_DIR:
+# mutations are serialized with a lock file and each worker applies the
+# other workers' changes before serving a request
+MULTI_WORKER_MODE = os.getenv('MULTI_WORKER_MODE', 'false').lower() == 'true'
+# Rows kept in the SQLite change log that workers catch up from
+SQLITE_CHANGES_KEPT = int(os.getenv('SQLITE_CHANGES_KEPT', '10000'))
+
+# Defer the Gemini SDK import until the model is first used and read each
+# data file only when a request first needs it; on by default on Vercel,
+# where every cold start pays for eager initialization
+LAZY_INIT = os.getenv('LAZY_INIT', 'true' if os.getenv('VERCEL') else 'false').lower() == 'true'
+
+# Each user's data lives in its own partition under data/users/<user id>,
+# created on the user's first write. The user id comes from the X-User-Id
+# header, which only an authenticating reverse proxy may set: it is accepted
+# when USER_PROXY_SECRET is configured and every request carries it in
+# X-Proxy-Secret. Without the secret the header is refused, and requests
+# without the header use the original top-level data files
+USER_ID_HEADER = 'X-User-Id'
+USER_PROXY_SECRET_HEADER = 'X-Proxy-Secret'
+USER_PROXY_SECRET = os.getenv('USER_PROXY_SECRET', '')
+USER_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+DEFAULT_USER_ID = 'default'
+# Loaded trackers are kept in an LRU and dropped once idle
+MAX_LOADED_TRACKERS = int(os.getenv('MAX_LOADED_TRACKERS', '100'))
+TRACKER_IDLE_SECONDS = float(os.getenv('TRACKER_IDLE_SECONDS', '600'))
+
+# Serialized read responses kept per tracker for the current data version
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '64'))
+
+# Request, storage and AI metrics exported from /api/metrics in Prometheus
+# text format; counters are per process
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Keep NumPy columns next to the expense records for analytics and
+# filtered listings. On by default when NumPy is installed (see
+# requirements-optional.txt); set explicitly, a missing NumPy stops startup
+COLUMNAR_STORE = os.getenv('COLUMNAR_STORE', 'true').lower() == 'true'
+if COLUMNAR_STORE and np is None:
+    if 'COLUMNAR_STORE' in os.environ:
+        raise RuntimeError("COLUMNAR_STORE=true needs NumPy; pip install -r requirements-optional.txt")
+    COLUMNAR_STORE = False
+
+# Expense listing
+EXPENSES_PAGE_SIZE = int(os.getenv('EXPENSES_PAGE_SIZE', '50'))
+EXPENSES_MAX_PAGE_SIZE = int(os.getenv('EXPENSES_MAX_PAGE_SIZE', '500'))
+EXPENSES_STREAM_BATCH = 500
+EXPENSE_SORT_FIELDS = ('date', 'created_at', 'amount')
+EXPENSES_BATCH_MAX = int(os.getenv('EXPENSES_BATCH_MAX', '1000'))
+
+# History export: rows are encoded a batch at a time and sent in chunks of
+# EXPORT_CHUNK_BYTES. Sent uncompressed unless the request asks for
+# ?compress=gzip, which gzips on the fly when the client also accepts it
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_COMPRESSION = ('none', 'gzip')
+EXPORT_CSV_FIELDS = ('id', 'date', 'name', 'amount', 'category', 'description', 'created_at')
+EXPORT_CHUNK_BYTES = int(os.getenv('EXPORT_CHUNK_BYTES', str(64 * 1024)))
+EXPORT_GZIP_LEVEL = int(os.getenv('EXPORT_GZIP_LEVEL', '1'))
+
+# Expense search
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', '20'))
+SEARCH_SUGGESTIONS = 10
+SEARCH_TOKEN_PATTERN = re.compile(r'\w+')
+
+# Statement import: CSV columns are mapped through a profile (see
+# DEFAULT_IMPORT_PROFILES for the format) and rows are committed
+# IMPORT_CHUNK_SIZE at a time, with progress saved after every chunk so an
+# interrupted import can be resumed
+IMPORT_PROFILES_FILE = Path(os.getenv('IMPORT_PROFILES_FILE', str(DATA_DIR / 'import_profiles.json')))
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '500'))
+IMPORTS_KEPT = 20
+IMPORT_ERRORS_KEPT = 20
+
+# Spending trends
+TRENDS_INTERVALS = ('day', 'week', 'month')
+TRENDS_MAX_BUCKETS = int(os.getenv('TRENDS_MAX_BUCKETS', '1000'))
 
 # AI Configuration
+EXPENSE_CATEGORIES = [
+    "Food & Dining", "Transportation", "Bills & Utilities", 
+    "Entertainment", "Shopping", "Groceries", "Healthcare", 
+    "Education", "Travel", "Personal Care", "Investment", 
+    "Insurance", "Rent", "Other"
+]
+# Maximum number of expenses sent to the model in a single prompt
+AI_BATCH_PROMPT_SIZE = int(os.getenv('AI_BATCH_PROMPT_SIZE', '50'))
+
+# Local classifier trained on the user's own history; its answer is used
+# instead of calling the model when it is at least this confident
+LOCAL_CLASSIFIER_ENABLED = os.getenv('LOCAL_CLASSIFIER_ENABLED', 'true').lower() == 'true'
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv('LOCAL_CLASSIFIER_THRESHOLD', '0.9'))
+LOCAL_CLASSIFIER_MIN_EXAMPLES = int(os.getenv('LOCAL_CLASSIFIER_MIN_EXAMPLES', '20'))
+
+# Keyword/regex/amount rules used when the model is unavailable; see
+# DEFAULT_CATEGORY_RULES for the format
+CATEGORY_RULES_FILE = Path(os.getenv('CATEGORY_RULES_FILE', str(DATA_DIR / 'category_rules.json')))
+
+# Coalesce categorizations arriving within AI_BATCH_WINDOW_MS into one prompt
+# of up to AI_BATCH_MAX_SIZE expenses (0 disables coalescing)
+AI_BATCH_WINDOW_MS = float(os.getenv('AI_BATCH_WINDOW_MS', '0'))
+AI_BATCH_MAX_SIZE = int(os.getenv('AI_BATCH_MAX_SIZE', '20'))
+
+# Cache of AI categorizations keyed by normalized name and amount bucket.
+# Shared by all users: it only holds model answers, which depend on nothing
+# but the name and amount; a user's own category choices are never stored
+# in it, they only invalidate the entry
+CATEGORY_CACHE_ENABLED = os.getenv('CATEGORY_CACHE_ENABLED', 'true').lower() == 'true'
+CATEGORY_CACHE_FILE = DATA_DIR / 'category_cache.db'
+CATEGORY_CACHE_SIZE = int(os.getenv('CATEGORY_CACHE_SIZE', '10000'))
+CATEGORY_CACHE_TTL = float(os.getenv('CATEGORY_CACHE_TTL', str(30 * 24 * 3600)))
+
+# Gemini call guards. Each call waits at most AI_TIMEOUT_SECONDS, queueing
+# for one of AI_MAX_CONCURRENT slots included. AI_BREAKER_FAILURES failed,
+# timed-out or slow (over AI_BREAKER_SLOW_SECONDS) calls in a row open the
+# circuit breaker: the model is skipped for AI_BREAKER_COOLDOWN_SECONDS, then
+# one trial call decides whether it closes again
+AI_TIMEOUT_SECONDS = float(os.getenv('AI_TIMEOUT_SECONDS', '10'))
+AI_MAX_CONCURRENT = int(os.getenv('AI_MAX_CONCURRENT', '8'))
+AI_BREAKER_FAILURES = int(os.getenv('AI_BREAKER_FAILURES', '5'))
+AI_BREAKER_SLOW_SECONDS = float(os.getenv('AI_BREAKER_SLOW_SECONDS', '5'))
+AI_BREAKER_COOLDOWN_SECONDS = float(os.getenv('AI_BREAKER_COOLDOWN_SECONDS', '30'))
+# Single categorizations answer with the rule-based category when the model
+# misses this budget; its late answer still goes into the cache (0 disables)
+AI_HEDGE_SECONDS = float(os.getenv('AI_HEDGE_SECONDS', '0'))
+
+# 'sync' categorizes inside the request; 'async' saves the rule-based category
+# right away and refines it with the model on the background executor
+CATEGORIZATION_MODE = os.getenv('CATEGORIZATION_MODE', 'sync').lower()
+CATEGORY_UPDATES_KEPT = int(os.getenv('CATEGORY_UPDATES_KEPT', '1000'))
+
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY', '')
-AI_ENABLED = False
+AI_ENABLED = bool(GOOGLE_API_KEY) and GOOGLE_API_KEY != 'your_google_api_key_here'
+if not AI_ENABLED:
+    logger.info("AI service disabled - no API key provided")
 
-if GOOGLE_API_KEY and GOOGLE_API_KEY != 'your_google_api_key_here':
+def create_ai_model():
+    # The SDK is imported here rather than at module load since it is slow
+    # to import; AI_ENABLED is cleared if it cannot be configured
+    global AI_ENABLED
     try:
+        import google.generativeai as genai
         genai.configure(api_key=GOOGLE_API_KEY)
-        AI_ENABLED = True
         logger.info("AI service enabled with Google Gemini")
     except Exception as e:
         logger.error(f"Failed to configure AI service: {e}")
         AI_ENABLED = False
-else:
-    logger.info("AI service disabled - no API key provided")
+        return None
+    try:
+        model = genai.GenerativeModel('gemini-pro')
+        logger.info("AI model initialized successfully")
+        return model
+    except Exception as e:
+        logger.error(f"Failed to initialize AI model: {e}")
+        return None
+
+# Metrics
+class Metrics:
+    def __init__(self, enabled: bool = True, buckets: tuple = METRICS_LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.families: Dict[str, tuple] = {}  # name -> (type, help)
+        self.samples: Dict[str, Dict[tuple, Any]] = {}  # name -> labels -> value or histogram cells
+        self.collectors = []
+    
+    def describe(self, name: str, kind: str, help_text: str):
+        self.families[name] = (kind, help_text)
+        self.samples.setdefault(name, {})
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.samples[name]
+            series[key] = series.get(key, 0) + value
+    
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            cells = self.samples[name].get(key)
+            if cells is None:
+                # One count per bucket plus +Inf, then the running sum
+                cells = self.samples[name][key] = [0] * (len(self.buckets) + 1) + [0.0]
+            cells[index] += 1
+            cells[-1] += value
+    
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+    
+    def register_collector(self, collect):
+        # collect() returns [(name, type, help, [(labels, value), ...]), ...]
+        # for values that already live elsewhere and are read at scrape time
+        self.collectors.append(collect)
+    
+    @staticmethod
+    def _labels(labels, extra: tuple = ()) -> str:
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escaped = []
+        for key, value in pairs:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            escaped.append(f'{key}="{value}"')
+        return '{' + ','.join(escaped) + '}'
+    
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            snapshot = {name: {key: list(value) if isinstance(value, list) else value
+                               for key, value in series.items()}
+                        for name, series in self.samples.items()}
+        for name, (kind, help_text) in self.families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in snapshot[name].items():
+                if kind != 'histogram':
+                    lines.append(f"{name}{self._labels(key)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), value[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self._labels(key, (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{self._labels(key)} {value[-1]}")
+                lines.append(f"{name}_count{self._labels(key)} {cumulative}")
+        for collect in self.collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, help_text, values in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values:
+                    lines.append(f"{name}{self._labels(sorted(labels.items()))} {value}")
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics(METRICS_ENABLED)
+metrics.describe('expense_http_request_duration_seconds', 'histogram', 'Request latency by route')
+metrics.describe('expense_http_requests_total', 'counter', 'Requests by route and status')
+metrics.describe('expense_http_requests_in_flight', 'gauge', 'Requests currently being handled')
+metrics.describe('expense_storage_duration_seconds', 'histogram', 'Storage load/save latency')
+metrics.describe('expense_storage_bytes_total', 'counter', 'Bytes read and written by storage')
+metrics.describe('expense_storage_errors_total', 'counter', 'Failed storage operations')
+metrics.describe('expense_ai_request_duration_seconds', 'histogram', 'Gemini call latency')
+metrics.describe('expense_ai_requests_total', 'counter', 'Gemini calls by outcome')
+metrics.describe('expense_ai_hedges_total', 'counter', 'Categorizations answered by the rules after missing the hedge budget')
+metrics.describe('expense_categorizations_total', 'counter', 'Categorizations by the tier that answered')
+metrics.describe('expense_response_cache_total', 'counter', 'Cached read responses by result')
+metrics.describe('expense_external_reloads_total', 'counter', 'Reloads of data changed by other workers')
+metrics.describe('expense_import_rows_total', 'counter', 'Imported statement rows by outcome')
+
+@app.before_request
+def start_request_timer():
+    if metrics.enabled:
+        g.request_started = time.perf_counter()
+        metrics.inc('expense_http_requests_in_flight')
+
+@app.after_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(exc):
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    # Routes are labelled by rule so ids in the path do not add series;
+    # streamed bodies are timed until the response object is returned
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = 500 if exc is not None else g.pop('response_status', 500)
+    metrics.observe('expense_http_request_duration_seconds', time.perf_counter() - started,
+                    route=route, method=request.method)
+    metrics.inc('expense_http_requests_total', route=route, method=request.method, status=status)
+    metrics.inc('expense_http_requests_in_flight', -1)
+
+# Serialization
+def json_dumps(data, pretty: bool = False) -> bytes:
+    if orjson is not None:
+        try:
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+            return orjson.dumps(data, default=str, option=option)
+        except TypeError:
+            pass  # e.g. integers wider than 64 bits; the stdlib encoder handles them
+    if pretty:
+        return json.dumps(data, indent=2, default=str).encode()
+    return json.dumps(data, separators=(',', ':'), default=str).encode()
+
+def json_loads(data):
+    # orjson's decode error subclasses json.JSONDecodeError
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+class DataCodec:
+    def __init__(self, name: str, suffix: str, dumps, loads):
+        self.name = name
+        self.suffix = suffix
+        self.dumps = dumps  # data -> bytes
+        self.loads = loads  # bytes -> data
+
+DATA_CODECS = {
+    'json': DataCodec('json', '.json', lambda data: json_dumps(data, pretty=True), json_loads),
+    'compact': DataCodec('compact', '.json', json_dumps, json_loads),
+    'gzip': DataCodec('gzip', '.json.gz', lambda data: gzip.compress(json_dumps(data), compresslevel=1),
+                      lambda payload: json_loads(gzip.decompress(payload))),
+}
+if msgpack is not None:
+    DATA_CODECS['msgpack'] = DataCodec(
+        'msgpack', '.msgpack', lambda data: msgpack.packb(data, default=str),
+        lambda payload: msgpack.unpackb(payload, strict_map_key=False)
+    )
+
+def get_data_codec(name: str) -> DataCodec:
+    codec = DATA_CODECS.get(name)
+    if codec is None:
+        if name == 'msgpack':
+            raise RuntimeError("DATA_FORMAT=msgpack needs msgpack; pip install -r requirements-optional.txt")
+        raise RuntimeError(f"DATA_FORMAT must be one of: json, compact, gzip, msgpack (got '{name}')")
+    return codec
+
+# Checked on import: a format the server cannot write stops startup rather
+# than leaving the data in another format than the one configured
+get_data_codec(DATA_FORMAT)
+
+# Append-only expense journal
+class ExpenseJournal:
+    def __init__(self, snapshot_file: Path, journal_file: Path, compact_bytes: int,
+                 codec: Optional[DataCodec] = None):
+        self.snapshot_file = snapshot_file
+        self.codec = codec or DATA_CODECS['json']
+        self.journal_file = journal_file
+        # Journal segment being folded into the snapshot by a compaction
+        self.compacting_file = journal_file.with_name(journal_file.name + '.compacting')
+        self.compact_bytes = compact_bytes
+        self.lock = threading.Lock()
+        self.compaction_scheduled = False
+        # How far this process has read or written: the snapshot it started
+        # from and the journal inode/offset after it. offset None means the
+        # position is unknown and the next read_tail() asks for a full load
+        self.snapshot_stamp = None
+        self.journal_ino = None
+        self.offset = 0
+    
+    @staticmethod
+    def _stamp(stat_result) -> tuple:
+        return (stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+    
+    def _snapshot_stamp(self) -> Optional[tuple]:
+        try:
+            return self._stamp(os.stat(self.snapshot_file))
+        except FileNotFoundError:
+            return None
+    
+    def _journal_position(self) -> tuple:
+        try:
+            stat_result = os.stat(self.journal_file)
+        except FileNotFoundError:
+            return None, 0
+        return stat_result.st_ino, stat_result.st_size
+    
+    def load(self) -> List[Dict]:
+        expenses = {}
+        self.snapshot_stamp = self._read_snapshot(expenses)
+        # Replay is idempotent per id, so a segment that was already folded
+        # into the snapshot before a crash can safely be applied again
+        if self.compacting_file.exists():
+            self._replay(self.compacting_file, expenses)
+        self.journal_ino, self.offset = None, 0
+        if self.journal_file.exists():
+            self.journal_ino, self.offset = self._replay(self.journal_file, expenses)
+        return list(expenses.values())
+    
+    def _read_snapshot(self, expenses: Dict[str, Dict]) -> Optional[tuple]:
+        if not self.snapshot_file.exists():
+            return None
+        with open(self.snapshot_file, 'rb') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+            stat_result = os.fstat(f.fileno())
+            metrics.inc('expense_storage_bytes_total', stat_result.st_size, op='load', target='expenses')
+            for exp in self.codec.loads(f.read()):
+                expenses[exp['id']] = exp
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return self._stamp(stat_result)
+    
+    def _replay(self, path: Path, expenses: Dict[str, Dict]) -> tuple:
+        with open(path, 'rb') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+            stat_result = os.fstat(f.fileno())
+            metrics.inc('expense_storage_bytes_total', stat_result.st_size, op='load', target='journal')
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json_loads(line)
+                except json.JSONDecodeError:
+                    # A torn final record from a crash mid-append is dropped
+                    logger.warning(f"Skipping unreadable journal record {path.name}:{line_no}")
+                    continue
+                self.apply_record(record, expenses)
+            position = f.tell()
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return stat_result.st_ino, position
+    
+    @staticmethod
+    def apply_record(record: Dict, expenses: Dict[str, Dict]):
+        if record['op'] in ('add', 'update'):
+            expenses[record['expense']['id']] = record['expense']
+        elif record['op'] == 'delete':
+            expenses.pop(record['id'], None)
+    
+    def read_tail(self) -> Optional[List[Dict]]:
+        # Records other processes appended since this one last read or wrote
+        # the journal, or None if it was compacted meanwhile
+        if self.offset is None or self._snapshot_stamp() != self.snapshot_stamp:
+            return None
+        try:
+            f = open(self.journal_file, 'rb')
+        except FileNotFoundError:
+            return [] if self.journal_ino is None else None
+        with f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+            stat_result = os.fstat(f.fileno())
+            if self.journal_ino is None and self.offset == 0:
+                # Created since the last load or compaction
+                self.journal_ino = stat_result.st_ino
+            if stat_result.st_ino != self.journal_ino or stat_result.st_size < self.offset:
+                return None
+            f.seek(self.offset)
+            data = f.read()
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        # A record still being written has no newline yet; it is read next time
+        end = data.rfind(b'\n') + 1
+        self.offset += end
+        metrics.inc('expense_storage_bytes_total', end, op='load', target='journal')
+        records = []
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json_loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping unreadable journal record in {self.journal_file.name}")
+        return records
+    
+    def append(self, records: List[Dict]) -> int:
+        payload = b''.join(json_dumps(record) + b'\n' for record in records)
+        with self.lock:
+            with open(self.journal_file, 'ab') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+                ino = os.fstat(f.fileno()).st_ino
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            # Only advance past our own records if nothing unread precedes them
+            if self.offset == size - len(payload) and self.journal_ino in (None, ino):
+                self.journal_ino, self.offset = ino, size
+        metrics.inc('expense_storage_bytes_total', len(payload), op='append', target='journal')
+        return size
+    
+    def needs_compaction(self, journal_size: int) -> bool:
+        with self.lock:
+            if self.compaction_scheduled or journal_size < self.compact_bytes:
+                return False
+            self.compaction_scheduled = True
+            return True
+    
+    def compact(self, snapshot_source, exclusive=nullcontext):
+        # exclusive() is held for the whole compaction when other processes
+        # share the files, so their appends wait for it to finish
+        started = time.perf_counter()
+        try:
+            with exclusive():
+                with self.lock:
+                    if self._journal_position()[1] < self.compact_bytes:
+                        # Another process compacted first
+                        return
+                    # The in-memory copy reflects everything journaled so far
+                    # unless another process appended since our last read
+                    in_sync = (self._snapshot_stamp() == self.snapshot_stamp
+                               and self._journal_position() == (self.journal_ino, self.offset))
+                    if in_sync:
+                        expenses = list(snapshot_source())
+                    if self.journal_file.exists():
+                        if self.compacting_file.exists():
+                            # A previous compaction crashed; keep its records too
+                            with open(self.journal_file, 'r') as src, open(self.compacting_file, 'a') as dst:
+                                dst.write(src.read())
+                                dst.flush()
+                                os.fsync(dst.fileno())
+                            self.journal_file.unlink()
+                        else:
+                            os.replace(self.journal_file, self.compacting_file)
+                    self.journal_ino, self.offset = None, (0 if in_sync else None)
+                
+                if not in_sync:
+                    # Rebuild from the files; the rotated segment holds every
+                    # record appended before the rotation
+                    current = {}
+                    self._read_snapshot(current)
+                    if self.compacting_file.exists():
+                        self._replay(self.compacting_file, current)
+                    expenses = list(current.values())
+                
+                tmp_file = self.snapshot_file.with_name(self.snapshot_file.name + '.tmp')
+                with open(tmp_file, 'wb') as f:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                    f.write(self.codec.dumps(expenses))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    metrics.inc('expense_storage_bytes_total', f.tell(), op='compact', target='expenses')
+                    snapshot_stamp = self._stamp(os.fstat(f.fileno()))
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                os.replace(tmp_file, self.snapshot_file)
+                if in_sync:
+                    self.snapshot_stamp = snapshot_stamp
+                if self.compacting_file.exists():
+                    self.compacting_file.unlink()
+            logger.info(f"Compacted expense journal into snapshot ({len(expenses)} expenses)")
+        except Exception as e:
+            logger.error(f"Error compacting expense journal: {e}")
+            metrics.inc('expense_storage_errors_total', op='compact', target='expenses')
+        finally:
+            metrics.observe('expense_storage_duration_seconds', time.perf_counter() - started,
+                            op='compact', target='expenses')
+            with self.lock:
+                self.compaction_scheduled = False
+
+# Expense queries
+def expense_matches(expense: Dict, filters: Dict) -> bool:
+    if filters.get('date_from') and expense['date'] < filters['date_from']:
+        return False
+    if filters.get('date_to') and expense['date'] > filters['date_to']:
+        return False
+    if filters.get('categories') and expense['category'] not in filters['categories']:
+        return False
+    if filters.get('min_amount') is not None and expense['amount'] < filters['min_amount']:
+        return False
+    if filters.get('max_amount') is not None and expense['amount'] > filters['max_amount']:
+        return False
+    text = filters.get('text')
+    if text and text not in expense['name'].lower() and text not in expense.get('description', '').lower():
+        return False
+    return True
+
+def expense_sort_key(expense: Dict, sort: str) -> tuple:
+    # The id breaks ties so every expense has a unique position for cursors
+    return (expense[sort], expense['id'])
+
+def expense_dedup_key(expense: Dict) -> tuple:
+    # Same day, same amount to the paisa and the same words in the name
+    return (expense['date'], round(expense['amount'] * 100),
+            ' '.join(SEARCH_TOKEN_PATTERN.findall(expense['name'].lower())))
+
+# Storage backends
+class ExpenseStorage(abc.ABC):
+    # Backends that answer listing queries themselves rather than from the
+    # loaded records
+    QUERIES_IN_SQL = False
+    
+    def __init__(self, data_dir: Path = DATA_DIR, shared: bool = False):
+        self.data_dir = data_dir
+        self.shared = shared
+        self.process_lock = threading.RLock()
+        self.lock_depth = 0
+        self.lock_fd = None
+    
+    @contextmanager
+    def exclusive(self):
+        # Serializes writers across processes sharing the data directory;
+        # re-entrant, and yields True to the outermost holder
+        if not self.shared:
+            yield False
+            return
+        with self.process_lock:
+            outermost = self.lock_depth == 0
+            if outermost:
+                self.lock_fd = os.open(self.data_dir / DATA_LOCK_FILE.name, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+            self.lock_depth += 1
+            try:
+                yield outermost
+            finally:
+                self.lock_depth -= 1
+                if outermost:
+                    fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+                    os.close(self.lock_fd)
+                    self.lock_fd = None
+    
+    def poll_changes(self) -> Optional[Dict]:
+        # Returns None when no other process wrote since the last poll, else
+        # {"expenses": full list or None, "records": journal-style add/update/
+        # delete records to apply in order, "documents": names to reload}
+        return None
+    
+    @abc.abstractmethod
+    def load_expenses(self) -> List[Dict]:
+        raise NotImplementedError
+    
+    @abc.abstractmethod
+    def save_expenses(self, expenses: List[Dict]):
+        raise NotImplementedError
+    
+    def add_expenses(self, new_expenses: List[Dict], expenses: List[Dict]):
+        self.save_expenses(expenses)
+    
+    def update_expenses(self, updated_expenses: List[Dict], expenses: List[Dict]):
+        self.save_expenses(expenses)
+    
+    def delete_expenses(self, expense_ids: List[str], expenses: List[Dict]):
+        self.save_expenses(expenses)
+    
+    @abc.abstractmethod
+    def load_document(self, name: str) -> Optional[Dict]:
+        raise NotImplementedError
+    
+    @abc.abstractmethod
+    def save_document(self, name: str, data: Dict):
+        raise NotImplementedError
+    
+    # Queries are answered from the loaded list unless the backend can do better
+    def month_expenses(self, month: str, expenses: List[Dict]) -> List[Dict]:
+        return [exp for exp in expenses if exp['date'].startswith(month)]
+    
+    def category_expenses(self, category: str, expenses: List[Dict]) -> List[Dict]:
+        return [exp for exp in expenses if exp['category'] == category]
+    
+    def recent_expenses(self, limit: int, expenses: List[Dict]) -> List[Dict]:
+        return sorted(expenses, key=lambda x: x['created_at'], reverse=True)[:limit]
+    
+    def _query_matches(self, filters: Dict, sort: str, descending: bool,
+                       after: Optional[tuple], expenses: List[Dict]):
+        matches = (exp for exp in expenses if expense_matches(exp, filters))
+        if after is not None:
+            if descending:
+                matches = (exp for exp in matches if expense_sort_key(exp, sort) < after)
+            else:
+                matches = (exp for exp in matches if expense_sort_key(exp, sort) > after)
+        return matches
+    
+    def query_expenses(self, filters: Dict, sort: str, descending: bool, after: Optional[tuple],
+                       limit: int, expenses: List[Dict]) -> List[Dict]:
+        matches = self._query_matches(filters, sort, descending, after, expenses)
+        select = heapq.nlargest if descending else heapq.nsmallest
+        return select(limit, matches, key=lambda exp: expense_sort_key(exp, sort))
+    
+    def iter_expenses(self, filters: Dict, sort: str, descending: bool, after: Optional[tuple],
+                      expenses: List[Dict]):
+        # Sorting references to the loaded records keeps the stream's own
+        # footprint to one pointer per matching row
+        matches = self._query_matches(filters, sort, descending, after, expenses)
+        yield from sorted(matches, key=lambda exp: expense_sort_key(exp, sort), reverse=descending)
+
+class JsonStorage(ExpenseStorage):
+    def __init__(self, data_dir: Path = DATA_DIR, shared: bool = False, codec: Optional[DataCodec] = None):
+        super().__init__(data_dir, shared)
+        self.codec = codec or get_data_codec(DATA_FORMAT)
+        self.expenses_file = self._path('expenses')
+        # Per-file change counters bumped by every write in shared mode; a
+        # worker reloads only the files whose counter moved
+        self.versions_file = data_dir / DATA_VERSIONS_FILE.name
+        self.seen_versions = self._read_versions() if shared else {}
+        with self.exclusive():
+            self._convert_files()
+    
+    def _path(self, name: str, codec: Optional[DataCodec] = None) -> Path:
+        return self.data_dir / f"{name}{(codec or self.codec).suffix}"
+    
+    def _convert_files(self):
+        # Files left in another format (e.g. before DATA_FORMAT changed) are
+        # rewritten in the configured one; the originals are kept as .bak
+        for name in ('expenses', *DOCUMENT_FILES):
+            target = self._path(name)
+            if target.exists():
+                continue
+            for codec in DATA_CODECS.values():
+                source = self._path(name, codec)
+                if source == target or not source.exists():
+                    continue
+                self._write_file(target, self._read_file(source, codec))
+                os.replace(source, source.with_name(source.name + '.bak'))
+                logger.info(f"Converted {source.name} to {target.name}")
+                break
+    
+    def _read_file(self, path: Path, codec: Optional[DataCodec] = None):
+        with open(path, 'rb') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH)  # Shared lock for reading
+            payload = f.read()
+            metrics.inc('expense_storage_bytes_total', len(payload), op='load', target=path.name.split('.')[0])
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return (codec or self.codec).loads(payload)
+    
+    def _write_file(self, path: Path, data):
+        # Replaced atomically so readers in other processes never see a
+        # truncated file
+        payload = self.codec.dumps(data)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)  # Exclusive lock for writing
+            f.write(payload)
+            metrics.inc('expense_storage_bytes_total', len(payload), op='save', target=path.name.split('.')[0])
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        os.replace(tmp_path, path)
+    
+    def _read_versions(self) -> Dict[str, int]:
+        try:
+            with open(self.versions_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+    
+    def _bump_version(self, name: str):
+        if not self.shared:
+            return
+        with self.exclusive():
+            versions = self._read_versions()
+            versions[name] = versions.get(name, 0) + 1
+            tmp_path = self.versions_file.with_name(self.versions_file.name + '.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(versions, f)
+            os.replace(tmp_path, self.versions_file)
+            self.seen_versions[name] = versions[name]
+    
+    def poll_changes(self) -> Optional[Dict]:
+        if not self.shared:
+            return None
+        versions = self._read_versions()
+        changed = [name for name, version in versions.items() if self.seen_versions.get(name) != version]
+        if not changed:
+            return None
+        # Recorded before reading, so a write landing meanwhile is seen next poll
+        self.seen_versions.update(versions)
+        changes = {"expenses": None, "records": [], "documents": [name for name in changed if name in DOCUMENT_FILES]}
+        if 'expenses' in changed:
+            changes.update(self._reload_expenses())
+        return changes
+    
+    def _reload_expenses(self) -> Dict:
+        return {"expenses": self.load_expenses()}
+    
+    def load_expenses(self) -> List[Dict]:
+        if self.expenses_file.exists():
+            return self._read_file(self.expenses_file)
+        return []
+    
+    def save_expenses(self, expenses: List[Dict]):
+        with self.exclusive():
+            self._write_file(self.expenses_file, expenses)
+            self._bump_version('expenses')
+    
+    def load_document(self, name: str) -> Optional[Dict]:
+        path = self._path(name)
+        if path.exists():
+            return self._read_file(path)
+        return None
+    
+    def save_document(self, name: str, data: Dict):
+        with self.exclusive():
+            self._write_file(self._path(name), data)
+            self._bump_version(name)
+
+class JournalStorage(JsonStorage):
+    def __init__(self, data_dir: Path = DATA_DIR, compact_bytes: int = JOURNAL_COMPACT_BYTES,
+                 shared: bool = False):
+        super().__init__(data_dir, shared)
+        self.journal = ExpenseJournal(self.expenses_file, data_dir / EXPENSES_JOURNAL_FILE.name, compact_bytes,
+                                      self.codec)
+    
+    def load_expenses(self) -> List[Dict]:
+        # Under the lock so a compaction in another process cannot move
+        # records between files while they are being read
+        with self.exclusive():
+            return self.journal.load()
+    
+    def _reload_expenses(self) -> Dict:
+        records = self.journal.read_tail()
+        if records is None:
+            return {"expenses": self.load_expenses()}
+        return {"records": records}
+    
+    def add_expenses(self, new_expenses: List[Dict], expenses: List[Dict]):
+        self._append([{"op": "add", "expense": exp} for exp in new_expenses], expenses)
+    
+    def update_expenses(self, updated_expenses: List[Dict], expenses: List[Dict]):
+        self._append([{"op": "update", "expense": exp} for exp in updated_expenses], expenses)
+    
+    def delete_expenses(self, expense_ids: List[str], expenses: List[Dict]):
+        self._append([{"op": "delete", "id": expense_id} for expense_id in expense_ids], expenses)
+    
+    def _append(self, records: List[Dict], expenses: List[Dict]):
+        with self.exclusive():
+            size = self.journal.append(records)
+            self._bump_version('expenses')
+        if self.journal.needs_compaction(size):
+            executor.submit(self.journal.compact, lambda: list(expenses), self.exclusive)
+
+class SqliteStorage(ExpenseStorage):
+    QUERIES_IN_SQL = True
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS expenses (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            amount REAL NOT NULL,
+            category TEXT NOT NULL,
+            date TEXT NOT NULL,
+            description TEXT,
+            created_at TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date);
+        CREATE INDEX IF NOT EXISTS idx_expenses_category_date ON expenses(category, date);
+        CREATE INDEX IF NOT EXISTS idx_expenses_created_at ON expenses(created_at);
+        CREATE TABLE IF NOT EXISTS documents (
+            name TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+    
+    UPSERT_EXPENSE = """
+        INSERT INTO expenses (id, name, amount, category, date, description, created_at, data)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            name = excluded.name, amount = excluded.amount, category = excluded.category,
+            date = excluded.date, description = excluded.description,
+            created_at = excluded.created_at, data = excluded.data
+    """
+    UPSERT_DOCUMENT = """
+        INSERT INTO documents (name, data) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET data = excluded.data
+    """
+    # In shared mode every write is logged so workers can fetch just the rows
+    # that other workers changed
+    CHANGE_LOG_TRIGGERS = {
+        'expenses_insert_log': "AFTER INSERT ON expenses BEGIN "
+                               "INSERT INTO changes (kind, key) VALUES ('expense', NEW.id); END",
+        'expenses_update_log': "AFTER UPDATE ON expenses BEGIN "
+                               "INSERT INTO changes (kind, key) VALUES ('expense', NEW.id); END",
+        'expenses_delete_log': "AFTER DELETE ON expenses BEGIN "
+                               "INSERT INTO changes (kind, key) VALUES ('expense', OLD.id); END",
+        'documents_insert_log': "AFTER INSERT ON documents BEGIN "
+                                "INSERT INTO changes (kind, key) VALUES ('document', NEW.name); END",
+        'documents_update_log': "AFTER UPDATE ON documents BEGIN "
+                                "INSERT INTO changes (kind, key) VALUES ('document', NEW.name); END",
+    }
+    
+    def __init__(self, data_dir: Path = DATA_DIR, shared: bool = False):
+        super().__init__(data_dir, shared)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(data_dir / SQLITE_FILE.name), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.exclusive():
+            self.conn.executescript(self.SCHEMA)
+            self._migrate_json()
+            with self.conn:
+                self.conn.execute(
+                    "CREATE TABLE IF NOT EXISTS changes "
+                    "(seq INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, key TEXT NOT NULL)"
+                )
+                for name, body in self.CHANGE_LOG_TRIGGERS.items():
+                    if shared:
+                        self.conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+                    else:
+                        self.conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        # data_version only moves when another connection commits
+        self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        self.change_seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+    
+    def _migrate_json(self):
+        with self.lock:
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                return
+        
+        # Picks up expenses.json plus any journal tail left by journal mode
+        legacy = JournalStorage(self.data_dir)
+        expenses = legacy.load_expenses()
+        documents = {name: legacy.load_document(name) for name in DOCUMENT_FILES}
+        
+        with self.lock, self.conn:
+            self.conn.executemany(self.UPSERT_EXPENSE, [self._row(exp) for exp in expenses])
+            for name, data in documents.items():
+                if data is not None:
+                    self.conn.execute(self.UPSERT_DOCUMENT, (name, json_dumps(data).decode()))
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('json_migrated', ?)",
+                (datetime.now().isoformat(),)
+            )
+        logger.info(f"Migrated {len(expenses)} expenses from JSON files into SQLite")
+    
+    @staticmethod
+    def _row(expense: Dict) -> tuple:
+        return (
+            expense['id'], expense['name'], expense['amount'], expense['category'],
+            expense['date'], expense.get('description', ''), expense['created_at'],
+            json_dumps(expense).decode()
+        )
+    
+    def _select(self, sql: str, params: tuple = ()) -> List[Dict]:
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [json_loads(row[0]) for row in rows]
+    
+    @staticmethod
+    def _count_bytes(op: str, target: str, payloads):
+        # Sizes of the JSON payloads (in characters) rather than pages touched
+        metrics.inc('expense_storage_bytes_total', sum(map(len, payloads)), op=op, target=target)
+    
+    def poll_changes(self) -> Optional[Dict]:
+        if not self.shared:
+            return None
+        with self.lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self.data_version:
+                return None
+            self.data_version = version
+            oldest = self.conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+            rows = self.conn.execute(
+                "SELECT seq, kind, key FROM changes WHERE seq > ? ORDER BY seq", (self.change_seq,)
+            ).fetchall()
+        if not rows:
+            return None
+        previous_seq, self.change_seq = self.change_seq, rows[-1][0]
+        if oldest is not None and oldest > previous_seq + 1:
+            # Rows this worker never saw were pruned from the log
+            return {"expenses": self.load_expenses(), "records": [], "documents": list(DOCUMENT_FILES)}
+        
+        expense_ids = list(dict.fromkeys(key for _, kind, key in rows if kind == 'expense'))
+        current = {}
+        for start in range(0, len(expense_ids), 500):
+            chunk = expense_ids[start:start + 500]
+            with self.lock:
+                current.update(self.conn.execute(
+                    f"SELECT id, data FROM expenses WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        self._count_bytes('load', 'expenses', current.values())
+        return {
+            "expenses": None,
+            "records": [
+                {"op": "update", "expense": json_loads(current[expense_id])} if expense_id in current
+                else {"op": "delete", "id": expense_id}
+                for expense_id in expense_ids
+            ],
+            "documents": list(dict.fromkeys(key for _, kind, key in rows if kind == 'document'))
+        }
+    
+    def _skip_own_changes(self):
+        # Our own commits leave data_version alone, so step past their log
+        # rows here unless another connection committed since the last poll
+        if not self.shared:
+            return
+        with self.lock, self.conn:
+            if self.conn.execute("PRAGMA data_version").fetchone()[0] == self.data_version:
+                self.change_seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+            self.conn.execute("DELETE FROM changes WHERE seq <= ?", (self.change_seq - SQLITE_CHANGES_KEPT,))
+    
+    def load_expenses(self) -> List[Dict]:
+        with self.lock:
+            rows = self.conn.execute("SELECT data FROM expenses ORDER BY rowid").fetchall()
+        self._count_bytes('load', 'expenses', (row[0] for row in rows))
+        return [json_loads(row[0]) for row in rows]
+    
+    def save_expenses(self, expenses: List[Dict]):
+        rows = [self._row(exp) for exp in expenses]
+        with self.exclusive():
+            with self.lock, self.conn:
+                self.conn.execute("DELETE FROM expenses")
+                self.conn.executemany(self.UPSERT_EXPENSE, rows)
+            self._skip_own_changes()
+        self._count_bytes('save', 'expenses', (row[-1] for row in rows))
+    
+    def add_expenses(self, new_expenses: List[Dict], expenses: List[Dict]):
+        rows = [self._row(exp) for exp in new_expenses]
+        with self.exclusive():
+            with self.lock, self.conn:
+                self.conn.executemany(self.UPSERT_EXPENSE, rows)
+            self._skip_own_changes()
+        self._count_bytes('save', 'expenses', (row[-1] for row in rows))
+    
+    def update_expenses(self, updated_expenses: List[Dict], expenses: List[Dict]):
+        self.add_expenses(updated_expenses, expenses)
+    
+    def delete_expenses(self, expense_ids: List[str], expenses: List[Dict]):
+        with self.exclusive():
+            with self.lock, self.conn:
+                self.conn.executemany("DELETE FROM expenses WHERE id = ?", [(i,) for i in expense_ids])
+            self._skip_own_changes()
+    
+    def load_document(self, name: str) -> Optional[Dict]:
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM documents WHERE name = ?", (name,)).fetchone()
+        if not row:
+            return None
+        self._count_bytes('load', name, (row[0],))
+        return json_loads(row[0])
+    
+    def save_document(self, name: str, data: Dict):
+        payload = json_dumps(data).decode()
+        with self.exclusive():
+            with self.lock, self.conn:
+                self.conn.execute(self.UPSERT_DOCUMENT, (name, payload))
+            self._skip_own_changes()
+        self._count_bytes('save', name, (payload,))
+    
+    def month_expenses(self, month: str, expenses: List[Dict]) -> List[Dict]:
+        year, month_num = map(int, month.split('-'))
+        next_month = f"{year + 1}-01" if month_num == 12 else f"{year}-{month_num + 1:02d}"
+        return self._select(
+            "SELECT data FROM expenses WHERE date >= ? AND date < ? ORDER BY rowid",
+            (month, next_month)
+        )
+    
+    def category_expenses(self, category: str, expenses: List[Dict]) -> List[Dict]:
+        return self._select("SELECT data FROM expenses WHERE category = ? ORDER BY rowid", (category,))
+    
+    def recent_expenses(self, limit: int, expenses: List[Dict]) -> List[Dict]:
+        return self._select("SELECT data FROM expenses ORDER BY created_at DESC LIMIT ?", (limit,))
+    
+    def query_expenses(self, filters: Dict, sort: str, descending: bool, after: Optional[tuple],
+                       limit: int, expenses: List[Dict]) -> List[Dict]:
+        if sort not in EXPENSE_SORT_FIELDS:
+            raise ValueError(f"Unsupported sort field: {sort}")
+        clauses, params = [], []
+        if filters.get('date_from'):
+            clauses.append("date >= ?")
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            clauses.append("date <= ?")
+            params.append(filters['date_to'])
+        if filters.get('categories'):
+            clauses.append(f"category IN ({', '.join('?' * len(filters['categories']))})")
+            params.extend(filters['categories'])
+        if filters.get('min_amount') is not None:
+            clauses.append("amount >= ?")
+            params.append(filters['min_amount'])
+        if filters.get('max_amount') is not None:
+            clauses.append("amount <= ?")
+            params.append(filters['max_amount'])
+        if filters.get('text'):
+            clauses.append("(instr(lower(name), ?) > 0 OR instr(lower(description), ?) > 0)")
+            params.extend([filters['text'], filters['text']])
+        if after is not None:
+            clauses.append(f"({sort}, id) {'<' if descending else '>'} (?, ?)")
+            params.extend(after)
+        
+        direction = 'DESC' if descending else 'ASC'
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._select(
+            f"SELECT data FROM expenses {where} ORDER BY {sort} {direction}, id {direction} LIMIT ?",
+            tuple(params) + (limit,)
+        )
+    
+    def iter_expenses(self, filters: Dict, sort: str, descending: bool, after: Optional[tuple],
+                      expenses: List[Dict]):
+        # Keyset pages keep the lock short and memory bounded while streaming
+        while True:
+            page = self.query_expenses(filters, sort, descending, after, EXPENSES_STREAM_BATCH, expenses)
+            yield from page
+            if len(page) < EXPENSES_STREAM_BATCH:
+                return
+            after = expense_sort_key(page[-1], sort)
+
+class EmptyStorage(ExpenseStorage):
+    # Stands in for a user partition that has no directory yet, so reads do
+    # not create one; ExpenseTracker.mutation() swaps in the real storage
+    # before the first write
+    def load_expenses(self) -> List[Dict]:
+        return []
+    
+    def save_expenses(self, expenses: List[Dict]):
+        raise RuntimeError("Partition is not created yet")
+    
+    def load_document(self, name: str) -> Optional[Dict]:
+        return None
+    
+    def save_document(self, name: str, data: Dict):
+        raise RuntimeError("Partition is not created yet")
+
+def create_storage(data_dir: Path = DATA_DIR) -> ExpenseStorage:
+    if STORAGE_BACKEND == 'sqlite':
+        return SqliteStorage(data_dir, shared=MULTI_WORKER_MODE)
+    if STORAGE_BACKEND == 'journal':
+        return JournalStorage(data_dir, shared=MULTI_WORKER_MODE)
+    return JsonStorage(data_dir, shared=MULTI_WORKER_MODE)
+
+# Spending aggregates
+class SpendingRollup:
+    def __init__(self, expenses: List[Dict] = ()):
+        # Each cell is [total, count]; totals are exact Fractions so that removing
+        # an expense never leaves rounding drift behind, and cells are dropped
+        # once their count hits zero
+        self.months: Dict[str, List] = {}
+        self.month_categories: Dict[str, Dict[str, List]] = {}
+        self.categories: Dict[str, List] = {}
+        self.exact_total = Fraction(0)
+        self.count = 0
+        for expense in expenses:
+            self.add(expense)
+    
+    def add(self, expense: Dict):
+        self._apply(expense, 1)
+    
+    def remove(self, expense: Dict):
+        self._apply(expense, -1)
+    
+    def _apply(self, expense: Dict, sign: int):
+        month = expense['date'][:7]
+        category = expense['category']
+        amount = Fraction(expense['amount']) * sign
+        
+        self.count += sign
+        self.exact_total += amount
+        self._bump(self.months, month, amount, sign)
+        self._bump(self.categories, category, amount, sign)
+        month_categories = self.month_categories.setdefault(month, {})
+        self._bump(month_categories, category, amount, sign)
+        if not month_categories:
+            del self.month_categories[month]
+    
+    @staticmethod
+    def _bump(cells: Dict[str, List], key: str, amount: Fraction, sign: int):
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = [0, 0]
+        cell[0] += amount
+        cell[1] += sign
+        if cell[1] <= 0:
+            del cells[key]
+    
+    @property
+    def total(self) -> float:
+        return float(self.exact_total)
+    
+    def month_total(self, month: str) -> float:
+        cell = self.months.get(month)
+        return float(cell[0]) if cell else 0
+    
+    def month_count(self, month: str) -> int:
+        cell = self.months.get(month)
+        return cell[1] if cell else 0
+    
+    def month_totals(self) -> Dict[str, float]:
+        return {month: float(cell[0]) for month, cell in self.months.items()}
+    
+    def month_category_totals(self, month: str) -> Dict[str, float]:
+        return {category: float(cell[0]) for category, cell in self.month_categories.get(month, {}).items()}
+    
+    def category_totals(self) -> Dict[str, float]:
+        return {category: float(cell[0]) for category, cell in self.categories.items()}
+    
+    @classmethod
+    def from_columns(cls, columns: 'ExpenseColumns') -> 'SpendingRollup':
+        # Same cells, in the same first-seen order, as adding every expense
+        # one by one, computed with vectorized group-bys
+        rollup = cls()
+        n = columns.size
+        if not n:
+            return rollup
+        amounts = columns.amount[:n]
+        months = columns.month[:n]
+        categories = columns.category[:n]
+        month_base = int(months.min())
+        category_count = len(columns.category_names)
+        pairs = (months - month_base) * category_count + categories
+        
+        def cells(keys) -> List[tuple]:
+            totals = exact_group_sums(keys, amounts)
+            unique, first, counts = np.unique(keys, return_index=True, return_counts=True)
+            return [
+                (int(unique[i]), [totals[int(unique[i])], int(counts[i])])
+                for i in np.argsort(first, kind='stable').tolist()
+            ]
+        
+        for key, cell in cells(months):
+            rollup.months[columns.month_name(key)] = cell
+        for key, cell in cells(categories):
+            rollup.categories[columns.category_names[key]] = cell
+        for key, cell in cells(pairs):
+            month_offset, category = divmod(key, category_count)
+            month = columns.month_name(month_base + month_offset)
+            rollup.month_categories.setdefault(month, {})[columns.category_names[category]] = cell
+        rollup.exact_total = sum((cell[0] for cell in rollup.months.values()), Fraction(0))
+        rollup.count = n
+        return rollup
+
+# Columnar expense store
+def exact_group_sums(keys, amounts) -> Dict[int, Fraction]:
+    # Exact per-key sums of float64 amounts: every amount is an integer
+    # mantissa times a power of two, so mantissas are summed per (key,
+    # exponent) in 26-bit halves (exact in float64 up to 2**26 rows) and only
+    # the partial sums are combined as Fractions
+    mantissas, exponents = np.frexp(amounts)
+    ints = (mantissas * 2.0 ** 53).astype(np.int64)
+    exponents = exponents.astype(np.int64) - 53
+    high = ints >> 26
+    low = ints - (high << 26)
+    exponent_min = int(exponents.min())
+    span = int(exponents.max()) - exponent_min + 1
+    groups, inverse = np.unique(keys.astype(np.int64) * span + (exponents - exponent_min), return_inverse=True)
+    high_sums = np.bincount(inverse, weights=high)
+    low_sums = np.bincount(inverse, weights=low)
+    totals: Dict[int, Fraction] = {}
+    for group, high_sum, low_sum in zip(groups.tolist(), high_sums.tolist(), low_sums.tolist()):
+        key, exponent = divmod(group, span)
+        exponent += exponent_min
+        value = (int(high_sum) << 26) + int(low_sum)
+        part = Fraction(value * 2 ** exponent) if exponent >= 0 else Fraction(value, 2 ** -exponent)
+        totals[key] = totals.get(key, 0) + part
+    return totals
+
+class ExpenseColumns:
+    # NumPy columns kept parallel to ExpenseTracker.expenses (row i describes
+    # expenses[i]): amounts, dates as day numbers, months, interned category
+    # codes and created_at in microseconds. Used for group-bys and filter
+    # masks; rows that need exact string semantics are re-checked in Python
+    def __init__(self):
+        self.size = 0
+        self.amount = np.empty(0, dtype=np.float64)
+        self.day = np.empty(0, dtype=np.int64)
+        self.month = np.empty(0, dtype=np.int64)
+        self.category = np.empty(0, dtype=np.int32)
+        self.created = np.empty(0, dtype=np.int64)
+        self.category_codes: Dict[str, int] = {}
+        self.category_names: List[str] = []
+    
+    COLUMNS = ('amount', 'day', 'month', 'category', 'created')
+    SORT_COLUMNS = {'date': 'day', 'amount': 'amount', 'created_at': 'created'}
+    
+    @classmethod
+    def build(cls, expenses: List[Dict]) -> Optional['ExpenseColumns']:
+        columns = cls()
+        try:
+            columns.append(expenses)
+        except Exception as e:
+            logger.warning(f"Columnar store disabled, expenses could not be converted: {e}")
+            return None
+        return columns
+    
+    def _code(self, category: str) -> int:
+        code = self.category_codes.get(category)
+        if code is None:
+            code = self.category_codes[category] = len(self.category_names)
+            self.category_names.append(category)
+        return code
+    
+    def _convert(self, expenses: List[Dict]) -> Dict[str, Any]:
+        # Only canonical YYYY-MM-DD dates and naive ISO timestamps are
+        # accepted, so numeric order matches the string order queries use
+        dates = [exp['date'] for exp in expenses]
+        created = [exp['created_at'] for exp in expenses]
+        if any(len(date) != 10 for date in dates):
+            raise ValueError("dates must be in YYYY-MM-DD format")
+        if any(len(stamp) not in (19, 26) for stamp in created):
+            raise ValueError("created_at must be a naive ISO timestamp")
+        days = np.array(dates, dtype='datetime64[D]')
+        return {
+            'amount': np.fromiter((exp['amount'] for exp in expenses), dtype=np.float64, count=len(expenses)),
+            'day': days.astype(np.int64),
+            'month': days.astype('datetime64[M]').astype(np.int64),
+            'category': np.fromiter((self._code(exp['category']) for exp in expenses), dtype=np.int32,
+                                    count=len(expenses)),
+            'created': np.array(created, dtype='datetime64[us]').astype(np.int64),
+        }
+    
+    def append(self, expenses: List[Dict]):
+        if not expenses:
+            return
+        values = self._convert(expenses)
+        size = self.size + len(expenses)
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            if size > len(column):
+                grown = np.empty(max(size, 2 * len(column), 1024), dtype=column.dtype)
+                grown[:self.size] = column[:self.size]
+                setattr(self, name, grown)
+                column = grown
+            column[self.size:size] = values[name]
+        self.size = size
+    
+    def set(self, index: int, expense: Dict):
+        values = self._convert([expense])
+        for name in self.COLUMNS:
+            getattr(self, name)[index] = values[name][0]
+    
+    def delete(self, indexes: List[int]):
+        # Order-preserving like ExpenseTracker._remove_indexes; indexes are
+        # sorted and only the rows after the first one move
+        if not indexes:
+            return
+        first = indexes[0]
+        keep = np.ones(self.size - first, dtype=bool)
+        keep[np.asarray(indexes) - first] = False
+        size = first + int(keep.sum())
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            column[first:size] = column[first:self.size][keep]
+        self.size = size
+    
+    @staticmethod
+    def month_name(code: int) -> str:
+        year, month = divmod(code, 12)
+        return f"{1970 + year:04d}-{month + 1:02d}"
+    
+    def sort_value(self, sort: str, value):
+        if sort == 'amount':
+            return float(value)
+        if sort == 'date':
+            if len(value) != 10:
+                raise ValueError("not a canonical date")
+            return np.datetime64(value, 'D').astype(np.int64)
+        if len(value) not in (19, 26):
+            raise ValueError("not a naive ISO timestamp")
+        return np.datetime64(value, 'us').astype(np.int64)
+    
+    def mask(self, filters: Dict) -> Optional[Any]:
+        # None when a filter cannot be evaluated on the columns exactly
+        n = self.size
+        mask = np.ones(n, dtype=bool)
+        for name, compare in (('date_from', np.greater_equal), ('date_to', np.less_equal)):
+            if filters.get(name):
+                try:
+                    mask &= compare(self.day[:n], self.sort_value('date', filters[name]))
+                except ValueError:
+                    return None
+        if filters.get('categories'):
+            codes = [self.category_codes[c] for c in filters['categories'] if c in self.category_codes]
+            mask &= np.isin(self.category[:n], codes)
+        if filters.get('min_amount') is not None:
+            mask &= self.amount[:n] >= filters['min_amount']
+        if filters.get('max_amount') is not None:
+            mask &= self.amount[:n] <= filters['max_amount']
+        return mask
+    
+    def query(self, filters: Dict, sort: str, descending: bool, after: Optional[tuple],
+              limit: Optional[int], expenses: List[Dict]) -> Optional[List[Dict]]:
+        # Same rows and order as ExpenseStorage.query_expenses/iter_expenses,
+        # or None to fall back to them
+        mask = self.mask(filters)
+        if mask is None:
+            return None
+        values = getattr(self, self.SORT_COLUMNS[sort])[:self.size]
+        if after is not None:
+            try:
+                pivot = self.sort_value(sort, after[0])
+            except (ValueError, TypeError):
+                return None
+            mask &= (values <= pivot) if descending else (values >= pivot)
+            # Ties on the sort value are decided by the id, as in expense_sort_key
+            for index in np.flatnonzero(mask & (values == pivot)).tolist():
+                key = expense_sort_key(expenses[index], sort)
+                if (key >= after) if descending else (key <= after):
+                    mask[index] = False
+        
+        candidates = np.flatnonzero(mask)
+        text = filters.get('text')
+        if limit is not None and not text and len(candidates) > limit:
+            # Every row that can make the page sorts at or beyond the
+            # limit-th value; ties with it are resolved below
+            candidate_values = values[candidates]
+            if descending:
+                kth = np.partition(candidate_values, len(candidates) - limit)[len(candidates) - limit]
+                candidates = candidates[candidate_values >= kth]
+            else:
+                kth = np.partition(candidate_values, limit - 1)[limit - 1]
+                candidates = candidates[candidate_values <= kth]
+        
+        if limit is None:
+            rows = self._ordered_rows(candidates, values, descending, expenses)
+            if text:
+                rows = [exp for exp in rows if expense_matches(exp, {"text": text})]
+            return rows
+        
+        rows = [expenses[i] for i in candidates.tolist()]
+        if text:
+            rows = [exp for exp in rows if expense_matches(exp, {"text": text})]
+        select = heapq.nlargest if descending else heapq.nsmallest
+        return select(limit, rows, key=lambda exp: expense_sort_key(exp, sort))
+    
+    @staticmethod
+    def _ordered_rows(candidates, values, descending: bool, expenses: List[Dict]) -> List[Dict]:
+        # Full-history streams are ordered here instead of with sorted() and
+        # expense_sort_key, which would add a key tuple per row to the one
+        # reference per row the result itself needs
+        order = candidates[np.argsort(values[candidates], kind='stable')]
+        ordered_values = values[order]
+        rows = []
+        for start in range(0, len(order), EXPENSES_STREAM_BATCH):
+            rows.extend([expenses[i] for i in order[start:start + EXPENSES_STREAM_BATCH].tolist()])
+        del order
+        # Runs of equal sort values are ordered by id, as in expense_sort_key
+        bounds = np.flatnonzero(ordered_values[1:] != ordered_values[:-1]) + 1
+        starts = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [len(rows)]))
+        ties = ends - starts > 1
+        for start, end in zip(starts[ties].tolist(), ends[ties].tolist()):
+            rows[start:end] = sorted(rows[start:end], key=lambda exp: exp['id'])
+        if descending:
+            rows.reverse()
+        return rows
+    
+    def recent(self, limit: int, expenses: List[Dict]) -> List[Dict]:
+        rows = expenses
+        if self.size > limit:
+            created = self.created[:self.size]
+            kth = np.partition(created, self.size - limit)[self.size - limit]
+            rows = [expenses[i] for i in np.flatnonzero(created >= kth).tolist()]
+        return sorted(rows, key=lambda x: x['created_at'], reverse=True)[:limit]
+
+# Spending timeline
+class SpendingTimeline:
+    # Per-day [paise, count] cells for every category plus the overall
+    # series (key None). Cumulative sums over the covered days are rebuilt
+    # lazily after a change, so each trends bucket costs two lookups however
+    # many expenses it covers. Amounts are kept in whole paise so removals
+    # never leave rounding drift behind
+    def __init__(self, expenses: List[Dict] = ()):
+        self.days: Dict[Optional[str], Dict[int, List[int]]] = {}
+        self.ordinals: Dict[str, Optional[int]] = {}
+        self.prefix = None
+        for expense in expenses:
+            self.add(expense)
+    
+    def add(self, expense: Dict):
+        self._apply(expense, 1)
+    
+    def remove(self, expense: Dict):
+        self._apply(expense, -1)
+    
+    def _ordinal(self, date: str) -> Optional[int]:
+        ordinal = self.ordinals.get(date, -1)
+        if ordinal == -1:
+            try:
+                ordinal = datetime.strptime(date, '%Y-%m-%d').toordinal()
+            except (TypeError, ValueError):
+                ordinal = None
+            self.ordinals[date] = ordinal
+        return ordinal
+    
+    def _apply(self, expense: Dict, sign: int):
+        day = self._ordinal(expense['date'])
+        if day is None:
+            return
+        paise = round(expense['amount'] * 100) * sign
+        self._bump(None, day, paise, sign)
+        self._bump(expense['category'], day, paise, sign)
+    
+    def _bump(self, series: Optional[str], day: int, paise: int, count: int):
+        cells = self.days.setdefault(series, {})
+        cell = cells.get(day)
+        if cell is None:
+            cell = cells[day] = [0, 0]
+        cell[0] += paise
+        cell[1] += count
+        if cell[1] <= 0:
+            del cells[day]
+            if not cells:
+                del self.days[series]
+        self.prefix = None
+    
+    @classmethod
+    def from_columns(cls, columns: 'ExpenseColumns') -> 'SpendingTimeline':
+        timeline = cls()
+        n = columns.size
+        if not n:
+            return timeline
+        days = columns.day[:n]
+        day_base = int(days.min())
+        span = int(days.max()) - day_base + 1
+        keys = columns.category[:n].astype(np.int64) * span + (days - day_base)
+        unique, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        # Paise sums stay exact in float64 below 2**53
+        paise = np.bincount(inverse, weights=np.rint(columns.amount[:n] * 100))
+        epoch = datetime(1970, 1, 1).toordinal()
+        for key, total, count in zip(unique.tolist(), paise.tolist(), counts.tolist()):
+            category, day = divmod(key, span)
+            day += day_base + epoch
+            timeline._bump(None, day, int(total), count)
+            timeline._bump(columns.category_names[category], day, int(total), count)
+        return timeline
+    
+    def _prefixes(self) -> tuple:
+        prefix = self.prefix
+        if prefix is None:
+            overall = self.days.get(None, {})
+            first = min(overall, default=0)
+            last = max(overall, default=-1)
+            sums = {}
+            for series, cells in self.days.items():
+                paise = [0] * (last - first + 2)
+                counts = [0] * (last - first + 2)
+                for day, (total, count) in cells.items():
+                    paise[day - first + 1] = total
+                    counts[day - first + 1] = count
+                sums[series] = (list(itertools.accumulate(paise)), list(itertools.accumulate(counts)))
+            prefix = self.prefix = (first, last, sums)
+        return prefix
+    
+    def range_total(self, series: Optional[str], start: int, end: int, prefix: tuple = None) -> tuple:
+        # (paise, count) for the series between two day ordinals, inclusive
+        first, last, sums = prefix or self._prefixes()
+        start, end = max(start, first), min(end, last)
+        if series not in sums or start > end:
+            return 0, 0
+        paise, counts = sums[series]
+        return (paise[end - first + 1] - paise[start - first],
+                counts[end - first + 1] - counts[start - first])
+    
+    def categories(self) -> List[str]:
+        return sorted(series for series in self.days if series is not None)
+    
+    def buckets(self, start: int, end: int, interval: str) -> List[tuple]:
+        # (label, first day, last day) per period, clipped to the range
+        buckets = []
+        day = start
+        while day <= end:
+            current = datetime.fromordinal(day)
+            if interval == 'day':
+                label, period_end = current.strftime('%Y-%m-%d'), day
+            elif interval == 'week':
+                period_start = day - current.weekday()
+                label = datetime.fromordinal(period_start).strftime('%Y-%m-%d')
+                period_end = period_start + 6
+            else:
+                label = current.strftime('%Y-%m')
+                next_month = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+                period_end = next_month.toordinal() - 1
+            buckets.append((label, day, min(period_end, end)))
+            day = period_end + 1
+        return buckets
+    
+    def trends(self, start: int, end: int, interval: str, categories: Optional[List[str]] = None,
+               by_category: bool = False) -> List[Dict]:
+        prefix = self._prefixes()
+        split = categories if categories is not None else (self.categories() if by_category else [])
+        result = []
+        for label, first, last in self.buckets(start, end, interval):
+            per_category = {category: self.range_total(category, first, last, prefix) for category in split}
+            if categories is None:
+                paise, count = self.range_total(None, first, last, prefix)
+            else:
+                paise = sum(cell[0] for cell in per_category.values())
+                count = sum(cell[1] for cell in per_category.values())
+            bucket = {
+                "period": label,
+                "start": datetime.fromordinal(first).strftime('%Y-%m-%d'),
+                "end": datetime.fromordinal(last).strftime('%Y-%m-%d'),
+                "total": paise / 100,
+                "count": count
+            }
+            if by_category:
+                bucket["categories"] = {
+                    category: cell[0] / 100 for category, cell in per_category.items() if cell[1]
+                }
+            result.append(bucket)
+        return result
+
+# Expense search
+class ExpenseSearchIndex:
+    # Inverted index over names and descriptions: each term maps the field
+    # weight it was found with to that field's expenses as (date, id) pairs
+    # in date order, and the sorted term list answers prefix lookups for the
+    # word being typed. A ranked page of a one-word query is a lazy merge of
+    # the matching lists, so its cost follows the page size rather than the
+    # number of matches
+    NAME_WEIGHT = 2
+    DESCRIPTION_WEIGHT = 1
+    
+    def __init__(self, expenses: List[Dict] = ()):
+        self.postings: Dict[str, Dict[int, List[tuple]]] = {}
+        self.term_counts: Dict[str, int] = {}  # term -> expenses containing it
+        self.expenses: Dict[str, Dict] = {}
+        # Bulk build: lists are appended to and sorted once, and each
+        # distinct text is tokenized once
+        text_terms = {}
+        for expense in expenses:
+            text = (expense['name'], expense.get('description'))
+            terms = text_terms.get(text)
+            if terms is None:
+                terms = text_terms[text] = self._terms(expense)
+            item = (expense['date'], expense['id'])
+            self.expenses[expense['id']] = expense
+            for term, weight in terms.items():
+                lists = self.postings.get(term)
+                if lists is None:
+                    lists = self.postings[term] = {}
+                rows = lists.get(weight)
+                if rows is None:
+                    rows = lists[weight] = []
+                rows.append(item)
+        for term, lists in self.postings.items():
+            for rows in lists.values():
+                rows.sort()
+            self.term_counts[term] = sum(map(len, lists.values()))
+        self.terms: List[str] = sorted(self.postings)
+    
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        return SEARCH_TOKEN_PATTERN.findall(text.lower())
+    
+    def _terms(self, expense: Dict) -> Dict[str, int]:
+        weights = dict.fromkeys(self.tokenize(expense.get('description') or ''), self.DESCRIPTION_WEIGHT)
+        weights.update(dict.fromkeys(self.tokenize(expense['name']), self.NAME_WEIGHT))
+        return weights
+    
+    def add(self, expense: Dict):
+        item = (expense['date'], expense['id'])
+        self.expenses[expense['id']] = expense
+        for term, weight in self._terms(expense).items():
+            lists = self.postings.get(term)
+            if lists is None:
+                lists = self.postings[term] = {}
+                bisect.insort(self.terms, term)
+            rows = lists.get(weight)
+            if rows is None:
+                rows = lists[weight] = []
+            if not rows or rows[-1] <= item:
+                rows.append(item)
+            else:
+                bisect.insort(rows, item)
+            self.term_counts[term] = self.term_counts.get(term, 0) + 1
+    
+    def remove(self, expense: Dict):
+        item = (expense['date'], expense['id'])
+        if self.expenses.get(expense['id']) is expense:
+            del self.expenses[expense['id']]
+        for term, weight in self._terms(expense).items():
+            rows = self.postings.get(term, {}).get(weight)
+            index = bisect.bisect_left(rows, item) if rows else 0
+            if not rows or index == len(rows) or rows[index] != item:
+                continue
+            del rows[index]
+            self.term_counts[term] -= 1
+            if not rows:
+                del self.postings[term][weight]
+                if not self.postings[term]:
+                    del self.postings[term]
+                    del self.term_counts[term]
+                    del self.terms[bisect.bisect_left(self.terms, term)]
+    
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self.terms, prefix)
+        end = bisect.bisect_left(self.terms, prefix + '\U0010ffff', start)
+        return self.terms[start:end]
+    
+    def _idf(self, term: str) -> float:
+        return math.log(1 + len(self.expenses) / self.term_counts[term])
+    
+    def search(self, query: str, offset: int = 0, limit: int = SEARCH_PAGE_SIZE) -> Dict:
+        # Every word must match; the last one also matches as a prefix unless
+        # the query ends with a space. Ranked by field weight times idf (a
+        # completed word counts half), then newest first. One extra result is
+        # collected to tell whether another page exists
+        words = list(dict.fromkeys(self.tokenize(query)))
+        prefix = None if not words or query[-1:].isspace() else words.pop()
+        completions = self._prefix_terms(prefix) if prefix is not None else []
+        suggestions = heapq.nlargest(SEARCH_SUGGESTIONS, completions, key=self.term_counts.__getitem__)
+        if len(words) == 1 and prefix is None:
+            # A single whole word ranks like a prefix that matched exactly
+            ranked = self._merge_completions(words[0], [words[0]] if words[0] in self.postings else [],
+                                             offset + limit + 1)
+        elif words:
+            ranked = self._rank_candidates(words, prefix, completions, offset + limit + 1)
+        else:
+            ranked = self._merge_completions(prefix, completions, offset + limit + 1)
+        page = ranked[offset:offset + limit]
+        return {
+            "results": [{**self.expenses[expense_id], "score": round(score, 4)} for score, expense_id in page],
+            "has_more": len(ranked) > offset + limit,
+            "suggestions": suggestions
+        }
+    
+    def _prefix_score(self, term: str, prefix: str, weight: int) -> float:
+        return weight * self._idf(term) * (1 if term == prefix else 0.5)
+    
+    def _merge_completions(self, prefix: Optional[str], completions: List[str], needed: int) -> List[tuple]:
+        # Each (term, field) list has a single score; lists are visited from
+        # the highest score down and merged newest first, and an expense is
+        # only taken the first (best scoring) time it is reached
+        levels: Dict[float, List[List[tuple]]] = {}
+        for term in completions:
+            for weight, rows in self.postings[term].items():
+                levels.setdefault(round(self._prefix_score(term, prefix, weight), 9), []).append(rows)
+        ranked, seen = [], set()
+        for score in sorted(levels, reverse=True):
+            for _, expense_id in heapq.merge(*(reversed(rows) for rows in levels[score]), reverse=True):
+                if expense_id in seen:
+                    continue
+                seen.add(expense_id)
+                ranked.append((score, expense_id))
+                if len(ranked) >= needed:
+                    return ranked
+        return ranked
+    
+    def _weight(self, term: str, item: tuple) -> int:
+        # Field weight the term has in the expense, 0 if it does not occur
+        for weight, rows in self.postings[term].items():
+            index = bisect.bisect_left(rows, item)
+            if index < len(rows) and rows[index] == item:
+                return weight
+        return 0
+    
+    def _rank_candidates(self, words: List[str], prefix: Optional[str], completions: List[str],
+                         needed: int) -> List[tuple]:
+        if any(word not in self.postings for word in words) or (prefix is not None and not completions):
+            return []
+        idf = {word: self._idf(word) for word in words}
+        prefix_scores: Dict[tuple, float] = {}
+        for term in completions:
+            for weight, rows in self.postings[term].items():
+                score = self._prefix_score(term, prefix, weight)
+                for item in rows:
+                    if score > prefix_scores.get(item, 0):
+                        prefix_scores[item] = score
+        
+        # Candidates come from the rarest word, or from the prefix matches
+        # when there are fewer of those, and are checked against the rest
+        rarest = min(words, key=self.term_counts.__getitem__)
+        if prefix is not None and len(prefix_scores) < self.term_counts[rarest]:
+            found, checked = prefix_scores, words
+        else:
+            found = {item: weight * idf[rarest] for weight, rows in self.postings[rarest].items() for item in rows}
+            checked = [word for word in words if word != rarest]
+            if prefix is not None:
+                found = {item: score + prefix_scores[item] for item, score in found.items() if item in prefix_scores}
+        candidates = []
+        for item, score in found.items():
+            for word in checked:
+                weight = self._weight(word, item)
+                if not weight:
+                    break
+                score += weight * idf[word]
+            else:
+                candidates.append((round(score, 9), *item))
+        return [(score, expense_id) for score, _, expense_id in heapq.nlargest(needed, candidates)]
 
 # Data Models
 class ExpenseTracker:
-    def __init__(self):
+    # Attributes computed from the expense list; loaded together with it
+    DERIVED = ('positions', 'columns', 'rollup', 'timeline', 'search_index', 'classifier', 'dedup_index',
+               'pending_count')
+    
+    def __init__(self, storage: Optional[ExpenseStorage] = None, on_load=None, create_storage_on_write=None):
+        self.storage = storage or create_storage()
+        # Set while storage is an EmptyStorage: creates the real one
+        self.create_storage_on_write = create_storage_on_write
+        # Called with the tracker once its expenses are loaded
+        self.on_load = on_load
+        # Background categorization mutates expenses outside request threads
+        self.lock = threading.RLock()
+        # Bumped on every mutation; the epoch keeps ETags from a previous
+        # load of the same data from matching this instance's versions
+        self.version = 0
+        self.epoch = uuid.uuid4().hex[:8]
+        self.response_cache: Dict[tuple, tuple] = {}
+        # Maintained by TrackerRegistry
+        self.leases = 0
+        self.last_used = time.monotonic()
+        self.category_updates = deque(maxlen=CATEGORY_UPDATES_KEPT)
+        self.category_update_seq = 0
+        # (version, report) of the last classifier evaluation
+        self.evaluation = None
+        if not LAZY_INIT:
+            self._load_expenses_state()
+            for name in DOCUMENT_FILES:
+                setattr(self, name, getattr(self, f'load_{name}')())
+    
+    def __getattr__(self, name: str):
+        # Only reached for attributes not loaded yet (lazy mode): expenses
+        # and the documents are each read on first access
+        if name != 'expenses' and name not in self.DERIVED and name not in DOCUMENT_FILES:
+            raise AttributeError(name)
+        with self.lock:
+            if not self.is_loaded(name):
+                if name in DOCUMENT_FILES:
+                    setattr(self, name, getattr(self, f'load_{name}')())
+                else:
+                    self._load_expenses_state()
+        return self.__dict__[name]
+    
+    def is_loaded(self, name: str) -> bool:
+        return name in self.__dict__
+    
+    def _load_expenses_state(self):
         self.expenses = self.load_expenses()
-        self.budgets = self.load_budgets()
-        self.salary = self.load_salary()
-        self.predictions = self.load_predictions()
+        self._rebuild_derived()
+        if self.on_load:
+            self.on_load(self)
+    
+    def _rebuild_derived(self):
+        # Everything computed from self.expenses; rebuilt after a full reload
+        self.positions = {exp['id']: i for i, exp in enumerate(self.expenses)}
+        self.columns = ExpenseColumns.build(self.expenses) if COLUMNAR_STORE else None
+        self.rollup = SpendingRollup.from_columns(self.columns) if self.columns else SpendingRollup(self.expenses)
+        self.timeline = SpendingTimeline.from_columns(self.columns) if self.columns else SpendingTimeline(self.expenses)
+        self.search_index = ExpenseSearchIndex(self.expenses)
+        self.classifier = LocalCategoryClassifier.train(self.expenses) if LOCAL_CLASSIFIER_ENABLED else None
+        # Built by the first statement import; see duplicate_counts
+        self.dedup_index = None
+        # Expenses still waiting for a background categorization
+        self.pending_count = sum(1 for exp in self.expenses if exp.get('category_pending'))
+    
+    def refresh(self):
+        # Applies writes other worker processes made since this tracker last
+        # read or wrote its data; a single small read when nothing changed
+        if not self.storage.shared:
+            return
+        with self.lock:
+            try:
+                changes = self.storage.poll_changes()
+            except Exception as e:
+                metrics.inc('expense_storage_errors_total', op='poll', target='expenses')
+                logger.error(f"Error checking for external changes: {e}")
+                return
+            if not changes:
+                return
+            # Data that is not loaded yet is read fresh on first access
+            expenses_loaded = self.is_loaded('expenses')
+            if expenses_loaded and changes['expenses'] is not None:
+                # Slice assignment keeps the list identity that storage
+                # callbacks (journal compaction) hold on to
+                self.expenses[:] = changes['expenses']
+                self._rebuild_derived()
+            elif expenses_loaded and changes['records']:
+                self._apply_records(changes['records'])
+            for name in changes['documents']:
+                if self.is_loaded(name):
+                    setattr(self, name, getattr(self, f'load_{name}')())
+            metrics.inc('expense_external_reloads_total', kind='full' if changes['expenses'] is not None else 'incremental')
+            self.mark_changed()
+    
+    def _apply_records(self, records: List[Dict]):
+        # Runs of deletes are applied together so each run shifts the list once
+        deletes = []
+        for record in records:
+            if record['op'] == 'delete':
+                index = self.positions.get(record['id'])
+                if index is not None:
+                    deletes.append(index)
+                continue
+            self._remove_indexes(deletes)
+            deletes = []
+            expense = record['expense']
+            index = self.positions.get(expense['id'])
+            if index is None:
+                self._append(expense)
+                continue
+            previous = self._replace_at(index, expense)
+            if previous.get('category_pending') and not expense.get('category_pending'):
+                # Refined by another worker; surface it in this worker's feed too
+                self.record_category_update(expense)
+        self._remove_indexes(deletes)
+    
+    # Edits of the list and everything derived from it; appends and
+    # replacements are O(1) apart from the derived indexes' own costs
+    def _append(self, expense: Dict):
+        self.positions[expense['id']] = len(self.expenses)
+        self.expenses.append(expense)
+        self._update_columns('append', [expense])
+        self._add_derived(expense)
+    
+    def _replace_at(self, index: int, expense: Dict) -> Dict:
+        previous = self.expenses[index]
+        self.expenses[index] = expense
+        self._update_columns('set', index, expense)
+        self._remove_derived(previous)
+        self._add_derived(expense)
+        return previous
+    
+    def _remove_indexes(self, indexes: List[int]) -> List[Dict]:
+        # Keeps insertion order, which GET /api/expenses?all=true returns
+        # as is; only the expenses after the first removed one shift,
+        # so removing recent expenses stays cheap
+        if not indexes:
+            return []
+        indexes = sorted(set(indexes))
+        first = indexes[0]
+        removed = [self.expenses[i] for i in indexes]
+        dropped = set(indexes)
+        tail = [exp for i, exp in enumerate(self.expenses[first:], first) if i not in dropped]
+        # Slice assignment keeps the list identity storage callbacks hold on to
+        self.expenses[first:] = tail
+        for expense in removed:
+            del self.positions[expense['id']]
+        for i, expense in enumerate(tail, first):
+            self.positions[expense['id']] = i
+        self._update_columns('delete', indexes)
+        for expense in removed:
+            self._remove_derived(expense)
+        return removed
+    
+    def _update_columns(self, method: str, *args):
+        if self.columns is None:
+            return
+        try:
+            getattr(self.columns, method)(*args)
+        except Exception as e:
+            # Falls back to the row-based paths until the next full load
+            logger.warning(f"Columnar store disabled after a failed update: {e}")
+            self.columns = None
+    
+    @contextmanager
+    def mutation(self):
+        # Holds the tracker lock and, in multi-worker mode, the data
+        # directory lock; other workers' changes are applied first so this
+        # write cannot overwrite them
+        with self.lock:
+            if self.create_storage_on_write is not None:
+                self._create_storage()
+            with self.storage.exclusive() as outermost:
+                if outermost:
+                    self.refresh()
+                yield
+    
+    def _create_storage(self):
+        self.storage = self.create_storage_on_write()
+        self.create_storage_on_write = None
+        if self.storage.shared:
+            # Another worker may have created the partition first; what it
+            # wrote is read on next access instead of being overwritten
+            for name in ('expenses', *self.DERIVED, *DOCUMENT_FILES):
+                self.__dict__.pop(name, None)
+            self.mark_changed()
     
     def load_expenses(self) -> List[Dict]:
         try:
-            if EXPENSES_FILE.exists():
-                with open(EXPENSES_FILE, 'r') as f:
-                    fcntl.flock(f.fileno(), fcntl.LOCK_SH)  # Shared lock for reading
-                    data = json.load(f)
-                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-                    return data
-            return []
+            with metrics.timer('expense_storage_duration_seconds', op='load', target='expenses'):
+                return self.storage.load_expenses()
         except Exception as e:
+            metrics.inc('expense_storage_errors_total', op='load', target='expenses')
             logger.error(f"Error loading expenses: {e}")
             return []
     
     def save_expenses(self):
+        self.mark_changed()
         try:
-            with open(EXPENSES_FILE, 'w') as f:
-                fcntl.flock(f.fileno(), fcntl.LOCK_EX)  # Exclusive lock for writing
-                json.dump(self.expenses, f, indent=2, default=str)
-                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            with metrics.timer('expense_storage_duration_seconds', op='save', target='expenses'):
+                self.storage.save_expenses(self.expenses)
         except Exception as e:
+            metrics.inc('expense_storage_errors_total', op='save', target='expenses')
             logger.error(f"Error saving expenses: {e}")
     
+    def add_expense(self, expense: Dict):
+        self.add_expenses([expense])
+    
+    def add_expenses(self, new_expenses: List[Dict]):
+        # Raises when the expenses could not be saved, leaving none of them
+        # added, so callers never report or count an unsaved expense
+        with self.mutation():
+            count = len(self.expenses)
+            try:
+                for expense in new_expenses:
+                    self.positions[expense['id']] = len(self.expenses)
+                    self.expenses.append(expense)
+                    self._add_derived(expense)
+            except Exception:
+                # An expense the derived structures rejected must not stay in
+                # the list half-indexed and unsaved
+                self._discard_added(count)
+                raise
+            self._update_columns('append', new_expenses)
+            self.mark_changed()
+            try:
+                with metrics.timer('expense_storage_duration_seconds', op='add', target='expenses'):
+                    self.storage.add_expenses(new_expenses, self.expenses)
+            except Exception as e:
+                metrics.inc('expense_storage_errors_total', op='add', target='expenses')
+                logger.error(f"Error saving expenses: {e}")
+                self._discard_added(count)
+                self.mark_changed()
+                raise
+    
+    def _discard_added(self, count: int):
+        # Drops the expenses appended after the first count; the partial
+        # updates to the derived structures are discarded by rebuilding them
+        for expense in self.expenses[count:]:
+            self.positions.pop(expense['id'], None)
+        del self.expenses[count:]
+        self._rebuild_derived()
+    
+    def update_expense(self, expense_id: str, changes: Dict) -> Optional[Dict]:
+        with self.mutation():
+            index = self.positions.get(expense_id)
+            if index is None:
+                return None
+            expense = {**self.expenses[index], **changes}
+            self._replace_at(index, expense)
+            self.mark_changed()
+            try:
+                with metrics.timer('expense_storage_duration_seconds', op='update', target='expenses'):
+                    self.storage.update_expenses([expense], self.expenses)
+            except Exception as e:
+                metrics.inc('expense_storage_errors_total', op='update', target='expenses')
+                logger.error(f"Error saving expenses: {e}")
+            return expense
+    
+    def delete_expense(self, expense_id: str) -> bool:
+        return bool(self.delete_expenses([expense_id]))
+    
+    def delete_expenses(self, expense_ids: List[str]) -> List[str]:
+        """Remove the given expenses with a single storage write; returns the ids that existed."""
+        with self.mutation():
+            found = {
+                expense_id: self.positions[expense_id]
+                for expense_id in dict.fromkeys(expense_ids) if expense_id in self.positions
+            }
+            self._remove_indexes(list(found.values()))
+            deleted = list(found)
+            if not deleted:
+                return deleted
+            self.mark_changed()
+            try:
+                with metrics.timer('expense_storage_duration_seconds', op='delete', target='expenses'):
+                    self.storage.delete_expenses(deleted, self.expenses)
+            except Exception as e:
+                metrics.inc('expense_storage_errors_total', op='delete', target='expenses')
+                logger.error(f"Error saving expenses: {e}")
+            return deleted
+    
+    def mark_changed(self):
+        with self.lock:
+            self.version += 1
+            self.response_cache.clear()
+    
+    def _add_derived(self, expense: Dict):
+        self.rollup.add(expense)
+        self.timeline.add(expense)
+        self.search_index.add(expense)
+        self._learn(expense)
+        if expense.get('category_pending'):
+            self.pending_count += 1
+        if self.dedup_index is not None:
+            self.dedup_index[expense_dedup_key(expense)] += 1
+    
+    def _remove_derived(self, expense: Dict):
+        self.rollup.remove(expense)
+        self.timeline.remove(expense)
+        self.search_index.remove(expense)
+        self._unlearn(expense)
+        if expense.get('category_pending'):
+            self.pending_count -= 1
+        if self.dedup_index is not None:
+            key = expense_dedup_key(expense)
+            self.dedup_index[key] -= 1
+            if not self.dedup_index[key]:
+                del self.dedup_index[key]
+    
+    def _learn(self, expense: Dict):
+        if self.classifier and LocalCategoryClassifier.is_training_example(expense):
+            self.classifier.learn(expense['name'], expense['amount'], expense['category'])
+    
+    def _unlearn(self, expense: Dict):
+        if self.classifier and LocalCategoryClassifier.is_training_example(expense):
+            self.classifier.unlearn(expense['name'], expense['amount'], expense['category'])
+    
+    def duplicate_counts(self) -> Counter:
+        # Number of expenses per dedup key, kept up to date once built
+        with self.lock:
+            if self.dedup_index is None:
+                self.dedup_index = Counter(expense_dedup_key(exp) for exp in self.expenses)
+            return self.dedup_index
+    
+    def record_category_update(self, expense: Dict):
+        with self.lock:
+            self.category_update_seq += 1
+            self.category_updates.append({
+                "seq": self.category_update_seq,
+                "id": expense['id'],
+                "category": expense['category']
+            })
+    
+    def category_updates_since(self, seq: int) -> Dict:
+        with self.lock:
+            updates = [update for update in self.category_updates if update['seq'] > seq]
+            oldest = self.category_updates[0]['seq'] if self.category_updates else self.category_update_seq + 1
+            return {
+                "updates": updates,
+                "latest_seq": self.category_update_seq,
+                # Updates older than the retained window were dropped; the
+                # client should reload its expenses instead
+                "reset": seq + 1 < oldest and seq < self.category_update_seq,
+                "pending": self.pending_count
+            }
+    
+    def classifier_evaluation(self) -> Dict:
+        # Evaluating retrains a model over the whole history, so the report
+        # is reused until the data changes; training runs on a snapshot
+        # outside the lock so writers are not held up
+        with self.lock:
+            version = self.version
+            if self.evaluation and self.evaluation[0] == version:
+                return self.evaluation[1]
+            expenses = list(self.expenses)
+        report = LocalCategoryClassifier.evaluate(expenses, LOCAL_CLASSIFIER_THRESHOLD)
+        with self.lock:
+            if self.version == version:
+                self.evaluation = (version, report)
+        return report
+    
+    def get_expense(self, expense_id: str) -> Optional[Dict]:
+        index = self.positions.get(expense_id)
+        return None if index is None else self.expenses[index]
+    
+    def month_expenses(self, month: str) -> List[Dict]:
+        return self.storage.month_expenses(month, self.expenses)
+    
+    def category_expenses(self, category: str) -> List[Dict]:
+        return self.storage.category_expenses(category, self.expenses)
+    
+    def recent_expenses(self, limit: int) -> List[Dict]:
+        if self.columns is not None and not self.storage.QUERIES_IN_SQL:
+            with self.lock:
+                return self.columns.recent(limit, self.expenses)
+        return self.storage.recent_expenses(limit, self.expenses)
+    
+    def _query_columns(self, query: Dict, limit: Optional[int]) -> Optional[List[Dict]]:
+        if self.columns is None or self.storage.QUERIES_IN_SQL:
+            return None
+        # Under the lock so row numbers cannot shift while they are resolved
+        with self.lock:
+            return self.columns.query(
+                query['filters'], query['sort'], query['descending'], query['after'], limit, self.expenses
+            )
+    
+    def query_expenses(self, query: Dict, limit: int) -> List[Dict]:
+        rows = self._query_columns(query, limit)
+        if rows is not None:
+            return rows
+        return self.storage.query_expenses(
+            query['filters'], query['sort'], query['descending'], query['after'], limit, self.expenses
+        )
+    
+    def iter_expenses(self, query: Dict):
+        rows = self._query_columns(query, None)
+        if rows is not None:
+            return iter(rows)
+        return self.storage.iter_expenses(
+            query['filters'], query['sort'], query['descending'], query['after'], self.expenses
+        )
+    
     def load_budgets(self) -> Dict:
         try:
-            if BUDGETS_FILE.exists():
-                with open(BUDGETS_FILE, 'r') as f:
-                    fcntl.flock(f.fileno(), fcntl.LOCK_SH)
-                    data = json.load(f)
-                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-                    return data
+            with metrics.timer('expense_storage_duration_seconds', op='load', target='budgets'):
+                data = self.storage.load_document('budgets')
+            if data is not None:
+                return data
             return {
                 "monthly": 0,
                 "categories": {},
                 "created_at": datetime.now().isoformat()
             }
         except Exception as e:
+            metrics.inc('expense_storage_errors_total', op='load', target='budgets')
             logger.error(f"Error loading budgets: {e}")
             return {"monthly": 0, "categories": {}, "created_at": datetime.now().isoformat()}
     
     def save_budgets(self):
+        self.mark_changed()
         try:
-            with open(BUDGETS_FILE, 'w') as f:
-                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-                json.dump(self.budgets, f, indent=2, default=str)
-                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            with metrics.timer('expense_storage_duration_seconds', op='save', target='budgets'):
+                self.storage.save_document('budgets', self.budgets)
         except Exception as e:
+            metrics.inc('expense_storage_errors_total', op='save', target='budgets')
             logger.error(f"Error saving budgets: {e}")
     
     def load_salary(self) -> Dict:
         try:
-            if SALARY_FILE.exists():
-                with open(SALARY_FILE, 'r') as f:
-                    fcntl.flock(f.fileno(), fcntl.LOCK_SH)
-                    data = json.load(f)
-                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-                    return data
+            with metrics.timer('expense_storage_duration_seconds', op='load', target='salary'):
+                data = self.storage.load_document('salary')
+            if data is not None:
+                return data
             return {
                 "monthly": 0,
                 "currency": "₹",
                 "created_at": datetime.now().isoformat()
             }
         except Exception as e:
+            metrics.inc('expense_storage_errors_total', op='load', target='salary')
             logger.error(f"Error loading salary: {e}")
             return {"monthly": 0, "currency": "₹", "created_at": datetime.now().isoformat()}
     
     def save_salary(self):
+        self.mark_changed()
         try:
-            with open(SALARY_FILE, 'w') as f:
-                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-                json.dump(self.salary, f, indent=2, default=str)
-                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            with metrics.timer('expense_storage_duration_seconds', op='save', target='salary'):
+                self.storage.save_document('salary', self.salary)
         except Exception as e:
+            metrics.inc('expense_storage_errors_total', op='save', target='salary')
             logger.error(f"Error saving salary: {e}")
     
     def load_predictions(self) -> Dict:
         try:
-            if PREDICTIONS_FILE.exists():
-                with open(PREDICTIONS_FILE, 'r') as f:
-                    fcntl.flock(f.fileno(), fcntl.LOCK_SH)
-                    data = json.load(f)
-                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-                    return data
+            with metrics.timer('expense_storage_duration_seconds', op='load', target='predictions'):
+                data = self.storage.load_document('predictions')
+            if data is not None:
+                return data
             return {
                 "current_month": 0,
                 "confidence": 0,
                 "last_updated": datetime.now().isoformat()
             }
         except Exception as e:
+            metrics.inc('expense_storage_errors_total', op='load', target='predictions')
             logger.error(f"Error loading predictions: {e}")
             return {"current_month": 0, "confidence": 0, "last_updated": datetime.now().isoformat()}
     
-    def save_predictions(self):
+    def save_predictions(self):
+        self.mark_changed()
+        try:
+            with metrics.timer('expense_storage_duration_seconds', op='save', target='predictions'):
+                self.storage.save_document('predictions', self.predictions)
+        except Exception as e:
+            metrics.inc('expense_storage_errors_total', op='save', target='predictions')
+            logger.error(f"Error saving predictions: {e}")
+    
+    def load_imports(self) -> Dict:
+        # Progress of statement imports, keyed by import id
+        try:
+            with metrics.timer('expense_storage_duration_seconds', op='load', target='imports'):
+                data = self.storage.load_document('imports')
+            return data if data is not None else {}
+        except Exception as e:
+            metrics.inc('expense_storage_errors_total', op='load', target='imports')
+            logger.error(f"Error loading imports: {e}")
+            return {}
+    
+    def save_imports(self):
+        self.mark_changed()
+        # Oldest imports are dropped first; dicts keep insertion order
+        for import_id in list(self.imports)[:-IMPORTS_KEPT]:
+            del self.imports[import_id]
+        try:
+            with metrics.timer('expense_storage_duration_seconds', op='save', target='imports'):
+                self.storage.save_document('imports', self.imports)
+        except Exception:
+            # Unlike the other documents this is not best effort: an import
+            # must not go on committing rows whose progress is not recorded
+            metrics.inc('expense_storage_errors_total', op='save', target='imports')
+            raise
+
+# Rule-based categorization
+DEFAULT_CATEGORY_RULES = [
+    {"category": "Food & Dining", "priority": 10,
+     "keywords": ['food', 'restaurant', 'cafe', 'coffee', 'lunch', 'dinner', 'breakfast', 'pizza', 'burger']},
+    {"category": "Transportation", "priority": 20,
+     "keywords": ['uber', 'taxi', 'bus', 'metro', 'petrol', 'fuel', 'parking']},
+    {"category": "Bills & Utilities", "priority": 30,
+     "keywords": ['electricity', 'water', 'gas', 'internet', 'phone', 'mobile', 'recharge']},
+    {"category": "Groceries", "priority": 40,
+     "keywords": ['grocery', 'supermarket', 'vegetables', 'fruits', 'milk', 'bread']},
+    {"category": "Entertainment", "priority": 50,
+     "keywords": ['movie', 'cinema', 'game', 'music', 'spotify', 'netflix']},
+    {"category": "Investment", "priority": 1000, "amount_above": 10000},
+]
+
+class KeywordAutomaton:
+    # Aho-Corasick automaton: one pass over the text reports every keyword
+    # occurring in it, however many keywords there are
+    def __init__(self, keywords: List[tuple]):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        for keyword, value in keywords:
+            node = 0
+            for ch in keyword:
+                next_node = self.goto[node].get(ch)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][ch] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                node = next_node
+            self.output[node] += (value,)
+        
+        pending = deque(self.goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for ch, child in self.goto[node].items():
+                pending.append(child)
+                fallback = self.fail[node]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                self.output[child] += self.output[self.fail[child]]
+    
+    def find(self, text: str) -> set:
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+class CategoryRuleEngine:
+    def __init__(self, rules: List[Dict], default_category: str = "Other"):
+        self.default_category = default_category
+        # Lower priority wins; equal priorities keep their table order
+        self.rules = sorted(rules, key=lambda rule: rule.get('priority', 100))
+        
+        keywords = []
+        self.rule_patterns = {}  # rule index -> its patterns as one alternative
+        self.amount_rules = []   # rules with neither keywords nor patterns
+        for index, rule in enumerate(self.rules):
+            keywords.extend((keyword.lower(), index) for keyword in rule.get('keywords', []))
+            patterns = rule.get('patterns', [])
+            if patterns:
+                self.rule_patterns[index] = '|'.join(f'(?:{p})' for p in patterns)
+            elif not rule.get('keywords'):
+                self.amount_rules.append(index)
+        self.automaton = KeywordAutomaton(keywords)
+        
+        # The amount limits split the amounts into segments (each threshold
+        # and the open ranges between them) in which every rule either
+        # applies or not; see _segment
+        self.thresholds = sorted({
+            rule[limit] for rule in self.rules for limit in ('amount_above', 'amount_below') if limit in rule
+        })
+        self.segments: Dict[int, tuple] = {}
+        self.segments_lock = threading.Lock()
+    
+    def _segment(self, amount: float) -> int:
+        # 2k is the range just below thresholds[k], 2k + 1 the threshold itself
+        position = bisect.bisect_left(self.thresholds, amount)
+        exact = position < len(self.thresholds) and self.thresholds[position] == amount
+        return 2 * position + exact
+    
+    def _applies(self, index: int, segment: int) -> bool:
+        rule = self.rules[index]
+        if 'amount_above' in rule and not segment > 2 * self.thresholds.index(rule['amount_above']) + 1:
+            return False
+        if 'amount_below' in rule and not segment <= 2 * self.thresholds.index(rule['amount_below']):
+            return False
+        return True
+    
+    def _segment_rules(self, segment: int) -> tuple:
+        # (rules that apply, one pattern for all of their patterns, best
+        # amount-only rule) for a segment, built the first time it is needed
+        compiled = self.segments.get(segment)
+        if compiled is not None:
+            return compiled
+        applies = frozenset(index for index in range(len(self.rules)) if self._applies(index, segment))
+        # Alternatives are in priority order and all apply to the amount, so
+        # the rule reported at each position is the best one matching there
+        alternatives = [f"(?P<r{index}>{body})" for index, body in self.rule_patterns.items() if index in applies]
+        pattern = re.compile(f"(?=(?:{'|'.join(alternatives)}))", re.IGNORECASE) if alternatives else None
+        amount_rule = next((index for index in self.amount_rules if index in applies), None)
+        compiled = (applies, pattern, amount_rule)
+        with self.segments_lock:
+            self.segments[segment] = compiled
+        return compiled
+    
+    def categorize(self, expense_name: str, amount: float) -> str:
+        applies, pattern, amount_rule = self._segment_rules(self._segment(amount))
+        name_lower = expense_name.lower()
+        # The keyword automaton is shared by all amounts, so its matches are
+        # filtered by amount afterwards
+        candidates = {index for index in self.automaton.find(name_lower) if index in applies}
+        if pattern:
+            for match in pattern.finditer(name_lower):
+                candidates.add(int(match.lastgroup[1:]))
+        if amount_rule is not None:
+            candidates.add(amount_rule)
+        return self.rules[min(candidates)]['category'] if candidates else self.default_category
+
+def load_category_rules(rules_file: Path) -> CategoryRuleEngine:
+    if rules_file.exists():
+        try:
+            with open(rules_file, 'r') as f:
+                config = json.load(f)
+            if isinstance(config, list):
+                config = {"rules": config}
+            engine = CategoryRuleEngine(config['rules'], config.get('default_category', 'Other'))
+            logger.info(f"Loaded {len(engine.rules)} categorization rules from {rules_file.name}")
+            return engine
+        except Exception as e:
+            logger.error(f"Error loading categorization rules, using defaults: {e}")
+    return CategoryRuleEngine(DEFAULT_CATEGORY_RULES)
+
+# Categorization cache
+def amount_bucket(amount: float) -> int:
+    # Half-decade buckets: ..., [100, 316), [316, 1000), [1000, 3162), ...
+    return int(math.floor(math.log10(amount) * 2)) if 0 < amount < math.inf else 0
+
+class CategoryCache:
+    def __init__(self, db_file: Optional[Path], max_size: int = 10000, ttl: float = 30 * 24 * 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (category, expires_at)
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+        self.conn = None
+        if db_file:
+            try:
+                self.conn = sqlite3.connect(str(db_file), check_same_thread=False)
+                self.conn.execute(
+                    "CREATE TABLE IF NOT EXISTS category_cache "
+                    "(key TEXT PRIMARY KEY, category TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                self.conn.execute("DELETE FROM category_cache WHERE expires_at < ?", (time.time(),))
+                self.conn.commit()
+            except Exception as e:
+                logger.error(f"Failed to open category cache store: {e}")
+                self.conn = None
+    
+    @staticmethod
+    def make_key(expense_name: str, amount: float) -> str:
+        # Digits and punctuation are dropped so "Swiggy lunch 12/03" and
+        # "swiggy lunch" share an entry; amounts fall in half-decade buckets
+        name = ' '.join(re.sub(r'[\W\d_]+', ' ', expense_name.lower()).split())
+        return f"{name}|{amount_bucket(amount)}"
+    
+    def get(self, expense_name: str, amount: float) -> Optional[str]:
+        key = self.make_key(expense_name, amount)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[1] > now:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+            if entry:
+                del self.entries[key]
+            
+            row = None
+            if self.conn:
+                try:
+                    row = self.conn.execute(
+                        "SELECT category, expires_at FROM category_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except Exception as e:
+                    logger.error(f"Category cache lookup failed: {e}")
+            if row and row[1] > now:
+                self._remember(key, row[0], row[1])
+                self.stats["hits"] += 1
+                self.stats["disk_hits"] += 1
+                return row[0]
+            
+            self.stats["misses"] += 1
+            return None
+    
+    def put(self, expense_name: str, amount: float, category: str):
+        key = self.make_key(expense_name, amount)
+        expires_at = time.time() + self.ttl
+        with self.lock:
+            self._remember(key, category, expires_at)
+            self.stats["stores"] += 1
+            if self.conn:
+                try:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO category_cache (key, category, expires_at) VALUES (?, ?, ?)",
+                        (key, category, expires_at)
+                    )
+                    self.conn.commit()
+                except Exception as e:
+                    logger.error(f"Category cache store failed: {e}")
+    
+    def invalidate(self, expense_name: str, amount: float):
+        key = self.make_key(expense_name, amount)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.stats["invalidations"] += 1
+            if self.conn:
+                try:
+                    self.conn.execute("DELETE FROM category_cache WHERE key = ?", (key,))
+                    self.conn.commit()
+                except Exception as e:
+                    logger.error(f"Category cache invalidation failed: {e}")
+    
+    def _remember(self, key: str, category: str, expires_at: float):
+        self.entries[key] = (category, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+    
+    def get_stats(self) -> Dict:
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0,
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "persistent": self.conn is not None
+            }
+
+# Local categorization model
+# category_source values the classifier learns from; 'local' (its own
+# answers) and 'rules' (the fallback) are left out
+TRAINED_CATEGORY_SOURCES = ('user', 'model')
+
+class LocalCategoryClassifier:
+    # Multinomial naive Bayes over name words, character trigrams and an
+    # amount bucket; counts are updated in place so learning is incremental
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.category_examples: Dict[str, int] = {}
+        self.category_features: Dict[str, Dict[str, int]] = {}
+        self.category_totals: Dict[str, int] = {}
+        self.feature_counts: Dict[str, int] = {}  # across categories, for the vocabulary size
+        self.examples = 0
+        self.stats = {"confident": 0, "unsure": 0}
+    
+    @staticmethod
+    def features(expense_name: str, amount: float) -> List[str]:
+        words = re.findall(r'[a-z]+', expense_name.lower())
+        features = [f"w:{word}" for word in words]
+        for word in words:
+            padded = f"^{word}$"
+            features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        features.append(f"a:{amount_bucket(amount)}")
+        return features
+    
+    def learn(self, expense_name: str, amount: float, category: str):
+        self._update(self.features(expense_name, amount), category, 1)
+    
+    def unlearn(self, expense_name: str, amount: float, category: str):
+        self._update(self.features(expense_name, amount), category, -1)
+    
+    def _update(self, features: List[str], category: str, sign: int):
+        with self.lock:
+            if sign < 0 and category not in self.category_examples:
+                return
+            self.examples += sign
+            self.category_examples[category] = self.category_examples.get(category, 0) + sign
+            counts = self.category_features.setdefault(category, {})
+            for feature in features:
+                counts[feature] = counts.get(feature, 0) + sign
+                if counts[feature] <= 0:
+                    del counts[feature]
+                self.feature_counts[feature] = self.feature_counts.get(feature, 0) + sign
+                if self.feature_counts[feature] <= 0:
+                    del self.feature_counts[feature]
+            self.category_totals[category] = self.category_totals.get(category, 0) + sign * len(features)
+            if self.category_examples[category] <= 0:
+                del self.category_examples[category]
+                del self.category_features[category]
+                del self.category_totals[category]
+    
+    def predict(self, expense_name: str, amount: float) -> tuple:
+        # Returns (category, posterior probability), or (None, 0) when untrained
+        features = self.features(expense_name, amount)
+        with self.lock:
+            if not self.category_examples:
+                return None, 0
+            vocabulary = len(self.feature_counts) + 1
+            scores = {}
+            for category, examples in self.category_examples.items():
+                counts = self.category_features[category]
+                denominator = math.log(self.category_totals[category] + self.alpha * vocabulary)
+                score = math.log(examples / self.examples)
+                for feature in features:
+                    score += math.log(counts.get(feature, 0) + self.alpha) - denominator
+                scores[category] = score
+        
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        normalizer = sum(math.exp(score - top) for score in scores.values())
+        return best, 1 / normalizer
+    
+    def classify(self, expense_name: str, amount: float, threshold: float, min_examples: int) -> Optional[str]:
+        if self.examples < min_examples:
+            return None
+        category, confidence = self.predict(expense_name, amount)
+        with self.lock:
+            if category and confidence >= threshold:
+                self.stats["confident"] += 1
+                return category
+            self.stats["unsure"] += 1
+            return None
+    
+    @staticmethod
+    def is_training_example(expense: Dict) -> bool:
+        # Only categories a person or the model chose: learning from its own
+        # answers or the rules' guesses would let the classifier reinforce
+        # them until it is confident enough to skip the model. Expenses saved
+        # before the source was recorded have none and are kept
+        if expense.get('category_pending'):
+            return False
+        return expense.get('category_source', 'user') in TRAINED_CATEGORY_SOURCES
+    
+    @classmethod
+    def train(cls, expenses: List[Dict]) -> 'LocalCategoryClassifier':
+        classifier = cls()
+        for expense in expenses:
+            if cls.is_training_example(expense):
+                classifier.learn(expense['name'], expense['amount'], expense['category'])
+        return classifier
+    
+    @classmethod
+    def evaluate(cls, expenses: List[Dict], threshold: float, holdout_percent: int = 20) -> Dict:
+        # Deterministic split on the expense id so repeated reports agree
+        examples = [exp for exp in expenses if cls.is_training_example(exp)]
+        holdout = [exp for exp in examples if zlib.crc32(exp['id'].encode()) % 100 < holdout_percent]
+        holdout_ids = {exp['id'] for exp in holdout}
+        model = cls.train([exp for exp in examples if exp['id'] not in holdout_ids])
+        
+        correct = confident = confident_correct = 0
+        for expense in holdout:
+            category, confidence = model.predict(expense['name'], expense['amount'])
+            hit = category == expense['category']
+            correct += hit
+            if category and confidence >= threshold:
+                confident += 1
+                confident_correct += hit
+        
+        return {
+            "train_examples": model.examples,
+            "holdout_examples": len(holdout),
+            "accuracy": round(correct / len(holdout), 4) if holdout else None,
+            "coverage_at_threshold": round(confident / len(holdout), 4) if holdout else None,
+            "accuracy_at_threshold": round(confident_correct / confident, 4) if confident else None
+        }
+    
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                "examples": self.examples,
+                "categories": len(self.category_examples),
+                "vocabulary": len(self.feature_counts),
+                **self.stats
+            }
+
+# Categorization request coalescing
+class CategorizationBatcher:
+    def __init__(self, categorize_batch, window: float, max_batch: int, concurrency: int = 2):
+        # categorize_batch takes [(name, amount), ...] and returns one
+        # category (or None) per item, raising if the whole response is unusable
+        self.categorize_batch = categorize_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.jobs = queue.Queue()
+        # Dispatch has its own pool: callers waiting on results may themselves
+        # be running on the shared executor
+        self.dispatcher = ThreadPoolExecutor(max_workers=concurrency)
+        self.lock = threading.Lock()
+        self.worker = None
+        self.stats = {"batches": 0, "items": 0, "failures": 0}
+    
+    def submit(self, expense_name: str, amount: float) -> Future:
+        future = Future()
+        self._ensure_worker()
+        self.jobs.put((expense_name, amount, future))
+        return future
+    
+    def _ensure_worker(self):
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._collect, name='categorization-batcher', daemon=True)
+                self.worker.start()
+    
+    def _collect(self):
+        while True:
+            batch = [self.jobs.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.jobs.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.dispatcher.submit(self._dispatch, batch)
+    
+    def _dispatch(self, batch: List[tuple]):
+        with self.lock:
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+        try:
+            categories = self.categorize_batch([(name, amount) for name, amount, _ in batch])
+        except Exception as e:
+            with self.lock:
+                self.stats["failures"] += 1
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), category in zip(batch, categories):
+            future.set_result(category)
+    
+    def get_stats(self) -> Dict:
+        with self.lock:
+            batches = self.stats["batches"]
+            return {
+                **self.stats,
+                "average_batch_size": round(self.stats["items"] / batches, 2) if batches else 0,
+                "queued": self.jobs.qsize()
+            }
+
+# Gemini circuit breaker
+class CircuitBreaker:
+    # closed: calls go through, and failure_threshold failures in a row
+    # (errors, timeouts or calls slower than slow_call seconds) open it.
+    # open: calls are refused for cooldown seconds. half_open: one trial call
+    # goes through; success closes the breaker and failure reopens it
+    def __init__(self, failure_threshold: int, cooldown: float, slow_call: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.slow_call = slow_call
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.stats = {"opened": 0, "short_circuited": 0, "successes": 0, "failures": 0, "slow_calls": 0}
+    
+    def _current_state(self) -> str:
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = 'half_open'
+        return self.state
+    
+    def is_open(self) -> bool:
+        # True while a call would be refused
+        with self.lock:
+            state = self._current_state()
+            return state == 'open' or (state == 'half_open' and self.trial_running)
+    
+    def allow(self) -> bool:
+        with self.lock:
+            state = self._current_state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_running:
+                self.trial_running = True
+                return True
+            self.stats["short_circuited"] += 1
+            return False
+    
+    def cancel(self):
+        # An allowed call that never reached the model
+        with self.lock:
+            self.trial_running = False
+    
+    def record_success(self, duration: float):
+        if duration > self.slow_call:
+            self.record_failure(slow=True)
+            return
+        with self.lock:
+            self.stats["successes"] += 1
+            self.consecutive_failures = 0
+            self.trial_running = False
+            if self.state != 'closed':
+                logger.info("Gemini circuit breaker closed")
+                self.state = 'closed'
+    
+    def record_failure(self, slow: bool = False):
+        with self.lock:
+            self.stats["slow_calls" if slow else "failures"] += 1
+            self.consecutive_failures += 1
+            self.trial_running = False
+            state = self._current_state()
+            if state == 'half_open' or (state == 'closed' and self.consecutive_failures >= self.failure_threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.stats["opened"] += 1
+                logger.warning(f"Gemini circuit breaker opened after {self.consecutive_failures} failed or slow calls")
+    
+    def get_stats(self) -> Dict:
+        with self.lock:
+            state = self._current_state()
+            retry_in = self.cooldown - (time.monotonic() - self.opened_at) if state == 'open' else 0
+            return {
+                "state": state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "slow_call_seconds": self.slow_call,
+                "cooldown_seconds": self.cooldown,
+                "retry_in_seconds": round(retry_in, 3),
+                **self.stats
+            }
+
+# AI Service
+class AIService:
+    def __init__(self, cache: Optional[CategoryCache] = None, model=None,
+                 batch_window: float = 0, batch_max_size: int = 20,
+                 rules: Optional[CategoryRuleEngine] = None,
+                 timeout: float = 10, max_concurrent: int = 8, hedge_after: float = 0,
+                 breaker: Optional[CircuitBreaker] = None):
+        # model may be any object with a genai.GenerativeModel-style
+        # generate_content(prompt) method, e.g. a local stub
+        self.cache = cache
+        self.rules = rules or CategoryRuleEngine(DEFAULT_CATEGORY_RULES)
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker(5, 30, 5)
+        # Calls run on their own threads so a caller can stop waiting at its
+        # deadline; a call abandoned that way keeps its slot until it returns,
+        # so a hung upstream can tie up at most max_concurrent threads
+        self.max_concurrent = max_concurrent
+        self.call_slots = threading.BoundedSemaphore(max_concurrent)
+        self.call_pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='ai-call')
+        self.hedge_pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='ai-hedge')
+        self.stats = {"in_flight": 0, "rejected": 0, "timeouts": 0, "hedged": 0}
+        self.stats_lock = threading.Lock()
+        self._model = model
+        self.model_pending = model is None and AI_ENABLED
+        self.model_lock = threading.Lock()
+        if self.model_pending and not LAZY_INIT:
+            self.model = create_ai_model()
+        
+        self.batcher = None
+        if batch_window > 0 and batch_max_size > 1:
+            self.batcher = CategorizationBatcher(self._categorize_coalesced, batch_window, batch_max_size)
+    
+    @property
+    def model(self):
+        # In lazy mode the model is created by the first call that needs it
+        if self.model_pending:
+            with self.model_lock:
+                if self.model_pending:
+                    self.model = create_ai_model()
+        return self._model
+    
+    @model.setter
+    def model(self, model):
+        self._model = model
+        self.model_pending = False
+    
+    def is_ai_available(self) -> bool:
+        # False while the circuit breaker is refusing calls
+        return self.model is not None and not self.breaker.is_open()
+    
+    def _categorize_local(self, expense_name: str, amount: float,
+                          classifier: Optional[LocalCategoryClassifier]) -> Optional[str]:
+        if not classifier:
+            return None
+        return classifier.classify(expense_name, amount, LOCAL_CLASSIFIER_THRESHOLD, LOCAL_CLASSIFIER_MIN_EXAMPLES)
+    
+    def categorize_expense_provisional(self, expense_name: str, amount: float,
+                                       classifier: Optional[LocalCategoryClassifier] = None) -> tuple:
+        # Returns (category, source, pending) without waiting on the model;
+        # pending is True when the category is only the rule-based guess
+        if self.cache:
+            cached = self.cache.get(expense_name, amount)
+            if cached:
+                metrics.inc('expense_categorizations_total', source='cache')
+                return cached, 'model', False
+        local = self._categorize_local(expense_name, amount, classifier)
+        if local:
+            metrics.inc('expense_categorizations_total', source='local')
+            return local, 'local', False
+        return self._fallback_categorization(expense_name, amount), 'rules', self.is_ai_available()
+    
+    def categorize_expense(self, expense_name: str, amount: float, use_cache: bool = True,
+                           classifier: Optional[LocalCategoryClassifier] = None, hedge: bool = True) -> str:
+        return self.categorize_expense_with_source(expense_name, amount, use_cache, classifier, hedge)[0]
+    
+    def categorize_expense_with_source(self, expense_name: str, amount: float, use_cache: bool = True,
+                                       classifier: Optional[LocalCategoryClassifier] = None,
+                                       hedge: bool = True) -> tuple:
+        # Returns (category, source): 'model' for a model answer, fresh or
+        # cached, 'local' for the classifier's and 'rules' for the fallback
+        if self.cache and use_cache:
+            cached = self.cache.get(expense_name, amount)
+            if cached:
+                metrics.inc('expense_categorizations_total', source='cache')
+                return cached, 'model'
+        
+        local = self._categorize_local(expense_name, amount, classifier)
+        if local:
+            metrics.inc('expense_categorizations_total', source='local')
+            return local, 'local'
+        
+        if self.is_ai_available():
+            try:
+                if hedge and self.hedge_after > 0:
+                    category = self._categorize_hedged(expense_name, amount)
+                else:
+                    category = self._categorize_ai(expense_name, amount)
+                
+                if category:
+                    metrics.inc('expense_categorizations_total', source='ai')
+                    if self.cache:
+                        self.cache.put(expense_name, amount, category)
+                    return category, 'model'
+            except Exception as e:
+                logger.error(f"AI categorization failed: {e}")
+        return self._fallback_categorization(expense_name, amount), 'rules'
+    
+    def _categorize_ai(self, expense_name: str, amount: float) -> Optional[str]:
+        if self.batcher:
+            # The batch's own call is bounded by _generate, but the caller
+            # also waits out the coalescing window and any batches dispatched
+            # ahead of it, so it stops waiting at its own deadline too
+            future = self.batcher.submit(expense_name, amount)
+            try:
+                return future.result(timeout=self.timeout + self.batcher.window)
+            except FutureTimeoutError:
+                with self.stats_lock:
+                    self.stats["timeouts"] += 1
+                raise TimeoutError(f"Coalesced Gemini call exceeded {self.timeout}s")
+        return self._categorize_remote(expense_name, amount)
+    
+    def _categorize_hedged(self, expense_name: str, amount: float) -> Optional[str]:
+        # Returns None (so the caller falls back to the rules) if the model
+        # has not answered within hedge_after; the call itself runs on to its
+        # deadline and a late answer is cached for the next lookup
+        future = self.hedge_pool.submit(self._categorize_ai, expense_name, amount)
+        try:
+            return future.result(timeout=self.hedge_after)
+        except FutureTimeoutError:
+            with self.stats_lock:
+                self.stats["hedged"] += 1
+            metrics.inc('expense_ai_hedges_total')
+            future.add_done_callback(lambda f: self._cache_late_answer(expense_name, amount, f))
+            return None
+    
+    def _cache_late_answer(self, expense_name: str, amount: float, future: Future):
+        if self.cache and not future.exception() and future.result():
+            self.cache.put(expense_name, amount, future.result())
+    
+    def _categorize_remote(self, expense_name: str, amount: float) -> Optional[str]:
+        prompt = f"""
+        Categorize this expense into one of these categories: {', '.join(EXPENSE_CATEGORIES)}
+        
+        Expense: "{expense_name}"
+        Amount: ₹{amount}
+        
+        Respond with only the category name that best fits this expense.
+        Consider Indian context and spending patterns.
+        """
+        
+        category = self._generate(prompt, 'single').strip()
+        if category not in EXPENSE_CATEGORIES:
+            metrics.inc('expense_ai_requests_total', kind='single', outcome='invalid')
+            return None
+        metrics.inc('expense_ai_requests_total', kind='single', outcome='ok')
+        return category
+    
+    def _generate(self, prompt: str, kind: str) -> str:
+        # Raises instead of calling the model when the breaker is open or no
+        # slot frees up in time, and when the answer misses the deadline
+        deadline = time.monotonic() + self.timeout
+        if not self.breaker.allow():
+            metrics.inc('expense_ai_requests_total', kind=kind, outcome='short_circuit')
+            raise RuntimeError("Gemini circuit breaker is open")
+        if not self.call_slots.acquire(timeout=self.timeout):
+            self.breaker.cancel()
+            with self.stats_lock:
+                self.stats["rejected"] += 1
+            metrics.inc('expense_ai_requests_total', kind=kind, outcome='rejected')
+            raise RuntimeError(f"No Gemini call slot freed up within {self.timeout}s")
+        
+        model = self.model
+        with self.stats_lock:
+            self.stats["in_flight"] += 1
+        future = self.call_pool.submit(lambda: model.generate_content(prompt).text)
+        future.add_done_callback(self._release_slot)
+        started = time.perf_counter()
+        try:
+            text = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            self.breaker.record_failure()
+            with self.stats_lock:
+                self.stats["timeouts"] += 1
+            metrics.inc('expense_ai_requests_total', kind=kind, outcome='timeout')
+            raise TimeoutError(f"Gemini call exceeded {self.timeout}s")
+        except Exception:
+            self.breaker.record_failure()
+            metrics.inc('expense_ai_requests_total', kind=kind, outcome='error')
+            raise
+        finally:
+            metrics.observe('expense_ai_request_duration_seconds', time.perf_counter() - started, kind=kind)
+        self.breaker.record_success(time.perf_counter() - started)
+        return text
+    
+    def _release_slot(self, _future: Future):
+        with self.stats_lock:
+            self.stats["in_flight"] -= 1
+        self.call_slots.release()
+    
+    def get_guard_stats(self) -> Dict:
+        with self.stats_lock:
+            stats = dict(self.stats)
+        return {
+            "timeout_seconds": self.timeout,
+            "hedge_seconds": self.hedge_after,
+            "max_concurrent": self.max_concurrent,
+            **stats,
+            "breaker": self.breaker.get_stats()
+        }
+    
+    def _categorize_coalesced(self, items: List[tuple]) -> List[Optional[str]]:
+        if len(items) == 1:
+            return [self._categorize_remote(*items[0])]
+        return self._categorize_batch_remote(items)
+    
+    def categorize_expenses(self, items: List[tuple],
+                            classifier: Optional[LocalCategoryClassifier] = None) -> List[str]:
+        return [category for category, _ in self.categorize_expenses_with_sources(items, classifier)]
+    
+    def categorize_expenses_with_sources(self, items: List[tuple],
+                                         classifier: Optional[LocalCategoryClassifier] = None) -> List[tuple]:
+        # (category, source) per item, with the sources of categorize_expense_with_source
+        categories = [self.cache.get(name, amount) if self.cache else None for name, amount in items]
+        sources = ['model' if category else None for category in categories]
+        cached_count = sum(1 for category in categories if category)
+        categories = [
+            category or self._categorize_local(name, amount, classifier)
+            for category, (name, amount) in zip(categories, items)
+        ]
+        sources = [source or ('local' if category else None) for source, category in zip(sources, categories)]
+        pending = [i for i, category in enumerate(categories) if not category]
+        metrics.inc('expense_categorizations_total', cached_count, source='cache')
+        metrics.inc('expense_categorizations_total', len(items) - len(pending) - cached_count, source='local')
+        
+        if pending and self.is_ai_available():
+            for start in range(0, len(pending), AI_BATCH_PROMPT_SIZE):
+                if self.breaker.is_open():
+                    # The rest go to the rules instead of failing one by one
+                    break
+                chunk = pending[start:start + AI_BATCH_PROMPT_SIZE]
+                try:
+                    answers = self._categorize_batch_remote([items[i] for i in chunk])
+                except Exception as e:
+                    logger.error(f"AI batch categorization failed: {e}")
+                    continue
+                metrics.inc('expense_categorizations_total', sum(1 for answer in answers if answer), source='ai')
+                for i, category in zip(chunk, answers):
+                    categories[i] = category
+                    if category:
+                        sources[i] = 'model'
+                        if self.cache:
+                            self.cache.put(items[i][0], items[i][1], category)
+        
+        return [
+            (category, source) if category else (self._fallback_categorization(name, amount), 'rules')
+            for category, source, (name, amount) in zip(categories, sources, items)
+        ]
+    
+    def _categorize_batch_remote(self, items: List[tuple]) -> List[Optional[str]]:
+        expense_lines = '\n'.join(
+            f'{i}. "{name}" - ₹{amount}' for i, (name, amount) in enumerate(items, 1)
+        )
+        prompt = f"""
+        Categorize each of these expenses into one of these categories: {', '.join(EXPENSE_CATEGORIES)}
+        
+        Expenses:
+        {expense_lines}
+        
+        Respond with only a JSON array of category names, one per expense, in the same order.
+        Consider Indian context and spending patterns.
+        """
+        
+        text = self._generate(prompt, 'batch')
         try:
-            with open(PREDICTIONS_FILE, 'w') as f:
-                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-                json.dump(self.predictions, f, indent=2, default=str)
-                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-        except Exception as e:
-            logger.error(f"Error saving predictions: {e}")
-
-# Initialize tracker
-tracker = ExpenseTracker()
-
-# AI Service (unchanged)
-class AIService:
-    def __init__(self):
-        self.model = None
-        if AI_ENABLED:
-            try:
-                self.model = genai.GenerativeModel('gemini-pro')
-                logger.info("AI model initialized successfully")
-            except Exception as e:
-                logger.error(f"Failed to initialize AI model: {e}")
-                self.model = None
+            categories = self._parse_batch_response(text, len(items))
+        except Exception:
+            metrics.inc('expense_ai_requests_total', kind='batch', outcome='invalid')
+            raise
+        metrics.inc('expense_ai_requests_total', kind='batch', outcome='ok')
+        return categories
     
-    def categorize_expense(self, expense_name: str, amount: float) -> str:
-        if self.model and AI_ENABLED:
-            try:
-                categories = [
-                    "Food & Dining", "Transportation", "Bills & Utilities", 
-                    "Entertainment", "Shopping", "Groceries", "Healthcare", 
-                    "Education", "Travel", "Personal Care", "Investment", 
-                    "Insurance", "Rent", "Other"
-                ]
-                
-                prompt = f"""
-                Categorize this expense into one of these categories: {', '.join(categories)}
-                
-                Expense: "{expense_name}"
-                Amount: ₹{amount}
-                
-                Respond with only the category name that best fits this expense.
-                Consider Indian context and spending patterns.
-                """
-                
-                response = self.model.generate_content(prompt)
-                category = response.text.strip()
-                
-                if category in categories:
-                    return category
-                else:
-                    return self._fallback_categorization(expense_name, amount)
-            except Exception as e:
-                logger.error(f"AI categorization failed: {e}")
-                return self._fallback_categorization(expense_name, amount)
-        else:
-            return self._fallback_categorization(expense_name, amount)
+    @staticmethod
+    def _parse_batch_response(text: str, count: int) -> List[Optional[str]]:
+        # Items the model skipped or answered outside the category list come
+        # back as None so the caller can fall back for just those entries
+        start, end = text.find('['), text.rfind(']')
+        if start == -1 or end < start:
+            raise ValueError("AI response does not contain a JSON array")
+        answers = json.loads(text[start:end + 1])
+        if not isinstance(answers, list):
+            raise ValueError("AI response is not a JSON array")
+        answers = answers[:count] + [None] * (count - len(answers))
+        return [
+            answer.strip() if isinstance(answer, str) and answer.strip() in EXPENSE_CATEGORIES else None
+            for answer in answers
+        ]
     
     def _fallback_categorization(self, expense_name: str, amount: float) -> str:
-        name_lower = expense_name.lower()
-        
-        food_keywords = ['food', 'restaurant', 'cafe', 'coffee', 'lunch', 'dinner', 'breakfast', 'pizza', 'burger']
-        transport_keywords = ['uber', 'taxi', 'bus', 'metro', 'petrol', 'fuel', 'parking']
-        bills_keywords = ['electricity', 'water', 'gas', 'internet', 'phone', 'mobile', 'recharge']
-        grocery_keywords = ['grocery', 'supermarket', 'vegetables', 'fruits', 'milk', 'bread']
-        entertainment_keywords = ['movie', 'cinema', 'game', 'music', 'spotify', 'netflix']
-        
-        if any(keyword in name_lower for keyword in food_keywords):
-            return "Food & Dining"
-        elif any(keyword in name_lower for keyword in transport_keywords):
-            return "Transportation"
-        elif any(keyword in name_lower for keyword in bills_keywords):
-            return "Bills & Utilities"
-        elif any(keyword in name_lower for keyword in grocery_keywords):
-            return "Groceries"
-        elif any(keyword in name_lower for keyword in entertainment_keywords):
-            return "Entertainment"
-        elif amount > 10000:
-            return "Investment"
-        else:
-            return "Other"
+        metrics.inc('expense_categorizations_total', source='fallback')
+        return self.rules.categorize(expense_name, amount)
     
-    def analyze_spending(self, expenses: List[Dict], salary: Dict) -> Dict:
-        if not expenses:
+    def analyze_spending(self, rollup: SpendingRollup, salary: Dict) -> Dict:
+        if not rollup.count:
             return {
                 "insights": ["No expenses to analyze yet. Start adding your expenses!"],
                 "recommendations": ["Add your first expense to get personalized insights"],
                 "health_score": 50
             }
         
-        total_spent = sum(exp['amount'] for exp in expenses)
+        total_spent = rollup.total
         monthly_salary = salary.get('monthly', 0)
         
-        category_spending = {}
-        for exp in expenses:
-            category = exp['category']
-            category_spending[category] = category_spending.get(category, 0) + exp['amount']
+        category_spending = rollup.category_totals()
         
         insights = []
         recommendations = []
@@ -292,11 +3240,10 @@ class AIService:
             "top_category": top_category[0] if category_spending else "None"
         }
     
-    def predict_current_month(self, expenses: List[Dict], salary: Dict) -> Dict:
+    def predict_current_month(self, rollup: SpendingRollup, salary: Dict) -> Dict:
         current_month = datetime.now().strftime('%Y-%m')
-        current_month_expenses = [exp for exp in expenses if exp['date'].startswith(current_month)]
         
-        if not current_month_expenses:
+        if not rollup.month_count(current_month):
             return {
                 "predicted_total": 0,
                 "confidence": 0,
@@ -307,16 +3254,13 @@ class AIService:
         days_in_month = (datetime.now().replace(month=datetime.now().month % 12 + 1, day=1) - timedelta(days=1)).day
         days_remaining = days_in_month - today
         
-        current_spent = sum(exp['amount'] for exp in current_month_expenses)
+        current_spent = rollup.month_total(current_month)
         daily_average = current_spent / today if today > 0 else 0
         
         velocity_prediction = current_spent + (daily_average * days_remaining)
         
-        historical_months = {}
-        for exp in expenses:
-            month = exp['date'][:7]
-            if month != current_month:
-                historical_months[month] = historical_months.get(month, 0) + exp['amount']
+        historical_months = rollup.month_totals()
+        historical_months.pop(current_month, None)
         
         historical_average = sum(historical_months.values()) / len(historical_months) if historical_months else velocity_prediction
         
@@ -336,7 +3280,7 @@ class AIService:
             "message": f"Based on current spending patterns, you're likely to spend ₹{predicted_total:,.0f} this month"
         }
     
-    def suggest_savings_allocation(self, expenses: List[Dict], salary: Dict, budgets: Dict) -> Dict:
+    def suggest_savings_allocation(self, rollup: SpendingRollup, salary: Dict, budgets: Dict) -> Dict:
         monthly_salary = salary.get('monthly', 0)
         
         if monthly_salary <= 0:
@@ -346,8 +3290,7 @@ class AIService:
             }
         
         current_month = datetime.now().strftime('%Y-%m')
-        current_expenses = [exp for exp in expenses if exp['date'].startswith(current_month)]
-        current_spent = sum(exp['amount'] for exp in current_expenses)
+        current_spent = rollup.month_total(current_month)
         
         needs_allocation = monthly_salary * 0.5
         wants_allocation = monthly_salary * 0.3
@@ -389,8 +3332,555 @@ class AIService:
             "category_budgets": category_budgets
         }
 
-# Initialize AI service
-ai_service = AIService()
+# Initialize AI service. In lazy mode the category cache, the rules and the
+# call pools are built by the first request that categorizes or reads them
+category_cache = None
+ai_service = None
+ai_service_lock = threading.Lock()
+
+def get_ai_service() -> AIService:
+    global category_cache, ai_service
+    if ai_service is None:
+        with ai_service_lock:
+            if ai_service is None:
+                cache = None
+                if CATEGORY_CACHE_ENABLED:
+                    cache = CategoryCache(CATEGORY_CACHE_FILE, CATEGORY_CACHE_SIZE, CATEGORY_CACHE_TTL)
+                service = AIService(
+                    cache=cache,
+                    batch_window=AI_BATCH_WINDOW_MS / 1000,
+                    batch_max_size=AI_BATCH_MAX_SIZE,
+                    rules=load_category_rules(CATEGORY_RULES_FILE),
+                    timeout=AI_TIMEOUT_SECONDS,
+                    max_concurrent=AI_MAX_CONCURRENT,
+                    hedge_after=AI_HEDGE_SECONDS,
+                    breaker=CircuitBreaker(AI_BREAKER_FAILURES, AI_BREAKER_COOLDOWN_SECONDS, AI_BREAKER_SLOW_SECONDS)
+                )
+                # The cache is published first: a caller that sees the
+                # service may read category_cache without the lock
+                category_cache, ai_service = cache, service
+    return ai_service
+
+def get_category_cache() -> Optional[CategoryCache]:
+    get_ai_service()
+    return category_cache
+
+if not LAZY_INIT:
+    get_ai_service()
+
+def refine_expense_category(expense_tracker: ExpenseTracker, expense_id: str):
+    try:
+        expense = expense_tracker.get_expense(expense_id)
+        if not expense or not expense.get('category_pending'):
+            return
+        # Not hedged: a background refinement can wait for the model's answer
+        category, source = get_ai_service().categorize_expense_with_source(
+            expense['name'], expense['amount'], use_cache=False, hedge=False
+        )
+        with expense_tracker.mutation():
+            # The expense may have been deleted or recategorized meanwhile
+            expense = expense_tracker.get_expense(expense_id)
+            if not expense or not expense.get('category_pending'):
+                return
+            expense = expense_tracker.update_expense(
+                expense_id, {"category": category, "category_source": source, "category_pending": False}
+            )
+            expense_tracker.record_category_update(expense)
+    except Exception as e:
+        logger.error(f"Background categorization failed for {expense_id}: {e}")
+
+def schedule_category_refinement(expense_tracker: ExpenseTracker, expense_id: str):
+    # The job holds a lease so the tracker stays loaded until it finishes
+    with trackers.lock:
+        expense_tracker.leases += 1
+    future = executor.submit(refine_expense_category, expense_tracker, expense_id)
+    future.add_done_callback(lambda _: trackers.release(expense_tracker))
+
+# Statement import
+DEFAULT_IMPORT_PROFILES = {
+    # The field names this API uses
+    "default": {
+        "columns": {"date": "date", "name": "name", "amount": "amount",
+                    "category": "category", "description": "description"},
+        "date_formats": ["%Y-%m-%d"],
+    },
+    # Bank statements with separate withdrawal and deposit columns; deposits
+    # are not expenses and are skipped
+    "bank": {
+        "columns": {"date": "Date", "name": "Narration", "debit": "Withdrawal Amt.",
+                    "credit": "Deposit Amt.", "description": "Chq./Ref.No."},
+        "date_formats": ["%d/%m/%y", "%d/%m/%Y"],
+    },
+    # Card and wallet exports listing spending as negative amounts
+    "signed": {
+        "columns": {"date": "Date", "name": "Description", "amount": "Amount"},
+        "date_formats": ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"],
+        "negative_expenses": True,
+    },
+}
+
+STATEMENT_AMOUNT_PATTERN = re.compile(r'-?\d[\d,]*(?:\.\d+)?|-?\.\d+')
+
+def parse_statement_amount(text: str) -> Optional[float]:
+    # Tolerates currency symbols, thousands separators and (accounting) negatives
+    text = text.strip()
+    if not text:
+        return None
+    match = STATEMENT_AMOUNT_PATTERN.search(text)
+    if not match:
+        raise ValueError(f"Invalid amount: {text!r}")
+    amount = float(match.group().replace(',', ''))
+    return -amount if text.startswith('(') and text.endswith(')') else amount
+
+class ImportProfile:
+    FIELDS = ('date', 'name', 'amount', 'debit', 'credit', 'category', 'description')
+    
+    def __init__(self, name: str, columns: Dict[str, str], date_formats: List[str] = ('%Y-%m-%d',),
+                 delimiter: str = ',', negative_expenses: bool = False):
+        unknown = sorted(set(columns) - set(self.FIELDS))
+        if unknown:
+            raise ValueError(f"Import profile '{name}' maps unknown fields: {', '.join(unknown)}")
+        if 'date' not in columns or 'name' not in columns or not ('amount' in columns or 'debit' in columns):
+            raise ValueError(f"Import profile '{name}' needs date, name and amount (or debit) columns")
+        self.name = name
+        self.columns = columns
+        self.date_formats = list(date_formats)
+        self.delimiter = delimiter
+        self.negative_expenses = negative_expenses
+    
+    def bind(self, header: List[str]) -> Dict[str, int]:
+        # Header names are matched ignoring case and surrounding spaces
+        positions = {column.strip().lower(): i for i, column in enumerate(header)}
+        bound = {}
+        for field, column in self.columns.items():
+            if column.strip().lower() in positions:
+                bound[field] = positions[column.strip().lower()]
+        missing = [self.columns[field] for field in ('date', 'name', 'amount', 'debit')
+                   if field in self.columns and field not in bound]
+        if missing:
+            raise ValueError(f"CSV header is missing column(s) for profile '{self.name}': {', '.join(missing)}")
+        return bound
+    
+    def parse_date(self, text: str) -> str:
+        for date_format in self.date_formats:
+            try:
+                return datetime.strptime(text.strip(), date_format).strftime('%Y-%m-%d')
+            except ValueError:
+                continue
+        raise ValueError(f"Invalid date: {text!r}")
+    
+    def parse_row(self, row: List[str], bound: Dict[str, int]) -> Optional[Dict]:
+        # None for rows that are not spending (deposits, refunds, blank
+        # amounts); ValueError for rows that cannot be read
+        cell = lambda field: row[bound[field]] if field in bound and bound[field] < len(row) else ''
+        if 'debit' in bound:
+            amount = parse_statement_amount(cell('debit'))
+        else:
+            amount = parse_statement_amount(cell('amount'))
+            if amount is not None and self.negative_expenses:
+                amount = -amount
+        if not amount or amount <= 0:
+            return None
+        name = cell('name').strip()
+        if not name:
+            raise ValueError("Name is required")
+        fields = {
+            "name": name,
+            "amount": amount,
+            "date": self.parse_date(cell('date')),
+            "description": cell('description').strip(),
+        }
+        if cell('category').strip() in EXPENSE_CATEGORIES:
+            fields['category'] = cell('category').strip()
+        return fields
+
+def load_import_profiles(profiles_file: Path) -> Dict[str, ImportProfile]:
+    config = dict(DEFAULT_IMPORT_PROFILES)
+    if profiles_file.exists():
+        try:
+            with open(profiles_file, 'r') as f:
+                config.update(json.load(f))
+            logger.info(f"Loaded import profiles from {profiles_file.name}")
+        except Exception as e:
+            logger.error(f"Error loading import profiles, using defaults: {e}")
+    profiles = {}
+    for name, options in config.items():
+        try:
+            profiles[name] = ImportProfile(name, **options)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Skipping import profile '{name}': {e}")
+    return profiles
+
+import_profiles = None
+
+def get_import_profiles() -> Dict[str, ImportProfile]:
+    # Read by the first import in lazy mode; loading twice in a race is harmless
+    global import_profiles
+    if import_profiles is None:
+        import_profiles = load_import_profiles(IMPORT_PROFILES_FILE)
+    return import_profiles
+
+if not LAZY_INIT:
+    get_import_profiles()
+
+class ExpenseImporter:
+    """Streams a CSV statement into a tracker, IMPORT_CHUNK_SIZE rows per commit.
+    
+    Rows matching an existing expense on (date, amount, normalized name) are
+    duplicates. Each existing expense absorbs at most one row, so a statement
+    listing two identical purchases against one saved copy still adds the
+    second, and importing the same file twice adds nothing the second time.
+    """
+    # Imports running in this process, so one cannot be resumed twice at once
+    active = set()
+    active_lock = threading.Lock()
+    
+    def __init__(self, expense_tracker: ExpenseTracker, profile: ImportProfile, state: Dict):
+        self.tracker = expense_tracker
+        self.profile = profile
+        # Worked on privately; tracker.imports only ever holds saved copies,
+        # which status requests can read while the import runs
+        self.state = {**state, "errors": list(state['errors'])}
+        self.index = expense_tracker.duplicate_counts()
+        # Tracker expenses per key this import has accounted for: the ones
+        # its rows duplicated and the ones it created (counted before the
+        # chunk is committed, so rows in the same chunk are not matched
+        # against each other)
+        self.used = Counter()
+        self.chunk = []
+        # Outcomes of the rows read since the last commit
+        self.pending = Counter()
+        self.pending_errors = []
+    
+    @staticmethod
+    def new_state(profile: ImportProfile, filename: Optional[str]) -> Dict:
+        return {
+            "id": str(uuid.uuid4()),
+            "profile": profile.name,
+            "filename": filename,
+            "status": "running",
+            "rows_processed": 0,
+            "created": 0,
+            "duplicates": 0,
+            "skipped": 0,
+            "failed": 0,
+            "errors": [],
+            "started_at": datetime.now().isoformat(),
+            "updated_at": datetime.now().isoformat(),
+        }
+    
+    def claim(self) -> bool:
+        with self.active_lock:
+            if self.state['id'] in self.active:
+                return False
+            self.active.add(self.state['id'])
+            return True
+    
+    def run(self, lines):
+        # Must follow a successful claim(), which this releases
+        try:
+            self._run(lines)
+        except Exception as e:
+            # Rows up to the last commit are saved; resuming starts after them
+            self.state['status'] = 'failed'
+            self.state['error'] = str(e)
+            try:
+                self._save()
+            except Exception as save_error:
+                logger.error(f"Error saving progress of import {self.state['id']}: {save_error}")
+            raise
+        finally:
+            with self.active_lock:
+                self.active.discard(self.state['id'])
+    
+    def _run(self, lines):
+        reader = csv.reader(lines, delimiter=self.profile.delimiter)
+        header = next(reader, None)
+        if header is None:
+            raise ValueError("CSV is empty")
+        bound = self.profile.bind(header)
+        self.state['status'] = 'running'
+        self.state.pop('error', None)
+        
+        done = self.state['rows_processed']
+        row_number = 0
+        for row_number, row in enumerate(reader, 1):
+            if row_number <= done:
+                # Committed by an earlier attempt; its expense (or the one it
+                # duplicated) is in the tracker now, so it still absorbs a match
+                try:
+                    fields = self.profile.parse_row(row, bound)
+                except ValueError:
+                    continue
+                if fields:
+                    self._match(fields)
+                continue
+            
+            try:
+                fields = self.profile.parse_row(row, bound)
+                expense = build_expense(fields) if fields else None
+            except ValueError as e:
+                self.pending['failed'] += 1
+                if len(self.state['errors']) + len(self.pending_errors) < IMPORT_ERRORS_KEPT:
+                    self.pending_errors.append({"row": row_number, "error": str(e)})
+            else:
+                if fields is None:
+                    self.pending['skipped'] += 1
+                elif self._match(fields):
+                    self.pending['duplicates'] += 1
+                else:
+                    self.chunk.append(expense)
+            if row_number - self.state['rows_processed'] >= IMPORT_CHUNK_SIZE:
+                self._commit(row_number)
+        
+        self._commit(max(row_number, done))
+        self.state['status'] = 'completed'
+        self.state['completed_at'] = datetime.now().isoformat()
+        self._save()
+    
+    def _match(self, fields: Dict) -> bool:
+        # Claims a tracker expense for the row; True when it was already there
+        key = expense_dedup_key(fields)
+        duplicate = self.index.get(key, 0) > self.used[key]
+        self.used[key] += 1
+        return duplicate
+    
+    def _commit(self, rows_processed: int):
+        if self.chunk:
+            # 'Other' is what build_expense defaults to when the row had no category
+            uncategorized = [exp for exp in self.chunk if needs_categorization(exp)]
+            cache = get_category_cache()
+            if cache:
+                # Categories from the statement override the model's, as on create
+                for expense in self.chunk:
+                    if not needs_categorization(expense):
+                        cache.invalidate(expense['name'], expense['amount'])
+            if uncategorized:
+                categories = get_ai_service().categorize_expenses_with_sources(
+                    [(exp['name'], exp['amount']) for exp in uncategorized], classifier=self.tracker.classifier
+                )
+                for expense, (category, source) in zip(uncategorized, categories):
+                    expense['category'], expense['category_source'] = category, source
+            self.tracker.add_expenses(self.chunk)
+            self.pending['created'] += len(self.chunk)
+        
+        # A crash between adding the chunk and saving progress replays the
+        # chunk on resume, where its rows are then counted as duplicates
+        for outcome, count in self.pending.items():
+            self.state[outcome] += count
+            metrics.inc('expense_import_rows_total', count, outcome=outcome)
+        self.state['errors'].extend(self.pending_errors)
+        self.state['rows_processed'] = rows_processed
+        self._save()
+        self.chunk = []
+        self.pending = Counter()
+        self.pending_errors = []
+    
+    def _save(self):
+        self.state['updated_at'] = datetime.now().isoformat()
+        with self.tracker.mutation():
+            # Re-inserted so the most recently active import is dropped last
+            self.tracker.imports.pop(self.state['id'], None)
+            self.tracker.imports[self.state['id']] = {**self.state, "errors": list(self.state['errors'])}
+            self.tracker.save_imports()
+
+# Per-user trackers
+class TrackerRegistry:
+    def __init__(self, factory, max_loaded: int, idle_ttl: float):
+        self.factory = factory
+        self.max_loaded = max_loaded
+        self.idle_ttl = idle_ttl
+        self.lock = threading.Lock()
+        self.trackers = OrderedDict()  # user_id -> ExpenseTracker, least recently used first
+        self.load_locks: Dict[str, threading.Lock] = {}
+        self.stats = {"loads": 0, "evictions": 0}
+    
+    def acquire(self, user_id: str) -> ExpenseTracker:
+        # Leased trackers are never evicted, so a request or background job
+        # never writes through an instance that has already been replaced
+        with self.lock:
+            tracker = self.trackers.get(user_id)
+            if tracker is None:
+                load_lock = self.load_locks.setdefault(user_id, threading.Lock())
+        
+        if tracker is None:
+            # Load outside the registry lock so one large history does not
+            # hold up requests for other users
+            with load_lock:
+                with self.lock:
+                    tracker = self.trackers.get(user_id)
+                if tracker is None:
+                    tracker = self.factory(user_id)
+                    with self.lock:
+                        self.trackers[user_id] = tracker
+                        self.load_locks.pop(user_id, None)
+                        self.stats["loads"] += 1
+        
+        with self.lock:
+            tracker.leases += 1
+            tracker.last_used = time.monotonic()
+            self.trackers.move_to_end(user_id)
+            self._evict()
+        return tracker
+    
+    def release(self, tracker: ExpenseTracker):
+        with self.lock:
+            tracker.leases -= 1
+            tracker.last_used = time.monotonic()
+    
+    def _evict(self):
+        now = time.monotonic()
+        for user_id, tracker in list(self.trackers.items()):
+            over_capacity = len(self.trackers) > self.max_loaded
+            if not over_capacity and now - tracker.last_used < self.idle_ttl:
+                break
+            if tracker.leases:
+                continue
+            del self.trackers[user_id]
+            self.stats["evictions"] += 1
+    
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                **self.stats,
+                "loaded": len(self.trackers),
+                "max_loaded": self.max_loaded,
+                "idle_ttl_seconds": self.idle_ttl
+            }
+
+def user_data_dir(user_id: str) -> Path:
+    if user_id == DEFAULT_USER_ID:
+        return DATA_DIR
+    return DATA_DIR / 'users' / user_id
+
+def resume_category_refinements(expense_tracker: ExpenseTracker):
+    # Expenses saved as pending before a restart still need their refinement
+    for expense in expense_tracker.expenses:
+        if expense.get('category_pending'):
+            schedule_category_refinement(expense_tracker, expense['id'])
+
+def load_tracker(user_id: str) -> ExpenseTracker:
+    on_load = resume_category_refinements if CATEGORIZATION_MODE == 'async' else None
+    data_dir = user_data_dir(user_id)
+    if data_dir.exists():
+        return ExpenseTracker(create_storage(data_dir), on_load=on_load)
+    
+    def create_partition() -> ExpenseStorage:
+        data_dir.mkdir(parents=True, exist_ok=True)
+        return create_storage(data_dir)
+    return ExpenseTracker(EmptyStorage(data_dir), on_load=on_load, create_storage_on_write=create_partition)
+
+trackers = TrackerRegistry(load_tracker, MAX_LOADED_TRACKERS, TRACKER_IDLE_SECONDS)
+
+def current_tracker() -> ExpenseTracker:
+    if 'tracker' not in g:
+        g.tracker = trackers.acquire(g.user_id)
+        g.tracker.refresh()
+    return g.tracker
+
+@app.before_request
+def resolve_user_id():
+    # A client could set the header to anyone's id, so it is refused unless
+    # the request came through the proxy that authenticated the user
+    if USER_PROXY_SECRET and not hmac.compare_digest(
+            request.headers.get(USER_PROXY_SECRET_HEADER, '').encode(), USER_PROXY_SECRET.encode()):
+        return jsonify({"error": "Requests must come through the authenticating proxy"}), 403
+    user_id = request.headers.get(USER_ID_HEADER)
+    if user_id and not USER_PROXY_SECRET:
+        return jsonify({"error": f"{USER_ID_HEADER} is only accepted from an authenticating proxy"}), 403
+    if user_id and not USER_ID_PATTERN.match(user_id):
+        return jsonify({"error": f"Invalid {USER_ID_HEADER} header"}), 400
+    g.user_id = user_id or DEFAULT_USER_ID
+
+@app.teardown_request
+def release_tracker(exc):
+    expense_tracker = g.pop('tracker', None)
+    if expense_tracker is not None:
+        trackers.release(expense_tracker)
+
+def cached_json_response(expense_tracker: ExpenseTracker, key: tuple, build, compress: bool = False):
+    # Responses are cached per data version and revalidated with ETags;
+    # date-dependent endpoints include the date in their key
+    use_gzip = compress and 'gzip' in request.accept_encodings
+    if use_gzip:
+        key = key + ('gzip',)
+    version = expense_tracker.version
+    etag = f"{expense_tracker.epoch}-{version}-{zlib.crc32(repr(key).encode()):08x}"
+    if etag in request.if_none_match:
+        metrics.inc('expense_response_cache_total', result='not_modified')
+        response = Response(status=304)
+    else:
+        cached = expense_tracker.response_cache.get(key)
+        if cached and cached[0] == version:
+            metrics.inc('expense_response_cache_total', result='hit')
+            body = cached[1]
+        else:
+            metrics.inc('expense_response_cache_total', result='miss')
+            body = jsonify(build()).get_data()
+            if use_gzip:
+                body = gzip.compress(body)
+            with expense_tracker.lock:
+                # Only cache if nothing changed while the body was built
+                if expense_tracker.version == version:
+                    if len(expense_tracker.response_cache) >= RESPONSE_CACHE_MAX_ENTRIES:
+                        expense_tracker.response_cache.clear()
+                    expense_tracker.response_cache[key] = (version, body)
+        response = Response(body, mimetype='application/json')
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    if compress:
+        response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def collect_component_metrics() -> List[tuple]:
+    registry = trackers.get_stats()
+    families = [
+        ('expense_trackers_loaded', 'gauge', 'Per-user trackers held in memory',
+         [({}, registry['loaded'])]),
+        ('expense_tracker_loads_total', 'counter', 'Per-user tracker loads', [({}, registry['loads'])]),
+        ('expense_tracker_evictions_total', 'counter', 'Per-user tracker evictions',
+         [({}, registry['evictions'])]),
+    ]
+    if category_cache:
+        stats = category_cache.get_stats()
+        families += [
+            ('expense_category_cache_lookups_total', 'counter', 'Category cache lookups by result', [
+                ({"result": "memory_hit"}, stats['hits'] - stats['disk_hits']),
+                ({"result": "disk_hit"}, stats['disk_hits']),
+                ({"result": "miss"}, stats['misses']),
+            ]),
+            ('expense_category_cache_hit_ratio', 'gauge', 'Category cache hit rate since start',
+             [({}, stats['hit_rate'])]),
+            ('expense_category_cache_entries', 'gauge', 'Category cache entries in memory',
+             [({}, stats['size'])]),
+        ]
+    if ai_service is None:
+        # Not built yet in lazy mode; scraping should not build it
+        return families
+    guards = ai_service.get_guard_stats()
+    families += [
+        ('expense_ai_calls_in_flight', 'gauge', 'Gemini calls holding a concurrency slot',
+         [({}, guards['in_flight'])]),
+        ('expense_ai_breaker_open', 'gauge', 'Whether the Gemini circuit breaker refuses calls (half open = 0.5)',
+         [({}, {'closed': 0, 'half_open': 0.5, 'open': 1}[guards['breaker']['state']])]),
+        ('expense_ai_breaker_openings_total', 'counter', 'Times the Gemini circuit breaker opened',
+         [({}, guards['breaker']['opened'])]),
+    ]
+    if ai_service.batcher:
+        stats = ai_service.batcher.get_stats()
+        families += [
+            ('expense_ai_batches_total', 'counter', 'Coalesced categorization prompts',
+             [({}, stats['batches'])]),
+            ('expense_ai_batched_items_total', 'counter', 'Expenses sent in coalesced prompts',
+             [({}, stats['items'])]),
+            ('expense_ai_batch_queued', 'gauge', 'Categorizations waiting to be coalesced',
+             [({}, stats['queued'])]),
+        ]
+    return families
+
+metrics.register_collector(collect_component_metrics)
 
 # API Routes
 @app.route('/api/', methods=['GET'])
@@ -401,61 +3891,542 @@ def root():
         "version": "1.0.0"
     })
 
+
+def encode_cursor(sort: str, key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort, *key]).encode()).decode()
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    # A cursor only continues the listing order it was issued for; its value
+    # is compared against the sort field, so the type has to match as well
+    try:
+        cursor_sort, value, expense_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if sort == 'amount':
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+    else:
+        valid = isinstance(value, str)
+    if cursor_sort != sort or not valid or not isinstance(expense_id, str):
+        raise ValueError("Invalid cursor")
+    return (value, expense_id)
+
+def parse_amount_param(args, name: str) -> Optional[float]:
+    if name not in args:
+        return None
+    try:
+        return float(args[name])
+    except ValueError:
+        raise ValueError(f"{name} must be a valid number")
+
+def parse_expense_query(args) -> Dict:
+    sort = args.get('sort', 'date')
+    if sort not in EXPENSE_SORT_FIELDS:
+        raise ValueError(f"sort must be one of: {', '.join(EXPENSE_SORT_FIELDS)}")
+    order = args.get('order', 'desc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be 'asc' or 'desc'")
+    output_format = args.get('format', 'json').lower()
+    if output_format not in ('json', 'ndjson'):
+        raise ValueError("format must be 'json' or 'ndjson'")
+    
+    limit = None
+    if 'limit' in args or output_format == 'json':
+        try:
+            limit = int(args.get('limit', EXPENSES_PAGE_SIZE))
+        except ValueError:
+            raise ValueError("limit must be an integer")
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+        limit = min(limit, EXPENSES_MAX_PAGE_SIZE)
+    
+    for param in ('from', 'to'):
+        if param in args:
+            try:
+                datetime.strptime(args[param], '%Y-%m-%d')
+            except ValueError:
+                raise ValueError(f"{param} must be a date in YYYY-MM-DD format")
+    
+    categories = [c.strip() for value in args.getlist('category') for c in value.split(',') if c.strip()]
+    return {
+        "filters": {
+            "date_from": args.get('from'),
+            "date_to": args.get('to'),
+            "categories": set(categories),
+            "min_amount": parse_amount_param(args, 'min_amount'),
+            "max_amount": parse_amount_param(args, 'max_amount'),
+            "text": args.get('q', '').strip().lower(),
+        },
+        "sort": sort,
+        "descending": order == 'desc',
+        "after": decode_cursor(args['cursor'], sort) if args.get('cursor') else None,
+        "limit": limit,
+        "format": output_format,
+    }
+
+def stream_expenses_ndjson(expense_tracker: ExpenseTracker, query: Dict):
+    rows = expense_tracker.iter_expenses(query)
+    if query['limit'] is not None:
+        rows = itertools.islice(rows, query['limit'])
+    for expense in rows:
+        yield json_dumps(expense) + b'\n'
+
+def build_expenses_page(expense_tracker: ExpenseTracker, query: Dict) -> Dict:
+    page = expense_tracker.query_expenses(query, query['limit'] + 1)
+    has_more = len(page) > query['limit']
+    page = page[:query['limit']]
+    next_cursor = encode_cursor(query['sort'], expense_sort_key(page[-1], query['sort'])) if has_more else None
+    return {
+        "expenses": page,
+        "count": len(page),
+        "next_cursor": next_cursor
+    }
+
 @app.route('/api/expenses', methods=['GET'])
 def get_expenses():
     try:
-        return jsonify(tracker.expenses)
+        tracker = current_tracker()
+        # Without query parameters the first page is returned; the whole
+        # history as one list (the original response) is only sent on request
+        if request.args.get('all', '').lower() == 'true':
+            if len(request.args) > 1:
+                return jsonify({"error": "all cannot be combined with other parameters"}), 400
+            return cached_json_response(tracker, ('expenses',), lambda: tracker.expenses)
+        
+        try:
+            query = parse_expense_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if query['format'] == 'ndjson':
+            return Response(stream_with_context(stream_expenses_ndjson(tracker, query)), mimetype='application/x-ndjson')
+        
+        key = ('expenses', tuple(sorted(request.args.items(multi=True))))
+        return cached_json_response(tracker, key, lambda: build_expenses_page(tracker, query))
     except Exception as e:
         logger.error(f"Error getting expenses: {e}")
         return jsonify({"error": "Failed to get expenses", "details": str(e)}), 500
 
+def validate_expense_fields(data: Dict) -> Dict:
+    # Name, amount and date checks shared by create and update, so both
+    # accept exactly the same values; returns the normalized fields present
+    fields = {}
+    if 'name' in data:
+        if not isinstance(data['name'], str) or not data['name'].strip():
+            raise ValueError("Name must be a non-empty string")
+        fields['name'] = data['name']
+    if 'amount' in data:
+        # bool is an int subclass, so float() alone would take true as 1.0
+        if isinstance(data['amount'], bool):
+            raise ValueError("Amount must be a valid number")
+        try:
+            amount = float(data['amount'])
+        except (TypeError, ValueError):
+            raise ValueError("Amount must be a valid number")
+        if not math.isfinite(amount):
+            raise ValueError("Amount must be a finite number")
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
+        fields['amount'] = amount
+    if 'date' in data:
+        try:
+            fields['date'] = datetime.strptime(data['date'], '%Y-%m-%d').strftime('%Y-%m-%d')
+        except (TypeError, ValueError):
+            raise ValueError("Date must be a date in YYYY-MM-DD format")
+    return fields
+
+def build_expense(data: Dict) -> Dict:
+    if not isinstance(data, dict):
+        raise ValueError("Expense must be a JSON object")
+    
+    if not data.get('name') or not data.get('amount'):
+        raise ValueError("Name and amount are required")
+    # Checked up front so a malformed item is reported on its own instead
+    # of failing deep inside categorization or the derived indexes
+    fields = validate_expense_fields({
+        "name": data['name'],
+        "amount": data['amount'],
+        "date": data.get('date') or datetime.now().strftime('%Y-%m-%d')
+    })
+    for field in ('category', 'description'):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            raise ValueError(f"{field.capitalize()} must be a string")
+    
+    return {
+        "id": str(uuid.uuid4()),
+        "name": fields['name'],
+        "amount": fields['amount'],
+        "category": data.get('category') or 'Other',
+        # Replaced by the categorizer's source when the category is filled in
+        "category_source": 'user',
+        "date": fields['date'],
+        "description": data.get('description') or '',
+        "created_at": datetime.now().isoformat()
+    }
+
+def needs_categorization(data: Dict) -> bool:
+    return not data.get('category') or data.get('category') == 'Other'
+
+EXPENSE_EDITABLE_FIELDS = ('name', 'amount', 'category', 'date', 'description')
+
+def parse_expense_changes(data: Dict) -> Dict:
+    if not isinstance(data, dict) or not data:
+        raise ValueError("A JSON object with the fields to change is required")
+    unknown = sorted(set(data) - set(EXPENSE_EDITABLE_FIELDS))
+    if unknown:
+        raise ValueError(f"Cannot update: {', '.join(unknown)}; editable fields are {', '.join(EXPENSE_EDITABLE_FIELDS)}")
+    
+    changes = validate_expense_fields(data)
+    if 'category' in data:
+        if not isinstance(data['category'], str) or not data['category'].strip():
+            raise ValueError("Category must be a non-empty string")
+        changes['category'] = data['category']
+    if 'description' in data:
+        if not isinstance(data['description'], str):
+            raise ValueError("Description must be a string")
+        changes['description'] = data['description']
+    if 'category' in changes:
+        # A user-chosen category also ends any pending background refinement
+        changes['category_source'] = 'user'
+        changes['category_pending'] = False
+    return changes
+
 @app.route('/api/expenses', methods=['POST'])
 def add_expense():
     try:
+        tracker = current_tracker()
         if not request.is_json:
             return jsonify({"error": "Request must be JSON"}), 400
         
         data = request.json
         
-        if not data.get('name') or not data.get('amount'):
-            return jsonify({"error": "Name and amount are required"}), 400
-        
         try:
-            amount = float(data['amount'])
-            if amount <= 0:
-                return jsonify({"error": "Amount must be positive"}), 400
-        except ValueError:
-            return jsonify({"error": "Amount must be a valid number"}), 400
-        
-        expense = {
-            "id": str(uuid.uuid4()),
-            "name": data['name'],
-            "amount": amount,
-            "category": data.get('category', 'Other'),
-            "date": data.get('date', datetime.now().strftime('%Y-%m-%d')),
-            "description": data.get('description', ''),
-            "created_at": datetime.now().isoformat()
-        }
+            expense = build_expense(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        if not data.get('category') or data.get('category') == 'Other':
-            expense['category'] = ai_service.categorize_expense(expense['name'], expense['amount'])
+        pending = False
+        if needs_categorization(data):
+            if CATEGORIZATION_MODE == 'async':
+                expense['category'], expense['category_source'], pending = get_ai_service().categorize_expense_provisional(
+                    expense['name'], expense['amount'], classifier=tracker.classifier
+                )
+                if pending:
+                    expense['category_pending'] = True
+            else:
+                expense['category'], expense['category_source'] = get_ai_service().categorize_expense_with_source(
+                    expense['name'], expense['amount'], classifier=tracker.classifier
+                )
+        elif get_category_cache():
+            # A user-chosen category overrides whatever the model said before
+            get_category_cache().invalidate(expense['name'], expense['amount'])
         
-        tracker.expenses.append(expense)
-        tracker.save_expenses()
+        tracker.add_expense(expense)
+        if pending:
+            schedule_category_refinement(tracker, expense['id'])
         
         return jsonify(expense), 201
     except Exception as e:
         logger.error(f"Error adding expense: {e}")
         return jsonify({"error": "Failed to add expense", "details": str(e)}), 500
 
+@app.route('/api/expenses/batch', methods=['POST'])
+def add_expenses_batch():
+    try:
+        tracker = current_tracker()
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
+        
+        data = request.json
+        items = data.get('expenses') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "A non-empty list of expenses is required"}), 400
+        if len(items) > EXPENSES_BATCH_MAX:
+            return jsonify({"error": f"At most {EXPENSES_BATCH_MAX} expenses per batch"}), 400
+        
+        results = []
+        created = []
+        uncategorized = []
+        for index, item in enumerate(items):
+            try:
+                expense = build_expense(item)
+            except ValueError as e:
+                results.append({"index": index, "status": "error", "error": str(e)})
+                continue
+            results.append({"index": index, "status": "created", "expense": expense})
+            created.append(expense)
+            if needs_categorization(item):
+                uncategorized.append(expense)
+            elif get_category_cache():
+                get_category_cache().invalidate(expense['name'], expense['amount'])
+        
+        if uncategorized:
+            categories = get_ai_service().categorize_expenses_with_sources(
+                [(exp['name'], exp['amount']) for exp in uncategorized], classifier=tracker.classifier
+            )
+            for expense, (category, source) in zip(uncategorized, categories):
+                expense['category'], expense['category_source'] = category, source
+        
+        if created:
+            tracker.add_expenses(created)
+        
+        failed = len(results) - len(created)
+        if not created:
+            status = 400
+        elif failed:
+            status = 207
+        else:
+            status = 201
+        return jsonify({"created": len(created), "failed": failed, "results": results}), status
+    except Exception as e:
+        logger.error(f"Error adding expense batch: {e}")
+        return jsonify({"error": "Failed to add expenses", "details": str(e)}), 500
+
+@app.route('/api/expenses/category-updates', methods=['GET'])
+def get_category_updates():
+    try:
+        tracker = current_tracker()
+        try:
+            since = int(request.args.get('since', 0))
+        except ValueError:
+            return jsonify({"error": "since must be an integer"}), 400
+        return jsonify(tracker.category_updates_since(since))
+    except Exception as e:
+        logger.error(f"Error getting category updates: {e}")
+        return jsonify({"error": "Failed to get category updates", "details": str(e)}), 500
+
+def parse_search_query(args) -> Dict:
+    query = args.get('q', '')
+    if not query.strip():
+        raise ValueError("q is required")
+    try:
+        limit = int(args.get('limit', SEARCH_PAGE_SIZE))
+        offset = int(args.get('offset', 0))
+    except ValueError:
+        raise ValueError("limit and offset must be integers")
+    if limit <= 0 or offset < 0:
+        raise ValueError("limit must be positive and offset must not be negative")
+    return {"q": query, "limit": min(limit, EXPENSES_MAX_PAGE_SIZE), "offset": offset}
+
+def build_search_results(expense_tracker: ExpenseTracker, query: Dict) -> Dict:
+    with expense_tracker.lock:
+        found = expense_tracker.search_index.search(query['q'], query['offset'], query['limit'])
+    return {
+        "query": query['q'],
+        "results": found['results'],
+        "offset": query['offset'],
+        "limit": query['limit'],
+        "next_offset": query['offset'] + query['limit'] if found['has_more'] else None,
+        "suggestions": found['suggestions']
+    }
+
+@app.route('/api/expenses/search', methods=['GET'])
+def search_expenses():
+    try:
+        tracker = current_tracker()
+        try:
+            query = parse_search_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        key = ('search', query['q'], query['offset'], query['limit'])
+        return cached_json_response(tracker, key, lambda: build_search_results(tracker, query))
+    except Exception as e:
+        logger.error(f"Error searching expenses: {e}")
+        return jsonify({"error": "Failed to search expenses", "details": str(e)}), 500
+
+def parse_export_query(args) -> Dict:
+    output_format = args.get('format', 'csv').lower()
+    if output_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    compression = args.get('compress', 'none').lower()
+    if compression not in EXPORT_COMPRESSION:
+        raise ValueError(f"compress must be one of: {', '.join(EXPORT_COMPRESSION)}")
+    for param in ('from', 'to'):
+        if param in args:
+            try:
+                datetime.strptime(args[param], '%Y-%m-%d')
+            except ValueError:
+                raise ValueError(f"{param} must be a date in YYYY-MM-DD format")
+    return {
+        "filters": {
+            "date_from": args.get('from'),
+            "date_to": args.get('to'),
+            "categories": set(),
+            "min_amount": None,
+            "max_amount": None,
+            "text": "",
+        },
+        # Oldest first, ties in id order, like a statement
+        "sort": 'date',
+        "descending": False,
+        "after": None,
+        "format": output_format,
+        "compress": compression == 'gzip',
+    }
+
+def encode_export_rows(rows, output_format: str):
+    # One encoded batch of EXPENSES_STREAM_BATCH rows at a time
+    if output_format == 'csv':
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_CSV_FIELDS)
+    while True:
+        batch = list(itertools.islice(rows, EXPENSES_STREAM_BATCH))
+        if output_format == 'csv':
+            writer.writerows([exp.get(field, '') for field in EXPORT_CSV_FIELDS] for exp in batch)
+            yield text.getvalue().encode()
+            text.seek(0)
+            text.truncate()
+        elif batch:
+            yield b''.join(json_dumps(exp) + b'\n' for exp in batch)
+        if len(batch) < EXPENSES_STREAM_BATCH:
+            return
+
+def export_chunks(encoded, compress: bool):
+    # Re-slices the encoded output into EXPORT_CHUNK_BYTES pieces so the
+    # response holds at most a chunk and a batch, however long the history is
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    buffer = bytearray()
+    for data in encoded:
+        buffer += compressor.compress(data) if compressor else data
+        while len(buffer) >= EXPORT_CHUNK_BYTES:
+            yield bytes(buffer[:EXPORT_CHUNK_BYTES])
+            del buffer[:EXPORT_CHUNK_BYTES]
+    if compressor:
+        buffer += compressor.flush()
+    if buffer:
+        yield bytes(buffer)
+
+@app.route('/api/expenses/export', methods=['GET'])
+def export_expenses():
+    try:
+        tracker = current_tracker()
+        try:
+            query = parse_export_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        compress = query['compress'] and 'gzip' in request.accept_encodings
+        chunks = export_chunks(encode_export_rows(tracker.iter_expenses(query), query['format']), compress)
+        mimetype = 'text/csv' if query['format'] == 'csv' else 'application/x-ndjson'
+        response = Response(stream_with_context(chunks), mimetype=mimetype)
+        if compress:
+            response.headers['Content-Encoding'] = 'gzip'
+        if query['compress']:
+            response.vary.add('Accept-Encoding')
+        period = '-'.join(request.args[param] for param in ('from', 'to') if param in request.args)
+        filename = f"expenses{'-' + period if period else ''}.{query['format']}"
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    except Exception as e:
+        logger.error(f"Error exporting expenses: {e}")
+        return jsonify({"error": "Failed to export expenses", "details": str(e)}), 500
+
+@app.route('/api/expenses/bulk-delete', methods=['POST'])
+def bulk_delete_expenses():
+    try:
+        tracker = current_tracker()
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
+        
+        data = request.json
+        ids = data.get('ids') if isinstance(data, dict) else None
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+            return jsonify({"error": "A non-empty list of expense ids is required"}), 400
+        if len(ids) > EXPENSES_BATCH_MAX:
+            return jsonify({"error": f"At most {EXPENSES_BATCH_MAX} expenses per batch"}), 400
+        
+        deleted = tracker.delete_expenses(ids)
+        found = set(deleted)
+        not_found = [i for i in dict.fromkeys(ids) if i not in found]
+        return jsonify({"deleted": deleted, "not_found": not_found})
+    except Exception as e:
+        logger.error(f"Error deleting expenses: {e}")
+        return jsonify({"error": "Failed to delete expenses", "details": str(e)}), 500
+
+@app.route('/api/expenses/import', methods=['POST'])
+def import_expenses():
+    try:
+        tracker = current_tracker()
+        # The CSV comes either as a multipart upload in the 'file' field or as
+        # the raw request body; both are read a line at a time
+        upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+        profiles = get_import_profiles()
+        
+        import_id = request.args.get('import_id')
+        if import_id:
+            with tracker.lock:
+                state = tracker.imports.get(import_id)
+            if state is None:
+                return jsonify({"error": "Import not found"}), 404
+            if state['status'] == 'completed':
+                return jsonify({"error": "Import already completed", "import": state}), 409
+            profile = profiles.get(state['profile'])
+        else:
+            profile = profiles.get(request.args.get('profile', 'default'))
+            filename = upload.filename if upload else request.args.get('filename')
+            state = ExpenseImporter.new_state(profile, filename) if profile else None
+        if profile is None:
+            return jsonify({"error": f"profile must be one of: {', '.join(profiles)}"}), 400
+        
+        importer = ExpenseImporter(tracker, profile, state)
+        if not importer.claim():
+            return jsonify({"error": "Import is already running", "import": state}), 409
+        state = importer.state
+        try:
+            importer.run(io.TextIOWrapper(upload.stream if upload else request.stream, encoding='utf-8-sig', newline=''))
+        except (ValueError, csv.Error) as e:
+            return jsonify({"error": str(e), "import": state}), 400
+        except Exception as e:
+            # The response carries the import id so the upload can be resumed
+            logger.error(f"Import {state['id']} failed after {state['rows_processed']} rows: {e}")
+            return jsonify({"error": "Import failed", "details": str(e), "import": state}), 500
+        return jsonify(state), 200 if import_id else 201
+    except Exception as e:
+        logger.error(f"Error importing expenses: {e}")
+        return jsonify({"error": "Failed to import expenses", "details": str(e)}), 500
+
+@app.route('/api/expenses/import/<import_id>', methods=['GET'])
+def get_import(import_id):
+    try:
+        tracker = current_tracker()
+        with tracker.lock:
+            state = tracker.imports.get(import_id)
+            if state is None:
+                return jsonify({"error": "Import not found"}), 404
+            return jsonify(state)
+    except Exception as e:
+        logger.error(f"Error getting import: {e}")
+        return jsonify({"error": "Failed to get import", "details": str(e)}), 500
+
+@app.route('/api/expenses/<expense_id>', methods=['PATCH'])
+def update_expense(expense_id):
+    try:
+        tracker = current_tracker()
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
+        
+        try:
+            changes = parse_expense_changes(request.json)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        expense = tracker.update_expense(expense_id, changes)
+        if expense is None:
+            return jsonify({"error": "Expense not found"}), 404
+        if 'category' in changes and get_category_cache():
+            # Same as on create: the user's category overrides the model's
+            get_category_cache().invalidate(expense['name'], expense['amount'])
+        return jsonify(expense)
+    except Exception as e:
+        logger.error(f"Error updating expense: {e}")
+        return jsonify({"error": "Failed to update expense", "details": str(e)}), 500
+
 @app.route('/api/expenses/<expense_id>', methods=['DELETE'])
 def delete_expense(expense_id):
     try:
-        initial_count = len(tracker.expenses)
-        tracker.expenses = [exp for exp in tracker.expenses if exp['id'] != expense_id]
-        if len(tracker.expenses) == initial_count:
+        tracker = current_tracker()
+        if not tracker.delete_expense(expense_id):
             return jsonify({"error": "Expense not found"}), 404
-        tracker.save_expenses()
         return jsonify({"message": "Expense deleted successfully"})
     except Exception as e:
         logger.error(f"Error deleting expense: {e}")
@@ -464,7 +4435,8 @@ def delete_expense(expense_id):
 @app.route('/api/budgets', methods=['GET'])
 def get_budgets():
     try:
-        return jsonify(tracker.budgets)
+        tracker = current_tracker()
+        return cached_json_response(tracker, ('budgets',), lambda: tracker.budgets)
     except Exception as e:
         logger.error(f"Error getting budgets: {e}")
         return jsonify({"error": "Failed to get budgets", "details": str(e)}), 500
@@ -472,25 +4444,27 @@ def get_budgets():
 @app.route('/api/budgets', methods=['POST'])
 def set_budget():
     try:
+        tracker = current_tracker()
         if not request.is_json:
             return jsonify({"error": "Request must be JSON"}), 400
         
         data = request.json
         
-        if 'monthly' in data:
-            try:
-                monthly = float(data['monthly'])
-                if monthly < 0:
-                    return jsonify({"error": "Budget amount cannot be negative"}), 400
-                tracker.budgets['monthly'] = monthly
-            except ValueError:
-                return jsonify({"error": "Monthly budget must be a valid number"}), 400
+        with tracker.mutation():
+            if 'monthly' in data:
+                try:
+                    monthly = float(data['monthly'])
+                    if monthly < 0:
+                        return jsonify({"error": "Budget amount cannot be negative"}), 400
+                    tracker.budgets['monthly'] = monthly
+                except ValueError:
+                    return jsonify({"error": "Monthly budget must be a valid number"}), 400
         
-        if 'categories' in data:
-            tracker.budgets['categories'].update(data['categories'])
+            if 'categories' in data:
+                tracker.budgets['categories'].update(data['categories'])
         
-        tracker.budgets['updated_at'] = datetime.now().isoformat()
-        tracker.save_budgets()
+            tracker.budgets['updated_at'] = datetime.now().isoformat()
+            tracker.save_budgets()
         
         return jsonify(tracker.budgets)
     except Exception as e:
@@ -500,7 +4474,8 @@ def set_budget():
 @app.route('/api/salary', methods=['GET'])
 def get_salary():
     try:
-        return jsonify(tracker.salary)
+        tracker = current_tracker()
+        return cached_json_response(tracker, ('salary',), lambda: tracker.salary)
     except Exception as e:
         logger.error(f"Error getting salary: {e}")
         return jsonify({"error": "Failed to get salary", "details": str(e)}), 500
@@ -508,25 +4483,27 @@ def get_salary():
 @app.route('/api/salary', methods=['POST'])
 def set_salary():
     try:
+        tracker = current_tracker()
         if not request.is_json:
             return jsonify({"error": "Request must be JSON"}), 400
         
         data = request.json
         
-        if 'monthly' in data:
-            try:
-                monthly = float(data['monthly'])
-                if monthly < 0:
-                    return jsonify({"error": "Salary amount cannot be negative"}), 400
-                tracker.salary['monthly'] = monthly
-            except ValueError:
-                return jsonify({"error": "Monthly salary must be a valid number"}), 400
+        with tracker.mutation():
+            if 'monthly' in data:
+                try:
+                    monthly = float(data['monthly'])
+                    if monthly < 0:
+                        return jsonify({"error": "Salary amount cannot be negative"}), 400
+                    tracker.salary['monthly'] = monthly
+                except ValueError:
+                    return jsonify({"error": "Monthly salary must be a valid number"}), 400
         
-        if 'currency' in data:
-            tracker.salary['currency'] = data['currency']
+            if 'currency' in data:
+                tracker.salary['currency'] = data['currency']
         
-        tracker.salary['updated_at'] = datetime.now().isoformat()
-        tracker.save_salary()
+            tracker.salary['updated_at'] = datetime.now().isoformat()
+            tracker.save_salary()
         
         return jsonify(tracker.salary)
     except Exception as e:
@@ -536,6 +4513,7 @@ def set_salary():
 @app.route('/api/expenses/categorize', methods=['POST'])
 def categorize_expense():
     try:
+        tracker = current_tracker()
         if not request.is_json:
             return jsonify({"error": "Request must be JSON"}), 400
         
@@ -545,6 +4523,8 @@ def categorize_expense():
         
         try:
             amount = float(amount)
+            if not math.isfinite(amount):
+                return jsonify({"error": "Amount must be a finite number"}), 400
             if amount <= 0:
                 return jsonify({"error": "Amount must be positive"}), 400
         except ValueError:
@@ -553,16 +4533,53 @@ def categorize_expense():
         if not name:
             return jsonify({"error": "Valid name required"}), 400
         
-        category = ai_service.categorize_expense(name, amount)
+        category = get_ai_service().categorize_expense(name, amount, classifier=tracker.classifier)
         return jsonify({"category": category})
     except Exception as e:
         logger.error(f"Error categorizing expense: {e}")
         return jsonify({"error": "Failed to categorize expense", "details": str(e)}), 500
 
+@app.route('/api/expenses/categorize/cache', methods=['GET'])
+def get_category_cache_stats():
+    try:
+        if not get_category_cache():
+            return jsonify({"enabled": False})
+        return jsonify({"enabled": True, **get_category_cache().get_stats()})
+    except Exception as e:
+        logger.error(f"Error getting category cache stats: {e}")
+        return jsonify({"error": "Failed to get category cache stats", "details": str(e)}), 500
+
+@app.route('/api/ai/classifier', methods=['GET'])
+def get_classifier_stats():
+    try:
+        tracker = current_tracker()
+        if not tracker.classifier:
+            return jsonify({"enabled": False})
+        return jsonify({
+            "enabled": True,
+            "threshold": LOCAL_CLASSIFIER_THRESHOLD,
+            "min_examples": LOCAL_CLASSIFIER_MIN_EXAMPLES,
+            **tracker.classifier.get_stats(),
+            "evaluation": tracker.classifier_evaluation()
+        })
+    except Exception as e:
+        logger.error(f"Error getting classifier stats: {e}")
+        return jsonify({"error": "Failed to get classifier stats", "details": str(e)}), 500
+
+@app.route('/api/ai/breaker', methods=['GET'])
+def get_ai_breaker_status():
+    try:
+        service = get_ai_service()
+        return jsonify({"ai_available": service.is_ai_available(), **service.get_guard_stats()})
+    except Exception as e:
+        logger.error(f"Error getting AI breaker status: {e}")
+        return jsonify({"error": "Failed to get AI breaker status", "details": str(e)}), 500
+
 @app.route('/api/expenses/analyze', methods=['POST'])
 def analyze_spending():
     try:
-        analysis = ai_service.analyze_spending(tracker.expenses, tracker.salary)
+        tracker = current_tracker()
+        analysis = get_ai_service().analyze_spending(tracker.rollup, tracker.salary)
         return jsonify(analysis)
     except Exception as e:
         logger.error(f"Error analyzing spending: {e}")
@@ -571,11 +4588,13 @@ def analyze_spending():
 @app.route('/api/expenses/predict-month', methods=['POST'])
 def predict_current_month():
     try:
-        prediction = ai_service.predict_current_month(tracker.expenses, tracker.salary)
+        tracker = current_tracker()
+        prediction = get_ai_service().predict_current_month(tracker.rollup, tracker.salary)
         
-        tracker.predictions.update(prediction)
-        tracker.predictions['last_updated'] = datetime.now().isoformat()
-        tracker.save_predictions()
+        with tracker.mutation():
+            tracker.predictions.update(prediction)
+            tracker.predictions['last_updated'] = datetime.now().isoformat()
+            tracker.save_predictions()
         
         return jsonify(prediction)
     except Exception as e:
@@ -585,75 +4604,194 @@ def predict_current_month():
 @app.route('/api/savings/allocate', methods=['POST'])
 def suggest_savings():
     try:
-        suggestions = ai_service.suggest_savings_allocation(tracker.expenses, tracker.salary, tracker.budgets)
+        tracker = current_tracker()
+        suggestions = get_ai_service().suggest_savings_allocation(tracker.rollup, tracker.salary, tracker.budgets)
         return jsonify(suggestions)
     except Exception as e:
         logger.error(f"Error suggesting savings: {e}")
         return jsonify({"error": "Failed to suggest savings", "details": str(e)}), 500
 
+def parse_trends_query(args) -> Dict:
+    interval = args.get('interval', 'month').lower()
+    if interval not in TRENDS_INTERVALS:
+        raise ValueError(f"interval must be one of: {', '.join(TRENDS_INTERVALS)}")
+    group_by = args.get('group_by', '').lower()
+    if group_by not in ('', 'category'):
+        raise ValueError("group_by must be 'category'")
+    
+    dates = {}
+    for param in ('from', 'to'):
+        if param in args:
+            try:
+                dates[param] = datetime.strptime(args[param], '%Y-%m-%d')
+            except ValueError:
+                raise ValueError(f"{param} must be a date in YYYY-MM-DD format")
+    end = dates.get('to') or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    # Defaults to the last 30 days, 12 weeks or 12 months
+    if 'from' in dates:
+        start = dates['from']
+    elif interval == 'day':
+        start = end - timedelta(days=29)
+    elif interval == 'week':
+        start = end - timedelta(days=end.weekday() + 7 * 11)
+    else:
+        month = end.year * 12 + end.month - 12
+        start = datetime(month // 12, month % 12 + 1, 1)
+    if start > end:
+        raise ValueError("from must not be after to")
+    if interval == 'day':
+        bucket_count = (end - start).days + 1
+    elif interval == 'week':
+        bucket_count = (end - start + timedelta(days=start.weekday())).days // 7 + 1
+    else:
+        bucket_count = (end.year - start.year) * 12 + end.month - start.month + 1
+    if bucket_count > TRENDS_MAX_BUCKETS:
+        raise ValueError(f"Range covers more than {TRENDS_MAX_BUCKETS} {interval}s; use a longer interval or a shorter range")
+    
+    categories = [c.strip() for value in args.getlist('category') for c in value.split(',') if c.strip()]
+    return {
+        "interval": interval,
+        "start": start.toordinal(),
+        "end": end.toordinal(),
+        "categories": sorted(set(categories)) or None,
+        "by_category": group_by == 'category',
+    }
+
+def build_trends(expense_tracker: ExpenseTracker, query: Dict) -> Dict:
+    with expense_tracker.lock:
+        buckets = expense_tracker.timeline.trends(query['start'], query['end'], query['interval'],
+                                                  query['categories'], query['by_category'])
+    return {
+        "interval": query['interval'],
+        "from": datetime.fromordinal(query['start']).strftime('%Y-%m-%d'),
+        "to": datetime.fromordinal(query['end']).strftime('%Y-%m-%d'),
+        "categories": query['categories'],
+        "buckets": buckets,
+        "total": round(sum(bucket['total'] for bucket in buckets), 2),
+        "count": sum(bucket['count'] for bucket in buckets)
+    }
+
+@app.route('/api/analytics/trends', methods=['GET'])
+def get_spending_trends():
+    try:
+        tracker = current_tracker()
+        try:
+            query = parse_trends_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # The resolved range is part of the key since the defaults move with today
+        key = ('trends', query['interval'], query['start'], query['end'],
+               tuple(query['categories'] or ()), query['by_category'])
+        return cached_json_response(tracker, key, lambda: build_trends(tracker, query))
+    except Exception as e:
+        logger.error(f"Error getting spending trends: {e}")
+        return jsonify({"error": "Failed to get spending trends", "details": str(e)}), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    try:
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+        logger.error(f"Error rendering metrics: {e}")
+        return jsonify({"error": "Failed to render metrics", "details": str(e)}), 500
+
+def build_financial_health(expense_tracker: ExpenseTracker) -> Dict:
+    analysis = get_ai_service().analyze_spending(expense_tracker.rollup, expense_tracker.salary)
+    prediction = get_ai_service().predict_current_month(expense_tracker.rollup, expense_tracker.salary)
+    
+    monthly_salary = expense_tracker.salary.get('monthly', 0)
+    current_month = datetime.now().strftime('%Y-%m')
+    current_spent = expense_tracker.rollup.month_total(current_month)
+    
+    savings_rate = ((monthly_salary - current_spent) / monthly_salary * 100) if monthly_salary > 0 else 0
+    
+    return {
+        "health_score": analysis["health_score"],
+        "spending_ratio": analysis.get("spending_ratio", 0),
+        "savings_rate": max(0, savings_rate),
+        "predicted_spending": prediction["predicted_total"],
+        "current_spending": current_spent,
+        "monthly_income": monthly_salary,
+        "insights": analysis["insights"],
+        "recommendations": analysis["recommendations"],
+        "top_category": analysis.get("top_category", "None")
+    }
+
 @app.route('/api/financial-health', methods=['GET'])
 def get_financial_health():
     try:
-        analysis = ai_service.analyze_spending(tracker.expenses, tracker.salary)
-        prediction = ai_service.predict_current_month(tracker.expenses, tracker.salary)
-        
-        monthly_salary = tracker.salary.get('monthly', 0)
-        current_month = datetime.now().strftime('%Y-%m')
-        current_expenses = [exp for exp in tracker.expenses if exp['date'].startswith(current_month)]
-        current_spent = sum(exp['amount'] for exp in current_expenses)
-        
-        savings_rate = ((monthly_salary - current_spent) / monthly_salary * 100) if monthly_salary > 0 else 0
-        
-        health_data = {
-            "health_score": analysis["health_score"],
-            "spending_ratio": analysis.get("spending_ratio", 0),
-            "savings_rate": max(0, savings_rate),
-            "predicted_spending": prediction["predicted_total"],
-            "current_spending": current_spent,
-            "monthly_income": monthly_salary,
-            "insights": analysis["insights"],
-            "recommendations": analysis["recommendations"],
-            "top_category": analysis.get("top_category", "None")
-        }
-        
-        return jsonify(health_data)
+        tracker = current_tracker()
+        today = datetime.now().strftime('%Y-%m-%d')
+        return cached_json_response(tracker, ('financial-health', today), lambda: build_financial_health(tracker))
     except Exception as e:
         logger.error(f"Error getting financial health: {e}")
         return jsonify({"error": "Failed to get financial health", "details": str(e)}), 500
 
+def build_dashboard(expense_tracker: ExpenseTracker) -> Dict:
+    current_month = datetime.now().strftime('%Y-%m')
+    current_spent = expense_tracker.rollup.month_total(current_month)
+    category_breakdown = expense_tracker.rollup.month_category_totals(current_month)
+    
+    monthly_budget = expense_tracker.budgets.get('monthly', 0)
+    budget_progress = (current_spent / monthly_budget * 100) if monthly_budget > 0 else 0
+    
+    recent_expenses = expense_tracker.recent_expenses(10)
+    
+    return {
+        "current_spending": current_spent,
+        "monthly_budget": monthly_budget,
+        "budget_progress": min(100, budget_progress),
+        "monthly_salary": expense_tracker.salary.get('monthly', 0),
+        "expenses_count": expense_tracker.rollup.month_count(current_month),
+        "category_breakdown": category_breakdown,
+        "recent_expenses": recent_expenses,
+        # All-time figures, so clients need not load every page to show them
+        "total_spending": expense_tracker.rollup.total,
+        "total_count": expense_tracker.rollup.count,
+        "categories_used": len(expense_tracker.rollup.categories),
+        "ai_enabled": AI_ENABLED
+    }
+
 @app.route('/api/dashboard', methods=['GET'])
 def get_dashboard_data():
     try:
+        tracker = current_tracker()
         current_month = datetime.now().strftime('%Y-%m')
-        current_expenses = [exp for exp in tracker.expenses if exp['date'].startswith(current_month)]
-        current_spent = sum(exp['amount'] for exp in current_expenses)
-        
-        category_breakdown = {}
-        for exp in current_expenses:
-            category = exp['category']
-            category_breakdown[category] = category_breakdown.get(category, 0) + exp['amount']
-        
-        monthly_budget = tracker.budgets.get('monthly', 0)
-        budget_progress = (current_spent / monthly_budget * 100) if monthly_budget > 0 else 0
-        
-        recent_expenses = sorted(tracker.expenses, key=lambda x: x['created_at'], reverse=True)[:10]
-        
-        dashboard = {
-            "current_spending": current_spent,
-            "monthly_budget": monthly_budget,
-            "budget_progress": min(100, budget_progress),
-            "monthly_salary": tracker.salary.get('monthly', 0),
-            "expenses_count": len(current_expenses),
-            "category_breakdown": category_breakdown,
-            "recent_expenses": recent_expenses,
-            "ai_enabled": AI_ENABLED
-        }
-        
-        return jsonify(dashboard)
+        return cached_json_response(tracker, ('dashboard', current_month), lambda: build_dashboard(tracker))
     except Exception as e:
         logger.error(f"Error getting dashboard data: {e}")
         return jsonify({"error": "Failed to get dashboard data", "details": str(e)}), 500
 
+def build_bootstrap(expense_tracker: ExpenseTracker, query: Dict) -> Dict:
+    # Everything the first screen needs; read-only, unlike predict-month
+    return {
+        "expenses": build_expenses_page(expense_tracker, query),
+        "budgets": expense_tracker.budgets,
+        "salary": expense_tracker.salary,
+        "dashboard": build_dashboard(expense_tracker),
+        "prediction": get_ai_service().predict_current_month(expense_tracker.rollup, expense_tracker.salary),
+        "ai_enabled": AI_ENABLED
+    }
+
+@app.route('/api/bootstrap', methods=['GET'])
+def get_bootstrap():
+    try:
+        tracker = current_tracker()
+        try:
+            query = parse_expense_query(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if query['format'] != 'json':
+            return jsonify({"error": "format must be 'json'"}), 400
+        
+        today = datetime.now().strftime('%Y-%m-%d')
+        key = ('bootstrap', today, tuple(sorted(request.args.items(multi=True))))
+        return cached_json_response(tracker, key, lambda: build_bootstrap(tracker, query), compress=True)
+    except Exception as e:
+        logger.error(f"Error getting bootstrap data: {e}")
+        return jsonify({"error": "Failed to get bootstrap data", "details": str(e)}), 500
+
 # Remove app.run() for Vercel compatibility
 # if __name__ == '__main__':
 #     port = int(os.getenv('PORT', 8001))
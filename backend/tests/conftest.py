@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# server reads its configuration at import time: keep its data files out of
+# the repository and make sure no real Gemini key is picked up from .env
+os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='expense-tests-')
+os.environ['GOOGLE_API_KEY'] = ''
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # A test client whose trackers read and write a fresh data directory
+    import server
+    monkeypatch.setattr(server, 'DATA_DIR', tmp_path)
+    monkeypatch.setattr(server, 'trackers', server.TrackerRegistry(server.load_tracker, 10, 600))
+    return server.app.test_client()
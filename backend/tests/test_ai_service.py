@@ -0,0 +1,145 @@
+"""Offline tests for AIService categorization against StubModel."""
+import time
+
+import pytest
+
+from benchmarks.stubs import StubModel
+from server import AIService, CategoryCache, CircuitBreaker
+
+# The stub knows these merchants; the default rules answer 'Other' for them,
+# so a model answer and a fallback can be told apart
+MODEL_NAME, MODEL_CATEGORY = "Blinkit order", "Groceries"
+
+
+def make_service(model, cache=True, **options):
+    options.setdefault('breaker', CircuitBreaker(3, 0.3, 1.0))
+    return AIService(cache=CategoryCache(None) if cache else None, model=model, **options)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_categorizes_with_model():
+    model = StubModel()
+    service = make_service(model)
+    assert service.categorize_expense(MODEL_NAME, 450) == MODEL_CATEGORY
+    assert model.calls == 1
+
+
+def test_cache_hit_skips_model():
+    model = StubModel()
+    service = make_service(model)
+    service.categorize_expense(MODEL_NAME, 450)
+    assert service.categorize_expense(MODEL_NAME, 460) == MODEL_CATEGORY
+    assert model.calls == 1
+    assert service.cache.get_stats()['hits'] == 1
+
+
+def test_batch_uses_cache_and_one_prompt():
+    model = StubModel()
+    service = make_service(model)
+    service.categorize_expense(MODEL_NAME, 450)
+    categories = service.categorize_expenses([(MODEL_NAME, 450), ("Uber ride", 200), ("Netflix", 199)])
+    assert categories == [MODEL_CATEGORY, "Transportation", "Entertainment"]
+    assert model.calls == 2
+
+
+def test_falls_back_to_rules_when_model_fails():
+    service = make_service(StubModel(failure_rate=1.0))
+    assert service.categorize_expense(MODEL_NAME, 450) == service.rules.categorize(MODEL_NAME, 450)
+    assert service.categorize_expense("Uber ride", 200) == "Transportation"
+
+
+def test_falls_back_to_rules_without_model():
+    service = make_service(None)
+    assert not service.is_ai_available()
+    assert service.categorize_expense("Uber ride", 200) == "Transportation"
+
+
+def test_timeout_answers_within_deadline():
+    service = make_service(StubModel(latency=1.0), timeout=0.1)
+    started = time.perf_counter()
+    category = service.categorize_expense(MODEL_NAME, 450)
+    assert time.perf_counter() - started < 0.5
+    assert category == service.rules.categorize(MODEL_NAME, 450)
+    stats = service.get_guard_stats()
+    assert stats['timeouts'] == 1 and stats['breaker']['consecutive_failures'] == 1
+
+
+def test_breaker_opens_and_skips_model():
+    model = StubModel(failure_rate=1.0)
+    service = make_service(model)
+    for i in range(3):
+        service.categorize_expense(f"{MODEL_NAME} {i}", 450)
+    assert service.get_guard_stats()['breaker']['state'] == 'open'
+    assert not service.is_ai_available()
+    calls = model.calls
+    service.categorize_expense(MODEL_NAME, 450)
+    service.categorize_expenses([(MODEL_NAME, 450), ("Netflix", 199)])
+    assert model.calls == calls
+
+
+@pytest.mark.parametrize('trial_fails, state', [(False, 'closed'), (True, 'open')])
+def test_breaker_half_open_trial(trial_fails, state):
+    model = StubModel(failure_rate=1.0)
+    service = make_service(model)
+    for i in range(3):
+        service.categorize_expense(f"{MODEL_NAME} {i}", 450)
+    time.sleep(0.35)
+    assert service.get_guard_stats()['breaker']['state'] == 'half_open'
+    model.failure_rate = 1.0 if trial_fails else 0.0
+    category = service.categorize_expense(MODEL_NAME, 450)
+    assert (category == MODEL_CATEGORY) != trial_fails
+    assert service.get_guard_stats()['breaker']['state'] == state
+
+
+def test_slow_calls_count_as_failures():
+    service = make_service(StubModel(latency=0.05), breaker=CircuitBreaker(2, 30, 0.01))
+    assert service.categorize_expense(MODEL_NAME, 450) == MODEL_CATEGORY
+    service.categorize_expense("Nykaa order", 450)
+    breaker = service.get_guard_stats()['breaker']
+    assert breaker['state'] == 'open' and breaker['slow_calls'] == 2
+
+
+def test_hedge_answers_with_rules_and_caches_late_answer():
+    model = StubModel(latency=0.3)
+    service = make_service(model, timeout=2, hedge_after=0.05)
+    started = time.perf_counter()
+    category = service.categorize_expense(MODEL_NAME, 450)
+    assert time.perf_counter() - started < 0.2
+    assert category == service.rules.categorize(MODEL_NAME, 450)
+    assert service.get_guard_stats()['hedged'] == 1
+    assert wait_for(lambda: service.cache.get(MODEL_NAME, 450) == MODEL_CATEGORY)
+
+
+def test_unhedged_call_waits_for_model():
+    service = make_service(StubModel(latency=0.2), timeout=2, hedge_after=0.05)
+    assert service.categorize_expense(MODEL_NAME, 450, hedge=False) == MODEL_CATEGORY
+    assert service.get_guard_stats()['hedged'] == 0
+
+
+def test_reports_category_source():
+    model = StubModel()
+    service = make_service(model)
+    assert service.categorize_expense_with_source(MODEL_NAME, 450) == (MODEL_CATEGORY, 'model')
+    assert service.categorize_expense_with_source(MODEL_NAME, 450) == (MODEL_CATEGORY, 'model')
+    model.failure_rate = 1.0
+    assert service.categorize_expense_with_source("Nykaa order", 450)[1] == 'rules'
+    answers = service.categorize_expenses_with_sources([(MODEL_NAME, 450), ("Zepto", 90)])
+    assert [source for _, source in answers] == ['model', 'rules']
+
+
+def test_coalesced_call_stops_waiting_at_deadline():
+    service = make_service(StubModel(), timeout=0.1, batch_window=0.01, batch_max_size=5)
+    # A dispatch stuck ahead of the caller's, e.g. batches queued behind hung ones
+    service.batcher.categorize_batch = lambda items: time.sleep(1.0) or [MODEL_CATEGORY] * len(items)
+    started = time.perf_counter()
+    category = service.categorize_expense(MODEL_NAME, 450)
+    assert time.perf_counter() - started < 0.5
+    assert category == service.rules.categorize(MODEL_NAME, 450)
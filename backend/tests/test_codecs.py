@@ -0,0 +1,62 @@
+"""Round-trip tests for the on-disk data formats."""
+import pytest
+
+from server import DATA_CODECS, JsonStorage, get_data_codec
+
+EXPENSES = [
+    {"id": "exp-1", "name": "Café ☕", "amount": 120.5, "category": "Food & Dining",
+     "date": "2025-01-02", "description": "", "created_at": "2025-01-02T08:00:00"},
+    {"id": "exp-2", "name": "Rent", "amount": 25000, "category": "Bills & Utilities",
+     "date": "2025-01-01", "description": "January\nflat 4B", "created_at": "2025-01-01T09:30:00",
+     "tags": ["home", None], "category_pending": True},
+]
+BUDGETS = {"monthly": 40000.0, "categories": {"Food & Dining": 8000}, "alerts": {}}
+
+
+def codecs():
+    names = ['json', 'compact', 'gzip', 'msgpack']
+    return [pytest.param(name, marks=pytest.mark.skipif(name not in DATA_CODECS, reason='msgpack not installed'))
+            for name in names]
+
+
+@pytest.mark.parametrize('name', codecs())
+def test_codec_round_trip(name):
+    codec = get_data_codec(name)
+    for data in (EXPENSES, BUDGETS, [], {}):
+        assert codec.loads(codec.dumps(data)) == data
+
+
+@pytest.mark.parametrize('name', codecs())
+def test_storage_round_trip(name, tmp_path):
+    storage = JsonStorage(tmp_path, codec=DATA_CODECS[name])
+    storage.save_expenses(EXPENSES)
+    storage.save_document('budgets', BUDGETS)
+    assert storage.expenses_file.name == f"expenses{DATA_CODECS[name].suffix}"
+
+    reopened = JsonStorage(tmp_path, codec=DATA_CODECS[name])
+    assert reopened.load_expenses() == EXPENSES
+    assert reopened.load_document('budgets') == BUDGETS
+
+
+@pytest.mark.parametrize('source, target', [('json', 'gzip'), ('gzip', 'compact'), ('json', 'msgpack')])
+def test_files_converted_to_configured_format(source, target, tmp_path):
+    if target not in DATA_CODECS:
+        pytest.skip('msgpack not installed')
+    old = JsonStorage(tmp_path, codec=DATA_CODECS[source])
+    old.save_expenses(EXPENSES)
+    old.save_document('budgets', BUDGETS)
+
+    storage = JsonStorage(tmp_path, codec=DATA_CODECS[target])
+    assert storage.load_expenses() == EXPENSES
+    assert storage.load_document('budgets') == BUDGETS
+    if DATA_CODECS[source].suffix != DATA_CODECS[target].suffix:
+        assert (tmp_path / f"expenses{DATA_CODECS[source].suffix}.bak").exists()
+
+
+def test_compact_is_smaller_than_indented():
+    assert len(DATA_CODECS['compact'].dumps(EXPENSES)) < len(DATA_CODECS['json'].dumps(EXPENSES))
+
+
+def test_unknown_format_is_refused():
+    with pytest.raises(RuntimeError, match="DATA_FORMAT must be one of"):
+        get_data_codec('yaml')
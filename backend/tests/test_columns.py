@@ -0,0 +1,92 @@
+"""Tests that the NumPy columnar store answers like the row-based code."""
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from benchmarks.synthetic import generate_expenses  # noqa: E402
+from server import ExpenseColumns, JsonStorage, SpendingRollup, expense_sort_key  # noqa: E402
+
+QUERIES = [
+    {},
+    {"categories": {"Groceries", "Shopping"}},
+    {"date_from": "2025-03-01", "date_to": "2025-06-30"},
+    {"min_amount": 500, "max_amount": 2000},
+    {"categories": {"Food & Dining"}, "min_amount": 100, "date_to": "2025-09-15"},
+    {"text": "swiggy"},
+    {"categories": {"Nonexistent"}},
+]
+
+
+@pytest.fixture(scope='module')
+def expenses():
+    rows = list(generate_expenses(3000, months=12))
+    # Ties on every sort field, so the id tie-break is exercised
+    rows[10]['amount'] = rows[11]['amount'] = rows[12]['amount'] = 999.5
+    return rows
+
+
+@pytest.fixture
+def storage(tmp_path):
+    # The row-based queries come from the ExpenseStorage base class
+    return JsonStorage(tmp_path)
+
+
+@pytest.mark.parametrize('filters', QUERIES)
+@pytest.mark.parametrize('sort', ['date', 'amount', 'created_at'])
+@pytest.mark.parametrize('descending', [True, False])
+def test_query_matches_rows(expenses, storage, filters, sort, descending):
+    columns = ExpenseColumns.build(expenses)
+    after = None
+    for _ in range(3):
+        rows = storage.query_expenses(filters, sort, descending, after, 50, expenses)
+        assert columns.query(filters, sort, descending, after, 50, expenses) == rows
+        if len(rows) < 50:
+            break
+        after = expense_sort_key(rows[-1], sort)
+    streamed = list(storage.iter_expenses(filters, sort, descending, None, expenses))
+    assert columns.query(filters, sort, descending, None, None, expenses) == streamed
+
+
+def test_recent_matches_rows(expenses, storage):
+    assert ExpenseColumns.build(expenses).recent(10, expenses) == storage.recent_expenses(10, expenses)
+
+
+def test_rollup_from_columns_matches_rows(expenses):
+    rollup = SpendingRollup(expenses)
+    columnar = SpendingRollup.from_columns(ExpenseColumns.build(expenses))
+    assert (columnar.months, columnar.categories, columnar.month_categories) == \
+        (rollup.months, rollup.categories, rollup.month_categories)
+    assert columnar.exact_total == rollup.exact_total and columnar.count == rollup.count
+
+
+def test_incremental_updates_match_rebuild(expenses, storage):
+    rows = [dict(exp) for exp in expenses[:500]]
+    columns = ExpenseColumns.build(rows)
+    rng = random.Random(0)
+    added = list(generate_expenses(100, months=3, seed=1))
+    rows.extend(added)
+    columns.append(added)
+    for index in rng.sample(range(len(rows)), 50):
+        rows[index] = {**rows[index], "amount": rng.uniform(1, 5000), "category": "Travel", "date": "2024-02-29"}
+        columns.set(index, rows[index])
+    removed = sorted(rng.sample(range(len(rows)), 80))
+    rows[removed[0]:] = [exp for i, exp in enumerate(rows[removed[0]:], removed[0]) if i not in set(removed)]
+    columns.delete(removed)
+
+    rebuilt = ExpenseColumns.build(rows)
+    assert columns.size == rebuilt.size == len(rows)
+    for name in ExpenseColumns.COLUMNS:
+        if name == 'category':
+            names = [columns.category_names[code] for code in columns.category[:columns.size]]
+            assert names == [exp['category'] for exp in rows]
+        else:
+            assert np.array_equal(getattr(columns, name)[:columns.size], getattr(rebuilt, name)[:rebuilt.size])
+    for filters in QUERIES:
+        assert columns.query(filters, 'date', True, None, 50, rows) == \
+            storage.query_expenses(filters, 'date', True, None, 50, rows)
+
+
+def test_unconvertible_rows_disable_columns(expenses):
+    assert ExpenseColumns.build([{**expenses[0], "date": "2025-1-1"}]) is None
@@ -0,0 +1,64 @@
+"""Tests for the expense listing and editing routes."""
+import pytest
+
+import server
+
+
+def add_expenses(client, count):
+    expenses = [{"name": f"Expense {i}", "amount": 100 + i, "category": "Other",
+                 "date": f"2025-01-{i % 28 + 1:02d}"} for i in range(count)]
+    response = client.post('/api/expenses/batch', json={"expenses": expenses})
+    assert response.status_code == 201
+    return [result['expense'] for result in response.get_json()['results']]
+
+
+def test_listing_is_paged_by_default(client, monkeypatch):
+    monkeypatch.setattr(server, 'EXPENSES_PAGE_SIZE', 5)
+    add_expenses(client, 12)
+    page = client.get('/api/expenses').get_json()
+    assert page['count'] == 5 and page['next_cursor']
+    dates = [exp['date'] for exp in page['expenses']]
+    assert dates == sorted(dates, reverse=True)
+
+    seen = [exp['id'] for exp in page['expenses']]
+    while page['next_cursor']:
+        page = client.get(f"/api/expenses?cursor={page['next_cursor']}").get_json()
+        seen += [exp['id'] for exp in page['expenses']]
+    assert len(seen) == len(set(seen)) == 12
+
+
+def test_full_list_is_opt_in(client):
+    added = add_expenses(client, 3)
+    assert client.get('/api/expenses?all=true').get_json() == added
+    assert client.get('/api/expenses?all=true&limit=2').status_code == 400
+
+
+def test_dashboard_reports_all_time_totals(client):
+    add_expenses(client, 3)
+    dashboard = client.get('/api/dashboard').get_json()
+    assert dashboard['total_count'] == 3 and dashboard['total_spending'] == 303
+    assert dashboard['categories_used'] == 1
+    assert client.get('/api/bootstrap').get_json()['dashboard'] == dashboard
+
+
+@pytest.mark.parametrize('amount', [True, False, None, 'abc', 'nan', 'inf', -5, 0, [10]])
+def test_create_and_update_reject_the_same_amounts(client, amount):
+    (expense,) = add_expenses(client, 1)
+    created = client.post('/api/expenses', json={"name": "Tea", "amount": amount, "category": "Other"})
+    updated = client.patch(f"/api/expenses/{expense['id']}", json={"amount": amount})
+    assert created.status_code == updated.status_code == 400
+    assert client.get('/api/expenses?all=true').get_json()[0]['amount'] == expense['amount']
+
+
+def test_update_validates_like_create(client):
+    (expense,) = add_expenses(client, 1)
+    url = f"/api/expenses/{expense['id']}"
+    for changes in ({"name": "  "}, {"name": 5}, {"date": "2025-13-01"}, {"date": 20250101},
+                    {"category": ""}, {"description": None}, {"id": "other"}, {}):
+        assert client.patch(url, json=changes).status_code == 400, changes
+    response = client.patch(url, json={"amount": "12.50", "date": "2025-02-03", "category": "Travel"})
+    assert response.status_code == 200
+    assert response.get_json()['amount'] == 12.5
+    assert response.get_json()['category_source'] == 'user'
+    created = client.post('/api/expenses', json={"name": "Tea", "amount": "12.50", "category": "Other"})
+    assert created.get_json()['amount'] == 12.5
@@ -0,0 +1,71 @@
+"""Tests for the streamed history export."""
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+import server
+from benchmarks.synthetic import generate_expenses
+from server import expense_sort_key
+
+
+@pytest.fixture
+def expenses(client, monkeypatch):
+    monkeypatch.setattr(server, 'EXPORT_CHUNK_BYTES', 4096)
+    tracker = server.trackers.acquire(server.DEFAULT_USER_ID)
+    rows = list(generate_expenses(3000, months=12, seed=4))
+    rows[0]['name'] = 'Comma, "quoted"\nnewline'
+    tracker.add_expenses(rows)
+    server.trackers.release(tracker)
+    return rows
+
+
+def expected(expenses, date_from=None, date_to=None):
+    rows = [exp for exp in expenses
+            if (not date_from or exp['date'] >= date_from) and (not date_to or exp['date'] <= date_to)]
+    return sorted(rows, key=lambda exp: expense_sort_key(exp, 'date'))
+
+
+def test_csv_streams_every_row_in_chunks(client, expenses):
+    response = client.get('/api/expenses/export', buffered=False)
+    chunks = list(response.response)
+    response.close()
+    assert len(chunks) > 10 and all(len(chunk) == 4096 for chunk in chunks[:-1])
+    assert response.mimetype == 'text/csv' and 'Content-Encoding' not in response.headers
+    assert response.headers['Content-Disposition'] == 'attachment; filename="expenses.csv"'
+
+    rows = list(csv.DictReader(io.StringIO(b''.join(chunks).decode())))
+    assert len(rows) == len(expenses)
+    for row, exp in zip(rows, expected(expenses)):
+        assert (row['id'], row['name'], float(row['amount']), row['date']) == \
+            (exp['id'], exp['name'], exp['amount'], exp['date'])
+
+
+def test_ndjson_range(client, expenses):
+    response = client.get('/api/expenses/export?format=ndjson&from=2025-03-01&to=2025-06-30')
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Content-Disposition'] == 'attachment; filename="expenses-2025-03-01-2025-06-30.ndjson"'
+    lines = [json.loads(line) for line in response.get_data().splitlines()]
+    assert lines == expected(expenses, '2025-03-01', '2025-06-30')
+
+
+def test_gzip_is_opt_in(client, expenses):
+    plain = client.get('/api/expenses/export?format=ndjson', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    compressed = client.get('/api/expenses/export?format=ndjson&compress=gzip', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+    # Without Accept-Encoding the request still gets a readable body
+    refused = client.get('/api/expenses/export?format=ndjson&compress=gzip')
+    assert 'Content-Encoding' not in refused.headers and refused.get_data() == plain.get_data()
+
+
+def test_empty_range_and_validation(client, expenses):
+    assert client.get('/api/expenses/export?from=2099-01-01').get_data() == \
+        b'id,date,name,amount,category,description,created_at\r\n'
+    assert client.get('/api/expenses/export?format=ndjson&from=2099-01-01').get_data() == b''
+    for query in ('format=xml', 'from=2020-13-01', 'compress=br'):
+        assert client.get(f'/api/expenses/export?{query}').status_code == 400
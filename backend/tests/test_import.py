@@ -0,0 +1,113 @@
+"""Tests for the CSV statement import and the batch create route."""
+import pytest
+
+import server
+
+HEADER = "date,name,amount,category,description\n"
+
+
+def statement(*rows):
+    return HEADER + ''.join(f"{row}\n" for row in rows)
+
+
+def post_import(client, body, **params):
+    query = '&'.join(f"{key}={value}" for key, value in params.items())
+    return client.post(f"/api/expenses/import?{query}", data=body, content_type='text/csv')
+
+
+def all_expenses(client):
+    return client.get('/api/expenses?all=true').get_json()
+
+
+@pytest.fixture
+def tracker(client):
+    tracker = server.trackers.acquire(server.DEFAULT_USER_ID)
+    yield tracker
+    server.trackers.release(tracker)
+
+
+@pytest.fixture
+def failing_adds(tracker, monkeypatch):
+    # Makes the storage refuse adds once the given number have succeeded
+    def fail_after(succeeding):
+        add_expenses = tracker.storage.add_expenses
+        calls = []
+
+        def add(new_expenses, expenses):
+            calls.append(len(new_expenses))
+            if len(calls) > succeeding:
+                raise OSError("disk full")
+            add_expenses(new_expenses, expenses)
+        monkeypatch.setattr(tracker.storage, 'add_expenses', add)
+        return lambda: monkeypatch.setattr(tracker.storage, 'add_expenses', add_expenses)
+    return fail_after
+
+
+def test_duplicates_are_matched_once_each(client):
+    saved = {"name": "Coffee  Day", "amount": 120, "category": "Food & Dining", "date": "2025-01-05"}
+    assert client.post('/api/expenses', json=saved).status_code == 201
+    body = statement("2025-01-05,coffee day,120.00,Food & Dining,",
+                     "2025-01-05,Coffee Day,120,Food & Dining,second cup",
+                     "2025-01-06,Rent,25000,Bills & Utilities,")
+    first = post_import(client, body)
+    assert first.status_code == 201
+    assert (first.get_json()['created'], first.get_json()['duplicates']) == (2, 1)
+
+    again = post_import(client, body).get_json()
+    assert (again['created'], again['duplicates']) == (0, 3)
+    assert len(all_expenses(client)) == 3
+
+
+def test_failed_chunk_is_not_counted_and_import_resumes(client, tracker, failing_adds, monkeypatch):
+    monkeypatch.setattr(server, 'IMPORT_CHUNK_SIZE', 2)
+    body = statement(*(f"2025-02-{day:02d},Item {day},{100 + day},Shopping," for day in range(1, 8)))
+    restore = failing_adds(1)
+
+    failed = post_import(client, body)
+    assert failed.status_code == 500
+    state = failed.get_json()['import']
+    assert (state['status'], state['rows_processed'], state['created']) == ('failed', 2, 2)
+    assert [exp['name'] for exp in all_expenses(client)] == ['Item 1', 'Item 2']
+    saved = client.get(f"/api/expenses/import/{state['id']}").get_json()
+    assert (saved['status'], saved['rows_processed'], saved['created']) == ('failed', 2, 2)
+
+    restore()
+    resumed = post_import(client, body, import_id=state['id'])
+    assert resumed.status_code == 200
+    assert resumed.get_json()['status'] == 'completed'
+    assert (resumed.get_json()['rows_processed'], resumed.get_json()['created']) == (7, 7)
+    assert resumed.get_json()['duplicates'] == 0
+    assert sorted(exp['name'] for exp in all_expenses(client)) == [f"Item {day}" for day in range(1, 8)]
+    assert tracker.rollup.count == 7
+    assert post_import(client, body, import_id=state['id']).status_code == 409
+
+
+def test_row_errors_are_reported(client, monkeypatch):
+    monkeypatch.setattr(server, 'IMPORT_ERRORS_KEPT', 2)
+    body = statement("2025-03-01,Tea,20,,", "2025-03-40,Tea,20,,", "2025-03-02,Tea,abc,,",
+                     "2025-03-03,Tea,-5,,", ",,,,")
+    state = post_import(client, body).get_json()
+    assert (state['created'], state['failed'], state['skipped']) == (1, 2, 2)
+    assert [error['row'] for error in state['errors']] == [2, 3]
+    assert post_import(client, "", profile='default').status_code == 400
+    assert post_import(client, body, profile='missing').status_code == 400
+
+
+def test_batch_reports_each_item(client):
+    items = [{"name": "Tea", "amount": 20}, {"name": "Tea", "amount": True}, {"amount": 5}]
+    response = client.post('/api/expenses/batch', json={"expenses": items})
+    assert response.status_code == 207
+    body = response.get_json()
+    assert (body['created'], body['failed']) == (1, 2)
+    assert [result['status'] for result in body['results']] == ['created', 'error', 'error']
+    assert client.post('/api/expenses/batch', json={"expenses": items[1:]}).status_code == 400
+    assert len(all_expenses(client)) == 1
+
+
+def test_storage_failure_adds_nothing(client, tracker, failing_adds):
+    failing_adds(0)
+    response = client.post('/api/expenses/batch', json={"expenses": [{"name": "Tea", "amount": 20}]})
+    assert response.status_code == 500
+    assert client.post('/api/expenses', json={"name": "Tea", "amount": 20}).status_code == 500
+    assert all_expenses(client) == []
+    assert tracker.rollup.count == 0 and tracker.positions == {}
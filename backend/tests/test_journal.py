@@ -0,0 +1,84 @@
+"""Tests for the append-only expense journal and its compaction."""
+import pytest
+
+from server import ExpenseJournal, JournalStorage, EXPENSES_JOURNAL_FILE
+
+
+def make_expense(i, **fields):
+    expense = {
+        "id": f"exp-{i}", "name": f"Expense {i}", "amount": 100.0 + i, "category": "Other",
+        "date": "2025-01-01", "description": "", "created_at": f"2025-01-01T00:00:{i:02d}",
+    }
+    expense.update(fields)
+    return expense
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return ExpenseJournal(tmp_path / 'expenses.json', tmp_path / EXPENSES_JOURNAL_FILE.name, compact_bytes=1)
+
+
+def test_replays_add_update_delete(journal):
+    journal.append([{"op": "add", "expense": make_expense(i)} for i in range(3)])
+    journal.append([{"op": "update", "expense": make_expense(1, amount=5.0)},
+                    {"op": "delete", "id": "exp-2"}])
+    assert journal.load() == [make_expense(0), make_expense(1, amount=5.0)]
+
+
+def test_torn_final_record_is_dropped(journal):
+    journal.append([{"op": "add", "expense": make_expense(i)} for i in range(2)])
+    with open(journal.journal_file, 'ab') as f:
+        f.write(b'{"op": "add", "expense": {"id": "exp-9", "na')
+    assert journal.load() == [make_expense(0), make_expense(1)]
+
+
+def test_tail_waits_for_record_newline(journal):
+    journal.load()
+    other = ExpenseJournal(journal.snapshot_file, journal.journal_file, journal.compact_bytes)
+    other.append([{"op": "add", "expense": make_expense(0)}])
+    with open(journal.journal_file, 'ab') as f:
+        f.write(b'{"op": "delete", "id": "exp-0"')
+    assert journal.read_tail() == [{"op": "add", "expense": make_expense(0)}]
+    with open(journal.journal_file, 'ab') as f:
+        f.write(b'}\n')
+    assert journal.read_tail() == [{"op": "delete", "id": "exp-0"}]
+
+
+def test_compaction_folds_journal_into_snapshot(journal):
+    journal.load()
+    expenses = [make_expense(i) for i in range(3)]
+    journal.append([{"op": "add", "expense": exp} for exp in expenses])
+    journal.compact(lambda: expenses)
+    assert journal.snapshot_file.exists()
+    assert not journal.journal_file.exists() and not journal.compacting_file.exists()
+    assert ExpenseJournal(journal.snapshot_file, journal.journal_file, 1).load() == expenses
+
+
+def test_compaction_rebuilds_from_files_when_out_of_sync(journal):
+    journal.load()
+    # Another process appended records this one never read
+    ExpenseJournal(journal.snapshot_file, journal.journal_file, 1).append(
+        [{"op": "add", "expense": make_expense(i)} for i in range(2)]
+    )
+    journal.compact(lambda: [])
+    assert journal.load() == [make_expense(0), make_expense(1)]
+
+
+def test_load_replays_segment_left_by_crashed_compaction(journal):
+    journal.append([{"op": "add", "expense": make_expense(0)}])
+    journal.journal_file.rename(journal.compacting_file)
+    journal.append([{"op": "update", "expense": make_expense(0, name="Renamed")},
+                    {"op": "add", "expense": make_expense(1)}])
+    expenses = journal.load()
+    assert expenses == [make_expense(0, name="Renamed"), make_expense(1)]
+    journal.compact(lambda: expenses)
+    assert not journal.compacting_file.exists()
+    assert journal.load() == [make_expense(0, name="Renamed"), make_expense(1)]
+
+
+def test_storage_round_trip(tmp_path):
+    storage = JournalStorage(tmp_path, compact_bytes=10 ** 9)
+    expenses = [make_expense(i) for i in range(3)]
+    storage.add_expenses(expenses, expenses)
+    storage.delete_expenses(["exp-1"], [expenses[0], expenses[2]])
+    assert JournalStorage(tmp_path).load_expenses() == [expenses[0], expenses[2]]
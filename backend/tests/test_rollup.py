@@ -0,0 +1,50 @@
+"""Tests that the incrementally maintained spending rollup matches a full recompute."""
+from fractions import Fraction
+
+import pytest
+
+from benchmarks.synthetic import generate_expenses
+from server import ExpenseTracker, JsonStorage, SpendingRollup
+
+
+def cells(rollup):
+    return rollup.months, rollup.categories, rollup.month_categories, rollup.exact_total, rollup.count
+
+
+@pytest.fixture(params=[True, False], ids=['columns', 'rows'])
+def tracker(request, tmp_path, monkeypatch):
+    monkeypatch.setattr('server.COLUMNAR_STORE', request.param)
+    storage = JsonStorage(tmp_path)
+    storage.save_expenses(list(generate_expenses(500, months=6)))
+    return ExpenseTracker(storage)
+
+
+def test_initial_rollup_matches_recompute(tracker):
+    assert cells(tracker.rollup) == cells(SpendingRollup(tracker.expenses))
+
+
+def test_rollup_follows_add_edit_delete(tracker):
+    added = list(generate_expenses(50, months=3, seed=1))
+    tracker.add_expenses(added)
+    tracker.update_expense(added[0]['id'], {"amount": 0.1, "category": "Travel"})
+    tracker.update_expense(tracker.expenses[3]['id'], {"date": "2024-01-15"})
+    tracker.delete_expenses([exp['id'] for exp in tracker.expenses[10:200:7]] + [added[5]['id']])
+    assert cells(tracker.rollup) == cells(SpendingRollup(tracker.expenses))
+    assert cells(tracker.rollup) == cells(SpendingRollup(ExpenseTracker(tracker.storage).expenses))
+
+
+def test_removing_everything_leaves_no_cells(tracker):
+    tracker.delete_expenses([exp['id'] for exp in tracker.expenses])
+    assert cells(tracker.rollup) == ({}, {}, {}, 0, 0)
+
+
+def test_totals_are_exact():
+    rollup = SpendingRollup()
+    expenses = [{"date": "2025-01-01", "category": "Other", "amount": amount} for amount in (0.1, 0.2, 0.3)]
+    for expense in expenses:
+        rollup.add(expense)
+    rollup.remove(expenses[2])
+    assert rollup.exact_total == Fraction(0.1) + Fraction(0.2)
+    rollup.remove(expenses[0])
+    rollup.remove(expenses[1])
+    assert rollup.exact_total == 0 and rollup.total == 0.0
@@ -0,0 +1,66 @@
+"""Tests for the rule-based categorizer against a rule-by-rule reference."""
+import random
+import re
+
+import pytest
+
+from server import CategoryRuleEngine
+
+WORDS = ['uber', 'cab', 'milk', 'shop', 'rent', 'zz1', 'qq', 'fee', 'gym']
+
+
+def reference(rules, name, amount, default="Other"):
+    name = name.lower()
+    for rule in sorted(rules, key=lambda rule: rule.get('priority', 100)):
+        if 'amount_above' in rule and not amount > rule['amount_above']:
+            continue
+        if 'amount_below' in rule and not amount < rule['amount_below']:
+            continue
+        keywords, patterns = rule.get('keywords', []), rule.get('patterns', [])
+        if not keywords and not patterns:
+            return rule['category']
+        if any(keyword in name for keyword in keywords) or \
+                any(re.search(pattern, name, re.IGNORECASE) for pattern in patterns):
+            return rule['category']
+    return default
+
+
+def random_rules(rng, count):
+    rules = []
+    for i in range(count):
+        rule = {"category": f"C{i}", "priority": rng.randint(0, 5)}
+        kind = rng.random()
+        if kind < 0.4:
+            rule['keywords'] = rng.sample(WORDS, 2)
+        elif kind < 0.8:
+            rule['patterns'] = [rf"\b{rng.choice(WORDS)}\b", rf"{rng.choice(WORDS)}\d*"]
+        if rng.random() < 0.5:
+            rule['amount_above'] = rng.choice([10, 100, 500])
+        if rng.random() < 0.5:
+            rule['amount_below'] = rng.choice([50, 100, 1000])
+        rules.append(rule)
+    return rules
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_reference(seed):
+    rng = random.Random(seed)
+    rules = random_rules(rng, 12)
+    engine = CategoryRuleEngine(rules)
+    amounts = [0, 5, 10, 10.01, 50, 99.99, 100, 100.5, 500, 999, 1000, 5000]
+    for _ in range(200):
+        name = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 3)))
+        amount = rng.choice(amounts)
+        assert engine.categorize(name, amount) == reference(rules, name, amount), (name, amount)
+
+
+def test_amount_limited_pattern_does_not_hide_lower_priority_rule():
+    engine = CategoryRuleEngine([
+        {"category": "Small fee", "priority": 1, "patterns": [r"fee"], "amount_below": 50},
+        {"category": "Bank", "priority": 2, "patterns": [r"fee"]},
+        {"category": "Large", "priority": 3, "amount_above": 10000},
+    ])
+    assert engine.categorize("Card fee", 20) == "Small fee"
+    assert engine.categorize("Card fee", 50) == "Bank"
+    assert engine.categorize("Laptop", 10000) == "Other"
+    assert engine.categorize("Laptop", 10000.5) == "Large"
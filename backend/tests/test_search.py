@@ -0,0 +1,122 @@
+"""Tests that search ranking matches a brute-force scoring of every expense."""
+import math
+import random
+
+import pytest
+
+from server import ExpenseSearchIndex
+
+NAMES = ['Uber ride', 'Uber eats dinner', 'Swiggy dinner', 'Coffee', 'Coffee beans', 'Rent',
+         'Electricity bill', 'Dinner with team', 'Cab to airport', 'Cable TV']
+DESCRIPTIONS = ['', 'late night', 'team dinner', 'uber pool', 'monthly', 'airport drop']
+QUERIES = ['uber', 'uber ', 'ub', 'dinner', 'din', 'uber din', 'team dinner ', 'dinner te', 'coffee b',
+           'ca', 'cab', 'airport', 'late nig', 'zzz', 'uber zzz', 'rent monthly ']
+
+
+def make_expenses(count, seed=0):
+    rng = random.Random(seed)
+    return [{"id": f"exp-{i:04d}", "name": rng.choice(NAMES), "description": rng.choice(DESCRIPTIONS),
+             "amount": 100.0, "category": "Other", "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"}
+            for i in range(count)]
+
+
+def reference(expenses, query):
+    # Every expense scored on its own: each whole word by field weight times
+    # idf, plus the best completion of the prefix (half for a longer word)
+    tokenize = ExpenseSearchIndex.tokenize
+    fields = {}
+    for exp in expenses:
+        weights = dict.fromkeys(tokenize(exp['description']), ExpenseSearchIndex.DESCRIPTION_WEIGHT)
+        weights.update(dict.fromkeys(tokenize(exp['name']), ExpenseSearchIndex.NAME_WEIGHT))
+        fields[exp['id']] = weights
+    counts = {}
+    for weights in fields.values():
+        for term in weights:
+            counts[term] = counts.get(term, 0) + 1
+
+    def idf(term):
+        return math.log(1 + len(expenses) / counts[term])
+
+    words = list(dict.fromkeys(tokenize(query)))
+    prefix = None if query[-1:].isspace() else words.pop()
+    ranked = []
+    for exp in expenses:
+        weights = fields[exp['id']]
+        if not all(word in weights for word in words):
+            continue
+        score = sum(weights[word] * idf(word) for word in words)
+        if prefix is not None:
+            completions = [weights[term] * idf(term) * (1 if term == prefix else 0.5)
+                           for term in weights if term.startswith(prefix)]
+            if not completions:
+                continue
+            score += max(completions)
+        ranked.append((round(score, 9), exp['date'], exp['id']))
+    ranked.sort(reverse=True)
+    return [(round(score, 4), expense_id) for score, _, expense_id in ranked]
+
+
+def ranking(index, query, limit=10 ** 6):
+    return [(result['score'], result['id']) for result in index.search(query, 0, limit)['results']]
+
+
+@pytest.fixture(scope='module')
+def expenses():
+    return make_expenses(400)
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_ranking_matches_reference(expenses, query):
+    assert ranking(ExpenseSearchIndex(expenses), query) == reference(expenses, query)
+
+
+@pytest.mark.parametrize('query', ['uber', 'din', 'dinner te'])
+def test_pages_follow_ranking(expenses, query):
+    index = ExpenseSearchIndex(expenses)
+    full = ranking(index, query)
+    pages, offset = [], 0
+    while True:
+        page = index.search(query, offset, 7)
+        pages += [(result['score'], result['id']) for result in page['results']]
+        if not page['has_more']:
+            break
+        offset += 7
+    assert pages == full
+
+
+def test_incremental_index_matches_rebuild(expenses):
+    rows = list(expenses[:250])
+    index = ExpenseSearchIndex(rows)
+    rng = random.Random(1)
+    for exp in make_expenses(100, seed=2):
+        exp = {**exp, "id": exp['id'] + "-new"}
+        rows.append(exp)
+        index.add(exp)
+    for exp in rng.sample(rows, 120):
+        rows.remove(exp)
+        index.remove(exp)
+    rebuilt = ExpenseSearchIndex(rows)
+    assert index.terms == rebuilt.terms and index.term_counts == rebuilt.term_counts
+    for query in QUERIES:
+        assert ranking(index, query) == reference(rows, query)
+
+
+def test_suggestions_are_most_common_completions(expenses):
+    suggestions = ExpenseSearchIndex(expenses).search('c')['suggestions']
+    counts = {term: sum(term in ExpenseSearchIndex.tokenize(f"{exp['name']} {exp['description']}") for exp in expenses)
+              for term in suggestions}
+    assert set(suggestions) == {'coffee', 'cab', 'cable'}
+    assert suggestions == sorted(suggestions, key=lambda term: -counts[term])
+
+
+def test_search_route_pages_and_validates(client):
+    expenses = [{"name": f"Uber ride {i}", "amount": 100 + i, "category": "Transportation",
+                 "date": f"2025-01-{i + 1:02d}"} for i in range(5)]
+    assert client.post('/api/expenses/batch', json={"expenses": expenses}).status_code == 201
+    first = client.get('/api/expenses/search?q=uber&limit=3').get_json()
+    assert [exp['date'] for exp in first['results']] == ['2025-01-05', '2025-01-04', '2025-01-03']
+    assert first['next_offset'] == 3
+    second = client.get('/api/expenses/search?q=uber&limit=3&offset=3').get_json()
+    assert len(second['results']) == 2 and second['next_offset'] is None
+    assert client.get('/api/expenses/search?q=%20').status_code == 400
+    assert client.get('/api/expenses/search?q=uber&limit=0').status_code == 400
@@ -0,0 +1,79 @@
+"""Tests for the SQLite backend: JSON migration and the shared-mode change log."""
+import json
+
+import pytest
+
+from server import ExpenseStorage, JournalStorage, SqliteStorage
+
+
+def make_expense(i, **fields):
+    expense = {
+        "id": f"exp-{i}", "name": f"Expense {i}", "amount": 100.0 + i, "category": "Other",
+        "date": f"2025-01-{i + 1:02d}", "description": "", "created_at": f"2025-01-01T00:00:{i:02d}",
+    }
+    expense.update(fields)
+    return expense
+
+
+def trigger_names(storage):
+    return {row[0] for row in storage.conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+
+
+def test_storage_base_is_abstract():
+    with pytest.raises(TypeError):
+        ExpenseStorage()
+
+
+def test_migrates_json_files_and_journal_tail(tmp_path):
+    (tmp_path / 'expenses.json').write_text(json.dumps([make_expense(0), make_expense(1)]))
+    (tmp_path / 'budgets.json').write_text(json.dumps({"Groceries": 5000}))
+    JournalStorage(tmp_path, compact_bytes=10 ** 9).add_expenses([make_expense(2)], [])
+
+    storage = SqliteStorage(tmp_path)
+    assert storage.load_expenses() == [make_expense(0), make_expense(1), make_expense(2)]
+    assert storage.load_document('budgets') == {"Groceries": 5000}
+    assert storage.load_document('salary') is None
+
+
+def test_migration_runs_once(tmp_path):
+    (tmp_path / 'expenses.json').write_text(json.dumps([make_expense(0)]))
+    storage = SqliteStorage(tmp_path)
+    storage.delete_expenses(["exp-0"], [])
+    storage.conn.close()
+    # The JSON file is left in place but not imported a second time
+    assert SqliteStorage(tmp_path).load_expenses() == []
+
+
+def test_change_log_triggers_follow_shared_mode(tmp_path):
+    shared = SqliteStorage(tmp_path, shared=True)
+    assert trigger_names(shared) == set(SqliteStorage.CHANGE_LOG_TRIGGERS)
+    shared.conn.close()
+    assert trigger_names(SqliteStorage(tmp_path)) == set()
+
+
+def test_workers_see_each_others_changes(tmp_path):
+    writer = SqliteStorage(tmp_path, shared=True)
+    reader = SqliteStorage(tmp_path, shared=True)
+    writer.add_expenses([make_expense(0), make_expense(1)], [])
+    writer.update_expenses([make_expense(1, amount=5.0)], [])
+    writer.delete_expenses(["exp-0"], [])
+    writer.save_document('budgets', {"Rent": 20000})
+
+    changes = reader.poll_changes()
+    assert changes["expenses"] is None
+    assert changes["records"] == [{"op": "delete", "id": "exp-0"},
+                                  {"op": "update", "expense": make_expense(1, amount=5.0)}]
+    assert changes["documents"] == ['budgets']
+    assert reader.poll_changes() is None
+    # A worker's own writes are not reported back to it
+    assert writer.poll_changes() is None
+
+
+def test_pruned_change_log_asks_for_full_reload(tmp_path, monkeypatch):
+    monkeypatch.setattr('server.SQLITE_CHANGES_KEPT', 1)
+    writer = SqliteStorage(tmp_path, shared=True)
+    reader = SqliteStorage(tmp_path, shared=True)
+    for i in range(3):
+        writer.add_expenses([make_expense(i)], [])
+    changes = reader.poll_changes()
+    assert changes["expenses"] == [make_expense(i) for i in range(3)]
@@ -0,0 +1,56 @@
+"""Tests for configuration checks made when the server module is imported."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def import_server(env, blocked=(), check=''):
+    # A fresh interpreter, since the configuration is read at import time;
+    # blocked packages import as if they were not installed, and None
+    # values remove a variable from the environment
+    code = ["import sys"] + [f"sys.modules[{name!r}] = None" for name in blocked] + ["import server", check]
+    environ = {**os.environ, **env}
+    return subprocess.run(
+        [sys.executable, '-c', '\n'.join(code)], cwd=BACKEND_DIR, capture_output=True, text=True,
+        env={key: value for key, value in environ.items() if value is not None}
+    )
+
+
+def test_columnar_store_off_without_numpy_by_default():
+    result = import_server({'COLUMNAR_STORE': None}, blocked=['numpy'], check="assert not server.COLUMNAR_STORE")
+    assert result.returncode == 0, result.stderr
+
+
+def test_columnar_store_requires_numpy_when_set():
+    result = import_server({'COLUMNAR_STORE': 'true'}, blocked=['numpy'])
+    assert result.returncode != 0
+    assert "COLUMNAR_STORE=true needs NumPy" in result.stderr
+
+
+def test_lazy_init_defers_ai_service(tmp_path):
+    check = '\n'.join([
+        "assert server.ai_service is None and server.import_profiles is None",
+        "assert not server.CATEGORY_CACHE_FILE.exists()",
+        "client = server.app.test_client()",
+        "assert client.get('/api/metrics').status_code == 200 and server.ai_service is None",
+        "assert client.post('/api/expenses/categorize', json={'name': 'Uber ride', 'amount': 250}).status_code == 200",
+        "assert server.ai_service is not None and server.CATEGORY_CACHE_FILE.exists()",
+    ])
+    result = import_server({'LAZY_INIT': 'true', 'DATA_DIR': str(tmp_path), 'CATEGORY_CACHE_ENABLED': 'true',
+                            'GOOGLE_API_KEY': ''}, check=check)
+    assert result.returncode == 0, result.stderr
+
+
+def test_msgpack_format_requires_msgpack():
+    result = import_server({'DATA_FORMAT': 'msgpack'}, blocked=['msgpack'])
+    assert result.returncode != 0
+    assert "DATA_FORMAT=msgpack needs msgpack" in result.stderr
+
+
+def test_unknown_data_format_stops_startup():
+    result = import_server({'DATA_FORMAT': 'yaml'})
+    assert result.returncode != 0
+    assert "DATA_FORMAT must be one of" in result.stderr
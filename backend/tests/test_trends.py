@@ -0,0 +1,115 @@
+"""Tests that trend buckets from the timeline prefix sums match a full scan."""
+import functools
+import random
+from datetime import datetime
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from benchmarks.synthetic import generate_expenses
+from server import SpendingTimeline, parse_trends_query
+
+
+@functools.lru_cache(maxsize=None)
+def ordinal(date):
+    return datetime.strptime(date, '%Y-%m-%d').toordinal()
+
+
+def reference(expenses, start, end, interval, categories=None, by_category=False):
+    # Every bucket summed straight from the expenses
+    timeline = SpendingTimeline()
+    result = []
+    for label, first, last in timeline.buckets(start, end, interval):
+        covered = [exp for exp in expenses if first <= ordinal(exp['date']) <= last
+                   and (categories is None or exp['category'] in categories)]
+        bucket = {
+            "period": label,
+            "start": datetime.fromordinal(first).strftime('%Y-%m-%d'),
+            "end": datetime.fromordinal(last).strftime('%Y-%m-%d'),
+            "total": sum(round(exp['amount'] * 100) for exp in covered) / 100,
+            "count": len(covered),
+        }
+        if by_category:
+            paise = {}
+            for exp in covered:
+                paise[exp['category']] = paise.get(exp['category'], 0) + round(exp['amount'] * 100)
+            bucket["categories"] = {category: total / 100 for category, total in paise.items()}
+        result.append(bucket)
+    return result
+
+
+def assert_trends_match(timeline, expenses, start, end):
+    for interval in ('day', 'week', 'month'):
+        for categories in (None, ['Groceries', 'Travel'], ['Nonexistent']):
+            for by_category in (False, True):
+                buckets = timeline.trends(start, end, interval, categories, by_category)
+                assert buckets == reference(expenses, start, end, interval, categories, by_category), \
+                    (interval, categories, by_category)
+
+
+@pytest.fixture(scope='module')
+def expenses():
+    return list(generate_expenses(400, months=4))
+
+
+def test_trends_match_full_scan(expenses):
+    days = [ordinal(exp['date']) for exp in expenses]
+    # Ranges inside, across and entirely outside the covered days
+    for start, end in [(min(days), max(days)), (min(days) - 40, max(days) + 40),
+                       (min(days) + 17, min(days) + 17), (max(days) + 1, max(days) + 60)]:
+        assert_trends_match(SpendingTimeline(expenses), expenses, start, end)
+
+
+def test_trends_follow_adds_and_removes(expenses):
+    rows = list(expenses[:200])
+    timeline = SpendingTimeline(rows)
+    start, end = min(ordinal(exp['date']) for exp in expenses) - 3, max(ordinal(exp['date']) for exp in expenses)
+    timeline.trends(start, end, 'week')
+    rng = random.Random(0)
+    for exp in expenses[200:300]:
+        rows.append(exp)
+        timeline.add(exp)
+    for exp in rng.sample(rows, 80):
+        rows.remove(exp)
+        timeline.remove(exp)
+    assert_trends_match(timeline, rows, start, end)
+
+    for exp in list(rows):
+        timeline.remove(exp)
+    assert timeline.days == {}
+    assert timeline.trends(start, end, 'month')[0]['count'] == 0
+
+
+def test_undated_expenses_are_left_out(expenses):
+    timeline = SpendingTimeline([*expenses[:10], {**expenses[0], "date": "not a date"}])
+    day = ordinal(expenses[0]['date'])
+    assert timeline.trends(day - 400, day + 400, 'month') == \
+        reference(expenses[:10], day - 400, day + 400, 'month')
+
+
+def test_from_columns_matches_rows(expenses):
+    pytest.importorskip('numpy')
+    from server import ExpenseColumns
+    columnar = SpendingTimeline.from_columns(ExpenseColumns.build(expenses))
+    assert columnar.days == SpendingTimeline(expenses).days
+
+
+def test_buckets_are_clipped_to_the_range():
+    start, end = ordinal('2025-01-15'), ordinal('2025-03-03')
+    assert SpendingTimeline().buckets(start, end, 'month') == [
+        ('2025-01', start, ordinal('2025-01-31')),
+        ('2025-02', ordinal('2025-02-01'), ordinal('2025-02-28')),
+        ('2025-03', ordinal('2025-03-01'), end),
+    ]
+    weeks = SpendingTimeline().buckets(start, end, 'week')
+    assert weeks[0] == ('2025-01-13', start, ordinal('2025-01-19'))
+    assert weeks[-1] == ('2025-03-03', end, end)
+
+
+def test_query_limits_bucket_count():
+    with pytest.raises(ValueError):
+        parse_trends_query(MultiDict({'interval': 'day', 'from': '2020-01-01', 'to': '2025-01-01'}))
+    query = parse_trends_query(MultiDict([('interval', 'week'), ('to', '2025-03-05'),
+                                          ('category', 'Travel,Groceries'), ('category', 'Travel')]))
+    assert query['categories'] == ['Groceries', 'Travel']
+    assert datetime.fromordinal(query['start']).strftime('%Y-%m-%d') == '2024-12-16'
@@ -0,0 +1,42 @@
+"""Tests for per-user partitions behind the authenticating proxy."""
+import pytest
+
+import server
+
+SECRET = 'proxy-secret'
+
+
+@pytest.fixture
+def proxied(client, monkeypatch):
+    monkeypatch.setattr(server, 'USER_PROXY_SECRET', SECRET)
+    client.environ_base['HTTP_X_PROXY_SECRET'] = SECRET
+    return client
+
+
+def test_user_header_refused_without_proxy(client):
+    assert client.get('/api/expenses', headers={'X-User-Id': 'alice'}).status_code == 403
+    assert client.get('/api/expenses').status_code == 200
+
+
+def test_proxy_secret_required(proxied):
+    assert proxied.get('/api/expenses', headers={'X-Proxy-Secret': 'wrong'}).status_code == 403
+    assert proxied.get('/api/expenses', headers={'X-User-Id': '../etc'}).status_code == 400
+
+
+def test_users_are_partitioned(proxied):
+    assert proxied.post('/api/expenses', json={"name": "Tea", "amount": 10},
+                        headers={'X-User-Id': 'alice'}).status_code == 201
+    assert proxied.get('/api/expenses', headers={'X-User-Id': 'alice'}).get_json()['count'] == 1
+    assert proxied.get('/api/expenses', headers={'X-User-Id': 'bob'}).get_json()['count'] == 0
+    assert proxied.get('/api/expenses').get_json()['count'] == 0
+
+
+def test_partition_created_on_first_write(proxied):
+    headers = {'X-User-Id': 'carol'}
+    partition = server.user_data_dir('carol')
+    assert proxied.get('/api/expenses', headers=headers).get_json()['count'] == 0
+    assert proxied.get('/api/salary', headers=headers).get_json()['monthly'] == 0
+    assert not partition.exists()
+    assert proxied.post('/api/salary', json={"monthly": 50000}, headers=headers).status_code == 200
+    assert partition.exists()
+    assert server.load_tracker('carol').salary['monthly'] == 50000
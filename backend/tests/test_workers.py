@@ -0,0 +1,82 @@
+"""Tests that trackers in different worker processes stay coherent.
+
+Each tracker here has its own shared-mode storage on the same directory,
+which is what separate gunicorn workers see.
+"""
+import multiprocessing
+
+import pytest
+
+from server import ExpenseTracker, JournalStorage, JsonStorage, SpendingRollup, SqliteStorage
+
+BACKENDS = {
+    'json': lambda path: JsonStorage(path, shared=True),
+    'journal': lambda path: JournalStorage(path, compact_bytes=4096, shared=True),
+    'sqlite': lambda path: SqliteStorage(path, shared=True),
+}
+
+
+def make_expense(i, **fields):
+    expense = {
+        "id": f"exp-{i}", "name": f"Expense {i}", "amount": 10.0 + i, "category": "Other",
+        "date": "2025-01-01", "description": "", "created_at": f"2025-01-01T00:00:{i % 60:02d}",
+    }
+    expense.update(fields)
+    return expense
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def workers(request, tmp_path):
+    factory = BACKENDS[request.param]
+    return [ExpenseTracker(factory(tmp_path)) for _ in range(2)], factory, tmp_path
+
+
+def test_writes_are_seen_by_other_worker(workers):
+    (first, second), _, _ = workers
+    first.add_expenses([make_expense(i) for i in range(5)])
+    second.update_expense("exp-1", {"amount": 1.0})
+    first.delete_expense("exp-2")
+    with second.mutation():
+        second.budgets['monthly'] = 500
+        second.save_budgets()
+
+    for tracker in (first, second):
+        tracker.refresh()
+        assert [exp['id'] for exp in tracker.expenses] == ["exp-0", "exp-1", "exp-3", "exp-4"]
+        assert tracker.get_expense("exp-1")['amount'] == 1.0
+        assert tracker.budgets['monthly'] == 500
+        assert tracker.rollup.total == SpendingRollup(tracker.expenses).total
+        assert len(tracker.search_index.search("expense ")['results']) == 4
+
+
+def test_interleaved_writes_are_not_lost(workers):
+    trackers, factory, path = workers
+    for i in range(40):
+        trackers[i % 2].add_expense(make_expense(i))
+        if i % 4 == 3:
+            trackers[(i + 1) % 2].delete_expense(f"exp-{i - 3}")
+    expected = sorted(f"exp-{i}" for i in range(40) if i % 4 != 0)
+    for tracker in trackers:
+        tracker.refresh()
+        assert sorted(exp['id'] for exp in tracker.expenses) == expected
+    assert sorted(exp['id'] for exp in ExpenseTracker(factory(path)).expenses) == expected
+
+
+def add_from_process(backend, path, worker, count):
+    tracker = ExpenseTracker(BACKENDS[backend](path))
+    for i in range(count):
+        tracker.add_expense(make_expense(worker * 1000 + i))
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_concurrent_processes(backend, tmp_path):
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=add_from_process, args=(backend, tmp_path, worker, 25))
+                 for worker in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+    tracker = ExpenseTracker(BACKENDS[backend](tmp_path))
+    assert len(tracker.expenses) == 75
@@ -3,6 +3,13 @@ class ExpenseTracker {
     constructor() {
         this.API_BASE_URL = '/api';
         this.expenses = [];
+        // Expenses are listed a page at a time; nextCursor continues the list
+        this.EXPENSES_PAGE_SIZE = 50;
+        this.nextCursor = null;
+        this.loadingMoreExpenses = false;
+        this.listingAllExpenses = false;
+        // Server-side totals for the first screen (GET /api/dashboard)
+        this.dashboard = null;
         this.budgets = {};
         this.salary = {};
         this.predictions = {};
@@ -54,6 +61,9 @@ class ExpenseTracker {
                 this.closeAllModals();
             }
         });
+        
+        // The full expense list fetches its next page near the bottom
+        window.addEventListener('scroll', () => this.loadMoreExpensesIfNeeded());
     }
 
     setCurrentDate() {
@@ -62,9 +72,29 @@ class ExpenseTracker {
     }
 
     async loadDashboardData() {
+        try {
+            const response = await fetch(`${this.API_BASE_URL}/bootstrap`);
+            if (!response.ok) {
+                throw new Error(`Bootstrap request failed with status ${response.status}`);
+            }
+            const data = await response.json();
+            this.expenses = data.expenses.expenses;
+            this.nextCursor = data.expenses.next_cursor;
+            this.dashboard = data.dashboard;
+            this.budgets = data.budgets;
+            this.salary = data.salary;
+            this.predictions = data.prediction;
+        } catch (error) {
+            console.error('Error loading bootstrap data:', error);
+            await this.loadDashboardDataSeparately();
+        }
+    }
+
+    async loadDashboardDataSeparately() {
         try {
             await Promise.all([
                 this.loadExpenses(),
+                this.loadDashboard(),
                 this.loadBudgets(),
                 this.loadSalary(),
                 this.loadPrediction()
@@ -75,17 +105,62 @@ class ExpenseTracker {
         }
     }
 
+    loadMoreExpensesIfNeeded() {
+        if (this.listingAllExpenses && window.innerHeight + window.scrollY >= document.body.offsetHeight - 200) {
+            this.loadMoreExpenses();
+        }
+    }
+
+    async loadMoreExpenses() {
+        if (!this.nextCursor || this.loadingMoreExpenses) {
+            return;
+        }
+        this.loadingMoreExpenses = true;
+        try {
+            const response = await fetch(`${this.API_BASE_URL}/expenses?limit=${this.EXPENSES_PAGE_SIZE}&cursor=${encodeURIComponent(this.nextCursor)}`);
+            if (!response.ok) {
+                return;
+            }
+            const page = await response.json();
+            // Expenses added here since the first page may show up again
+            const loaded = new Set(this.expenses.map(expense => expense.id));
+            this.expenses = this.expenses.concat(page.expenses.filter(expense => !loaded.has(expense.id)));
+            this.nextCursor = page.next_cursor;
+        } catch (error) {
+            console.error('Error loading more expenses:', error);
+            return;
+        } finally {
+            this.loadingMoreExpenses = false;
+        }
+        if (this.listingAllExpenses) {
+            this.showAllExpenses();
+        }
+    }
+
     async loadExpenses() {
         try {
-            const response = await fetch(`${this.API_BASE_URL}/expenses`);
+            const response = await fetch(`${this.API_BASE_URL}/expenses?limit=${this.EXPENSES_PAGE_SIZE}`);
             if (response.ok) {
-                this.expenses = await response.json();
+                const page = await response.json();
+                this.expenses = page.expenses;
+                this.nextCursor = page.next_cursor;
             }
         } catch (error) {
             console.error('Error loading expenses:', error);
         }
     }
 
+    async loadDashboard() {
+        try {
+            const response = await fetch(`${this.API_BASE_URL}/dashboard`);
+            if (response.ok) {
+                this.dashboard = await response.json();
+            }
+        } catch (error) {
+            console.error('Error loading dashboard:', error);
+        }
+    }
+
     async loadBudgets() {
         try {
             const response = await fetch(`${this.API_BASE_URL}/budgets`);
@@ -158,9 +233,9 @@ class ExpenseTracker {
                 this.resetExpenseForm();
                 this.closeExpenseModal();
                 
-                // Refresh prediction after adding expense
-                await this.loadPrediction();
-                this.updatePredictionCard();
+                // Refresh the month's totals and prediction after adding expense
+                await Promise.all([this.loadDashboard(), this.loadPrediction()]);
+                this.updateUI();
             } else {
                 const error = await response.json();
                 throw new Error(error.error || 'Failed to add expense');
@@ -263,9 +338,9 @@ class ExpenseTracker {
                 this.updateUI();
                 this.showToast('Expense deleted successfully!', 'success');
                 
-                // Refresh prediction after deleting expense
-                await this.loadPrediction();
-                this.updatePredictionCard();
+                // Refresh the month's totals and prediction after deleting expense
+                await Promise.all([this.loadDashboard(), this.loadPrediction()]);
+                this.updateUI();
             } else {
                 throw new Error('Failed to delete expense');
             }
@@ -380,10 +455,31 @@ class ExpenseTracker {
         this.updateRecentExpenses();
     }
 
-    updateOverviewCards() {
+    currentMonthSummary() {
+        // The dashboard's totals cover the whole month, not just the loaded
+        // pages; the loaded expenses are only used if it failed to load
+        if (this.dashboard) {
+            return {
+                totalSpent: this.dashboard.current_spending,
+                count: this.dashboard.expenses_count,
+                categoryBreakdown: this.dashboard.category_breakdown
+            };
+        }
         const currentMonth = new Date().toISOString().slice(0, 7);
         const monthlyExpenses = this.expenses.filter(expense => expense.date.startsWith(currentMonth));
-        const totalSpent = monthlyExpenses.reduce((sum, expense) => sum + expense.amount, 0);
+        const categoryBreakdown = {};
+        monthlyExpenses.forEach(expense => {
+            categoryBreakdown[expense.category] = (categoryBreakdown[expense.category] || 0) + expense.amount;
+        });
+        return {
+            totalSpent: monthlyExpenses.reduce((sum, expense) => sum + expense.amount, 0),
+            count: monthlyExpenses.length,
+            categoryBreakdown
+        };
+    }
+
+    updateOverviewCards() {
+        const { totalSpent, count } = this.currentMonthSummary();
         
         // Update budget card
         const budgetAmount = this.budgets.monthly || 0;
@@ -407,9 +503,9 @@ class ExpenseTracker {
         
         // Update monthly spending card
         document.getElementById('monthly-spending').textContent = this.formatCurrency(totalSpent);
-        document.getElementById('expense-count').textContent = `${monthlyExpenses.length} expenses`;
+        document.getElementById('expense-count').textContent = `${count} expenses`;
         
-        const dailyAverage = monthlyExpenses.length > 0 ? totalSpent / new Date().getDate() : 0;
+        const dailyAverage = count > 0 ? totalSpent / new Date().getDate() : 0;
         document.getElementById('daily-average').textContent = this.formatCurrency(dailyAverage) + '/day';
     }
 
@@ -424,14 +520,7 @@ class ExpenseTracker {
     }
 
     updateCategoryBreakdown() {
-        const currentMonth = new Date().toISOString().slice(0, 7);
-        const monthlyExpenses = this.expenses.filter(expense => expense.date.startsWith(currentMonth));
-        
-        const categoryBreakdown = {};
-        const totalSpent = monthlyExpenses.reduce((sum, expense) => {
-            categoryBreakdown[expense.category] = (categoryBreakdown[expense.category] || 0) + expense.amount;
-            return sum + expense.amount;
-        }, 0);
+        const { totalSpent, categoryBreakdown } = this.currentMonthSummary();
 
         const categoryGrid = document.getElementById('category-grid');
         
@@ -456,7 +545,8 @@ class ExpenseTracker {
     }
 
     updateRecentExpenses() {
-        const recentExpenses = this.expenses.slice(0, 10);
+        this.listingAllExpenses = false;
+        const recentExpenses = this.dashboard ? this.dashboard.recent_expenses : this.expenses.slice(0, 10);
         const expenseList = document.getElementById('recent-expenses');
 
         if (recentExpenses.length === 0) {
@@ -600,6 +690,7 @@ class ExpenseTracker {
     }
 
     showAllExpenses() {
+        this.listingAllExpenses = true;
         const expenseList = document.getElementById('recent-expenses');
         
         if (this.expenses.length === 0) {
@@ -627,11 +718,15 @@ class ExpenseTracker {
                 </div>
             </div>
         `).join('');
+        // A short list leaves nothing to scroll, so keep filling the screen
+        this.loadMoreExpensesIfNeeded();
     }
 
     showProfileInfo() {
-        const totalExpenses = this.expenses.reduce((sum, exp) => sum + exp.amount, 0);
-        const categories = [...new Set(this.expenses.map(exp => exp.category))];
+        // All-time figures come from the server; the loaded pages are partial
+        const totalExpenses = this.dashboard ? this.dashboard.total_spending : this.expenses.reduce((sum, exp) => sum + exp.amount, 0);
+        const recordCount = this.dashboard ? this.dashboard.total_count : this.expenses.length;
+        const categoryCount = this.dashboard ? this.dashboard.categories_used : new Set(this.expenses.map(exp => exp.category)).size;
         
         const profileInfo = `
             <div class="insight-item">
@@ -641,8 +736,8 @@ class ExpenseTracker {
                 </div>
                 <div class="insight-message">
                     <strong>Total Expenses:</strong> ${this.formatCurrency(totalExpenses)}<br>
-                    <strong>Total Records:</strong> ${this.expenses.length}<br>
-                    <strong>Categories Used:</strong> ${categories.length}<br>
+                    <strong>Total Records:</strong> ${recordCount}<br>
+                    <strong>Categories Used:</strong> ${categoryCount}<br>
                     <strong>Monthly Salary:</strong> ${this.formatCurrency(this.salary.monthly || 0)}<br>
                     <strong>Monthly Budget:</strong> ${this.formatCurrency(this.budgets.monthly || 0)}
                 </div>